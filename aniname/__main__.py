@@ -2,20 +2,12 @@
 The main application to rename episode filenames.
 """
 
-import asyncio
+import multiprocessing
 import os
-import platform
 import sys
 from argparse import ArgumentParser
 from pathlib import Path
-from tkinter import filedialog
-
-from rich import box
-from rich import print as rprint
-from rich.console import Console
-from rich.prompt import Confirm, Prompt
-from rich.table import Table
-from rich.tree import Tree
+from typing import TYPE_CHECKING
 
 
 def get_current_script_directory():
@@ -33,23 +25,39 @@ def get_current_script_directory():
 project_root_directory = os.path.dirname(get_current_script_directory())
 sys.path.insert(0, project_root_directory)
 
-from aniname import http_session, restore_utility, utils
-from aniname.anime_list import AnimeList
+# The other modules are imported when needed, so that --help and the
+# restore utility start without loading the rename dependencies
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from aniname.anime_list import AnimeList
+
+LANGUAGES = ["english", "romanji", "japanese"]
+
+_console = None
+
 
-if platform == "win32":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+def get_console() -> "Console":
+    global _console
 
-os.system("cls||clear")
+    if _console is None:
+        from rich.console import Console
 
-CONSOLE = Console()
+        _console = Console()
+
+    return _console
 
 
 def initialize() -> Path:
     """Prints instructions and takes user input."""
 
+    from tkinter import filedialog
+
+    from rich.prompt import Prompt
+
     print()
 
-    CONSOLE.print(
+    get_console().print(
         """[b]Make sure to follow the instructions on \
 https://github.com/Ariaryy/AniName before you proceed.\n"""
     )
@@ -66,9 +74,12 @@ https://github.com/Ariaryy/AniName before you proceed.\n"""
     return Path(INPUT_DIR)
 
 
-def print_anime_list(anime_list: AnimeList):
+def print_anime_list(anime_list: "AnimeList"):
     """Prints the list of anime(s) in a table."""
 
+    from rich import box
+    from rich.table import Table
+
     table = Table(
         title="[b][yellow]Anime(s) Found",
         box=box.ROUNDED,
@@ -92,27 +103,32 @@ def print_anime_list(anime_list: AnimeList):
         )
 
     print()
-    CONSOLE.print(table, justify="center")
+    get_console().print(table, justify="center")
     print()
 
 
-def print_rename_summary(anime_list: AnimeList):
+def print_rename_summary(anime_list: "AnimeList"):
     """Prints the rename log."""
 
+    from rich import print as rprint
+    from rich.tree import Tree
+
+    from aniname import utils
+
     for anime in anime_list.animes:
         tree = Tree(
             f":open_file_folder: [link {anime.new_dir_path.as_uri()}]{anime.new_dir_path}",
             guide_style="bold bright_blue",
         )
         
-        utils.walk_directory(anime.new_dir_path, tree)
+        utils.walk_directory(anime.new_dir_path, tree, anime_list.index)
         print()
         rprint(tree)
 
     print_divider("[b]Backup[/b]")
 
     old_files_path = anime_list.init_dir.parent / "ORIGINAL_EPISODE_FILENAMES"
-    CONSOLE.print(
+    get_console().print(
         f"""
 [b][yellow]The original episode filenames are backed up in the following folder:
 [link {old_files_path.as_uri()}]{old_files_path}[/link {old_files_path.as_uri()}]
@@ -128,21 +144,51 @@ def print_divider(message: str) -> None:
     """Prints a divider with the provided message."""
 
     print()
-    CONSOLE.rule(message, style="white")
+    get_console().rule(message, style="white")
     print()
 
 
-async def user_confirmation() -> None:
-    CONSOLE.print("[green]Proceed?", justify="center")
-    CHOICE = Confirm.ask()
+async def user_confirmation(anime_list: "AnimeList") -> None:
+    import asyncio
+
+    from rich.prompt import Confirm
+
+    from aniname import http_session
+
+    get_console().print("[green]Proceed?", justify="center")
+
+    # Episode titles are fetched in the background while waiting for the answer
+    CHOICE = await asyncio.to_thread(Confirm.ask)
 
     if CHOICE is False:
+        anime_list.cancel_fetches()
         await http_session.close_client_session()
         sys.exit()
 
 
-def offer_restore(anime_list: AnimeList) -> None:
-    CONSOLE.print("[green]Do you wish to run the restore utility now?")
+def recover_interrupted(backup_dir: Path, rollback: bool = False) -> None:
+    """Rolls interrupted renames forward (or back) using their journals."""
+
+    from aniname import rename_engine
+
+    for journal_path in rename_engine.pending_journals(backup_dir):
+        transaction = rename_engine.recover(journal_path, rollback=rollback)
+
+        if transaction is None:
+            continue
+
+        action = "Rolled back" if rollback else "Completed"
+        get_console().print(
+            f"[b][yellow]{action} an interrupted rename of: {transaction.dir_path}"
+        )
+
+
+def offer_restore(anime_list: "AnimeList") -> None:
+    from rich.prompt import Confirm
+
+    from aniname import restore_utility
+
+    get_console().print("[green]Do you wish to run the restore utility now?")
     CHOICE = Confirm.ask()
 
     if CHOICE:
@@ -150,41 +196,339 @@ def offer_restore(anime_list: AnimeList) -> None:
         return restore_utility.restore(old_files_path)
 
 
-async def main():
-    parser = ArgumentParser(
-        prog="AniName",
-        description="Batch rename Anime Episode files with customizable formatting.",
+def print_json_summary(
+    anime_list: "AnimeList", summary_format: str, dry_run: bool, network: dict
+) -> None:
+    """Prints the rename log as JSON (or one JSON object per Anime)."""
+
+    import json
+
+    animes = [anime.summary() for anime in anime_list.animes]
+
+    if summary_format == "ndjson":
+        for anime in animes:
+            sys.stdout.write(json.dumps(anime, ensure_ascii=False) + "\n")
+        return
+
+    summary = {
+        "input_dir": str(anime_list.init_dir),
+        "backup_dir": str(anime_list.init_dir.parent / "ORIGINAL_EPISODE_FILENAMES"),
+        "dry_run": dry_run,
+        "renamed": sum(anime["renamed"] for anime in animes),
+        "failed": sum(anime["failed"] for anime in animes),
+        "animes": animes,
+        "network": network,
+    }
+
+    sys.stdout.write(json.dumps(summary, ensure_ascii=False, indent=4) + "\n")
+
+
+async def run_headless(
+    input_dir: Path, confirm: bool, rollback: bool, summary_format: str
+) -> None:
+    """
+    Renames without any prompts or tables, printing a JSON summary.
+    Without confirm, nothing is renamed and the planned folder and episode
+    names are printed.
+    """
+
+    import asyncio
+
+    from dataclasses import asdict
+
+    from aniname import (
+        backup_store,
+        error_handler,
+        http_session,
+        library_state,
+        parse_cache,
+        scheduler,
+        utils,
     )
+    from aniname.anime_list import AnimeList
 
-    parser.add_argument(
-        "-r", "--restore", help="Run the restore utility", action="store_true"
+    utils.HEADLESS = True
+
+    # Messages and errors go to stderr so that stdout only has the summary
+    get_console().stderr = True
+    error_handler.CONSOLE.stderr = True
+
+    recover_interrupted(
+        input_dir.parent / "ORIGINAL_EPISODE_FILENAMES", rollback=rollback
     )
 
-    args = parser.parse_args()
+    anime_list = AnimeList(init_dir=input_dir, quiet=True)
 
-    if args.restore:
-        return restore_utility.restore()
+    await anime_list.scan_animes()
+
+    if confirm:
+        await anime_list.rename_animes()
+    else:
+        await asyncio.gather(
+            *[anime.prefetch_episodes() for anime in anime_list.animes]
+        )
+
+        for anime in anime_list.animes:
+            anime.planned = anime.plan_episode_names()
+            anime.render_variants()
+
+    await http_session.close_client_session()
+    parse_cache.close_parse_cache()
+    library_state.close_library_state()
+    backup_store.close_backup_store()
+
+    network = {
+        "connections": http_session.get_connection_stats().as_dict(),
+        "requests": asdict(scheduler.get_scheduler().stats),
+    }
+
+    print_json_summary(anime_list, summary_format, not confirm, network)
+
+
+async def run_interactive(input_dir: Path, confirm: bool, rollback: bool) -> None:
+    """
+    Renames the Anime(s) in the Anime Directory, showing the progress.
+    """
+
+    from aniname import backup_store, http_session, library_state, parse_cache, utils
+    from aniname.anime_list import AnimeList
+
+    INPUT_DIR = input_dir if input_dir is not None else initialize()
+    recover_interrupted(
+        INPUT_DIR.parent / "ORIGINAL_EPISODE_FILENAMES", rollback=rollback
+    )
 
-    INPUT_DIR = initialize()
     anime_list = AnimeList(init_dir=INPUT_DIR)
 
     await anime_list.scan_animes()
 
+    if len(anime_list.animes) == 0:
+        library_state.close_library_state()
+        backup_store.close_backup_store()
+        get_console().print("[b][green]No new episodes to rename.")
+        return utils.pause()
+
     print_anime_list(anime_list=anime_list)
 
-    await user_confirmation()
+    if not confirm:
+        await user_confirmation(anime_list)
 
     print_divider("[b]Renaming[/b]")
 
     await anime_list.rename_animes()
     await http_session.close_client_session()
+    parse_cache.close_parse_cache()
+    library_state.close_library_state()
+    backup_store.close_backup_store()
 
     print_divider("[b]Overview[/b]")
     print_rename_summary(anime_list)
-    offer_restore(anime_list)
+
+    if not confirm:
+        offer_restore(anime_list)
 
     utils.pause()
 
 
+async def run_watch(input_dir: Path, headless: bool, rollback: bool) -> None:
+    """
+    Renames the Anime(s) in the Anime Directory, and then the episodes added
+    to it as they arrive, until interrupted.
+    """
+
+    from aniname import error_handler, utils
+    from aniname.watch import WatchDaemon
+
+    # Nobody is there to press Enter when the daemon stops on an error
+    utils.HEADLESS = True
+
+    if headless:
+        get_console().stderr = True
+        error_handler.CONSOLE.stderr = True
+
+    recover_interrupted(
+        input_dir.parent / "ORIGINAL_EPISODE_FILENAMES", rollback=rollback
+    )
+
+    get_console().print(f"[b]Watching [u]{input_dir}[/u] for new episodes")
+
+    await WatchDaemon(input_dir, headless=headless).run()
+
+
+def export_profile(path: Path, profile_format: str) -> None:
+    """Writes the profile of the run, even when the run failed."""
+
+    from aniname import profiler
+
+    profiler.get_profiler().export(path, profile_format)
+    get_console().print(f"[b]Profile written to [u]{path}")
+
+
+def main():
+    parser = ArgumentParser(
+        prog="AniName",
+        description="Batch rename Anime Episode files with customizable formatting.",
+    )
+
+    parser.add_argument(
+        "-r", "--restore", help="Run the restore utility", action="store_true"
+    )
+
+    parser.add_argument(
+        "-i", "--input", help="Path of the Anime Directory", type=Path, default=None
+    )
+
+    parser.add_argument(
+        "-y",
+        "--yes",
+        help="Rename without asking for confirmation",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--headless",
+        help="Run without prompts and print a JSON summary (requires --input)",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--summary-format",
+        help="Format of the headless summary (default: json)",
+        choices=["json", "ndjson"],
+        default="json",
+    )
+
+    parser.add_argument(
+        "--season-title-language",
+        help="Language of the Anime titles, instead of the one in conf.ini",
+        choices=LANGUAGES,
+    )
+
+    parser.add_argument(
+        "--episode-title-language",
+        help="Language of the episode titles, instead of the one in conf.ini",
+        choices=LANGUAGES,
+    )
+
+    parser.add_argument(
+        "--variant-languages",
+        help="Also list the names in these languages in the headless summary "
+        "(requires --headless)",
+        choices=LANGUAGES,
+        nargs="+",
+        default=[],
+        metavar="LANGUAGE",
+    )
+
+    parser.add_argument(
+        "--watch",
+        help="Keep running and rename new episodes as they arrive (requires --input)",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--rollback",
+        help="Undo interrupted renames instead of completing them",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Write a profile of the run (timings, requests, cache hits) to a file",
+        type=Path,
+        metavar="PATH",
+    )
+
+    parser.add_argument(
+        "--profile-format",
+        help="Format of the profile, chrome for chrome://tracing (default: json)",
+        choices=["json", "chrome"],
+        default="json",
+    )
+
+    parser.add_argument(
+        "--build-dump",
+        help="Build the metadata dump from a JSON or NDJSON file of Anime records",
+        type=Path,
+        metavar="RECORDS",
+    )
+
+    args = parser.parse_args()
+
+    if args.input is not None and not args.input.is_dir():
+        parser.error(f"the Anime Directory does not exist: {args.input}")
+
+    if args.build_dump is not None and not args.build_dump.is_file():
+        parser.error(f"the records file does not exist: {args.build_dump}")
+
+    if args.profile is not None and (args.restore or args.build_dump is not None):
+        parser.error("--profile can't be used with --restore or --build-dump")
+
+    if args.headless and (args.restore or args.input is None):
+        parser.error("--headless requires --input and can't be used with --restore")
+
+    if args.watch and (args.restore or args.input is None):
+        parser.error("--watch requires --input and can't be used with --restore")
+
+    if args.variant_languages and not args.headless:
+        parser.error("--variant-languages requires --headless")
+
+    if not args.headless:
+        os.system("cls||clear")
+
+    if args.build_dump is not None:
+        from aniname import conf_loader
+        from aniname.local_dump import build_dump
+
+        count = build_dump(args.build_dump, conf_loader.conf.dump_path)
+        get_console().print(f"{count} Anime(s) written to {conf_loader.conf.dump_path}")
+
+        return
+
+    if args.restore:
+        from aniname import restore_utility
+
+        return restore_utility.restore()
+
+    from aniname import conf_loader
+
+    # Set before the rename modules are imported, as they read the languages
+    if args.season_title_language is not None:
+        conf_loader.conf.anime_title_lang = args.season_title_language
+
+    if args.episode_title_language is not None:
+        conf_loader.conf.ep_title_lang = args.episode_title_language
+
+    conf_loader.conf.variant_langs = args.variant_languages
+
+    import asyncio
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    if args.profile is not None:
+        from aniname import profiler
+
+        profiler.enable()
+
+    try:
+        if args.watch:
+            return asyncio.run(run_watch(args.input, args.headless, args.rollback))
+
+        if args.headless:
+            return asyncio.run(
+                run_headless(args.input, args.yes, args.rollback, args.summary_format)
+            )
+
+        asyncio.run(run_interactive(args.input, args.yes, args.rollback))
+    except KeyboardInterrupt:
+        if not args.watch:
+            raise
+    finally:
+        if args.profile is not None:
+            export_profile(args.profile, args.profile_format)
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    multiprocessing.freeze_support()
+    main()
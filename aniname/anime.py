@@ -3,7 +3,6 @@ Contains dataclasses for storing data of Anime(s)
 """
 
 import asyncio
-import json
 from dataclasses import dataclass, field
 from pathlib import Path
 from sys import platform
@@ -13,16 +12,23 @@ from rich.columns import Columns
 from rich.console import Console
 from rich.panel import Panel
 
-from . import conf_loader, utils
-from .config import Config
-from .mal import fetch, parse_anime, parse_episodes
+from . import conf_loader, profiler, utils
+from .config import compile_format
+from .episode_titles import EpisodeTitles, normalize_ep_no
+from .providers import get_provider
+from .rename_engine import JOURNAL_DIR_NAME, RenameTransaction
+from .scan_index import ScanIndex
 
 if platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
+ANIME_TITLE_LANG = conf_loader.conf.anime_title_lang
 EP_TITLE_LANG = conf_loader.conf.ep_title_lang
+VARIANT_LANGS = conf_loader.conf.variant_langs
 EP_TITLE_FORMAT = conf_loader.conf.ep_title_format
 ANIME_TITLE_FORMAT = conf_loader.conf.anime_title_format
+EP_TITLE_RENDERER = compile_format(EP_TITLE_FORMAT)
+ANIME_TITLE_RENDERER = compile_format(ANIME_TITLE_FORMAT)
 MATCH_PATTERN = "*.mkv"
 
 CONSOLE = Console()
@@ -39,80 +45,221 @@ class Anime:
     part: int
     dir_path: Path
     local_ep_range: dict
+    local_ep_numbers: set[int | float] = field(default_factory=set)
+    scan_index: ScanIndex = field(default=None, repr=False)
+    # The episode files to rename (all of them if None), and the episodes
+    # renamed by a previous run
+    episode_names: list[str] = field(default=None, repr=False)
+    done_ep_numbers: set[int | float] = field(default_factory=set, repr=False)
+    folder_id: int = field(default=None, repr=False)
     ep_pages: list = field(init=False, default=None)
+    metadata: dict = field(init=False, default=None, repr=False)
     title: str = field(init=False, default_factory=str)
+    titles: dict[str, str] = field(init=False, default_factory=dict)
     type: str = field(init=False, default_factory=str)
     total_eps: int = field(init=False, default_factory=int)
-    ep_titles: dict = field(init=False, default_factory=dict)
-    rename_log: list[Panel] = field(init=False, default_factory=list)
+    # The titles of the local episodes only, by language
+    ep_titles: dict[str, EpisodeTitles] = field(init=False, default_factory=dict)
+    rename_log: list[tuple[str, str, bool]] = field(init=False, default_factory=list)
+    # The episode renames planned by a dry run
+    planned: list[tuple[str, str]] = field(init=False, default_factory=list)
+    # The folder name and episode filenames in each of VARIANT_LANGS
+    variants: dict[str, tuple] = field(init=False, default_factory=dict)
     new_dir_path: Path = field(init=False, default_factory=Path)
+    dir_renamed: bool = field(init=False, default=False)
+    episodes_task: asyncio.Task = field(init=False, default=None, repr=False)
 
     async def fetch_anime(self):
         """
-        Fetches Anime data from MyAnimeList.
+        Fetches Anime data from the metadata provider.
         """
 
-        url = f"https://myanimelist.net/anime/{self.mal_id}/_/episode?offset=0"
-
-        html = await fetch(url)
-
-        parsed_anime = parse_anime(html, self.mal_id)
+        with profiler.span("fetch anime", track=self.dir_path.name):
+            parsed_anime = await get_provider().fetch_anime(
+                self.mal_id, self.local_ep_numbers
+            )
+        self.metadata = parsed_anime
 
-        self.title = parsed_anime["title"]
+        self.titles = parsed_anime["titles"]
+        self.title = self.titles[ANIME_TITLE_LANG]
         self.total_eps = parsed_anime["total_eps"]
         self.type = parsed_anime["type"]
         self.ep_pages = parsed_anime["ep_pages"]
-        self.ep_titles = parsed_anime["ep_titles"]
+        self.keep_ep_titles([parsed_anime["ep_titles"]])
+
+        # Folders renamed by a previous run keep their name
+        if utils.parse_dir_basename(self.dir_path.name) is None:
+            self.new_dir_path = self.dir_path
+        else:
+            self.new_dir_path = self.name_index(self.dir_path.parent).claim(
+                self.dir_name()
+            )
 
-        anime_info_dict = {"sn": self.season, "pn": self.part, "st": self.title}
-        formatted_dir_name = Config.config_format_parse(
-            ANIME_TITLE_FORMAT, anime_info_dict
-        )
-        self.new_dir_path = utils.path_fix_exisiting(
-            self.dir_path.parent / formatted_dir_name
-        )
+    def dir_name(self, anime_title_lang: str = ANIME_TITLE_LANG) -> str:
+        """
+        Returns the formatted folder name with the Anime title in a language.
+        """
+
+        anime_info_dict = {
+            "sn": self.season,
+            "pn": self.part,
+            "st": self.titles[anime_title_lang],
+        }
+
+        return ANIME_TITLE_RENDERER.render(anime_info_dict)
+
+    def name_index(self, dir_path: Path) -> utils.NameIndex:
+        """
+        Returns the name index of a directory, seeded from the scan index.
+        """
+
+        names = None
+
+        if self.scan_index is not None:
+            names = self.scan_index.names(dir_path)
+
+        return utils.name_index(dir_path, names)
+
+    def episode_paths(self) -> list[Path]:
+        """
+        Returns the sorted paths of the episode files to rename.
+        """
+
+        if self.episode_names is not None:
+            return [self.dir_path / name for name in self.episode_names]
+
+        if self.scan_index is not None:
+            return self.scan_index.episode_paths(self.dir_path)
+
+        return sorted(list(self.dir_path.glob(MATCH_PATTERN)))
+
+    def prefetch_episodes(self) -> asyncio.Task:
+        """
+        Starts fetching episode titles in the background.
+        """
+
+        if self.episodes_task is None:
+            self.episodes_task = asyncio.create_task(self.fetch_episodes())
+
+        return self.episodes_task
 
     async def fetch_episodes(self):
         """
-        Fetches episode titles from MyAnimeList.
+        Fetches the episode titles that weren't fetched with the Anime data.
         """
 
-        if self.local_ep_range["max"] <= 100:
-            return
+        with profiler.span("fetch episodes", track=self.dir_path.name):
+            pages = await get_provider().fetch_episodes(
+                self.mal_id, self.local_ep_numbers, self.metadata
+            )
 
-        tasks = []
+        self.keep_ep_titles(pages)
 
-        if self.local_ep_range["min"] <= 100:
-            self.local_ep_range["min"] += 100
-        min_ep_slice = (self.local_ep_range["min"] - 1) // 100
-        max_ep_slice = ((self.local_ep_range["max"] - 1) // 100) + 1
+        # Only needed to fetch the episode titles
+        self.metadata = None
 
-        tasks = [
-            asyncio.create_task(fetch(page, self.mal_id))
-            for page in self.ep_pages[min_ep_slice:max_ep_slice]
-        ]
+    def keep_ep_titles(self, pages: list[dict[str, dict[str, str]]]) -> None:
+        """
+        Keeps the titles of the local episodes out of the titles of pages,
+        which may list up to 100 episodes each.
+        """
 
-        data = await asyncio.gather(*tasks)
+        for lang in {lang for page in pages for lang in page}:
+            self.ep_titles.setdefault(lang, EpisodeTitles()).merge(
+                [page[lang] for page in pages if lang in page],
+                self.local_ep_numbers,
+            )
 
-        data_clean = {
-            k: [d.get(k) for d in data if d.get(k) is not None]
-            for k in set().union(*data)
-        }
+    def episode_filenames(
+        self,
+        anime_title_lang: str = ANIME_TITLE_LANG,
+        ep_title_lang: str = EP_TITLE_LANG,
+    ) -> list[tuple[str, str]]:
+        """
+        Returns the current and formatted filename of each episode, with the
+        titles in the given languages.
+        """
 
-        episodes = [(parse_episodes(data_clean[id])) for id in data_clean]
+        anitomy_dict = utils.episode_anitomy_dict(self.episode_paths())
+        ep_titles = self.ep_titles[ep_title_lang]
 
-        self.ep_titles.update(episodes[0])
+        filenames = []
 
-    def rename_episodes(self, init_dir: Path) -> None:
+        for anitomy in anitomy_dict:
+            ep_filename = anitomy["file_name"]
+
+            ep_no = normalize_ep_no(anitomy["episode_number"])
+
+            ep_title_dict = {
+                "sn": self.season,
+                "pn": self.part,
+                "st": self.titles[anime_title_lang],
+                "en": utils.format_zeros(ep_no, self.local_ep_range["max"]),
+                "et": ep_titles.get(ep_no),
+            }
+
+            file_ext = Path(ep_filename).suffix
+
+            filenames.append(
+                (ep_filename, EP_TITLE_RENDERER.render(ep_title_dict) + file_ext)
+            )
+
+        return filenames
+
+    def render_variant(
+        self, anime_title_lang: str, ep_title_lang: str
+    ) -> tuple[str, list[tuple[str, str]]]:
         """
-        Renames episode fileanmes using episode data.
+        Returns the formatted folder name and episode filenames with the titles
+        in other languages. The titles of all languages are fetched together,
+        so no further requests are made.
         """
 
-        CONSOLE.print(Align(f"\n[h1][b][u][yellow]Renaming: {self.title}\n", "center"))
+        return self.dir_name(anime_title_lang), self.episode_filenames(
+            anime_title_lang, ep_title_lang
+        )
+
+    def render_variants(self) -> None:
+        """
+        Renders the name variants in VARIANT_LANGS, before the episodes are
+        renamed.
+        """
+
+        self.variants = {
+            lang: self.render_variant(lang, lang) for lang in VARIANT_LANGS
+        }
+
+    def plan_episode_names(self) -> list[tuple[str, str]]:
+        """
+        Returns the current and new filename of each episode, with a ' (x)'
+        suffix for the names that are already taken.
+        """
+
+        renames = []
+        dir_names = self.name_index(self.dir_path)
+
+        with profiler.span("plan renames", track=self.dir_path.name):
+            for ep_filename, new_ep_filename in self.episode_filenames():
+                if new_ep_filename != ep_filename:
+                    # Planned as if the previous episodes were renamed already
+                    new_ep_filename = dir_names.claim(new_ep_filename).name
+                    dir_names.discard(ep_filename)
 
-        ep_file_paths = sorted(list(self.dir_path.glob(MATCH_PATTERN)))
+                renames.append((ep_filename, new_ep_filename))
 
-        anitomy_dict = utils.episode_anitomy_dict(ep_file_paths)
+        return renames
+
+    def plan_renames(self, init_dir: Path) -> RenameTransaction:
+        """
+        Plans the new episode filenames and the folder rename as a transaction.
+        """
+
+        renames = self.plan_episode_names()
+        self.render_variants()
+        backup_dir = init_dir.parent / "ORIGINAL_EPISODE_FILENAMES"
+
+        if not backup_dir.exists():
+            backup_dir.mkdir()
 
         restore_dict = {
             "mal_id": self.mal_id,
@@ -124,65 +271,108 @@ class Anime:
             "restore": {},
         }
 
-        for anitomy in anitomy_dict:
-            ep_file_path: Path = self.dir_path / anitomy["file_name"]
+        return RenameTransaction(
+            dir_path=self.dir_path,
+            renames=renames,
+            journal_dir=backup_dir / JOURNAL_DIR_NAME,
+            new_dir_path=self.new_dir_path,
+            manifest_name=self.new_dir_path.name,
+            manifest=restore_dict,
+        )
+
+    def apply_renames(self, transaction: RenameTransaction) -> None:
+        """
+        Records the result of an executed rename transaction in the rename log
+        and updates the name and scan indexes.
+        """
 
-            old_ep_filename = ep_file_path.stem
-            file_ext = ep_file_path.suffix
+        dir_names = self.name_index(self.dir_path)
+        renamed = {}
 
-            ep_no = anitomy["episode_number"]
+        for (old_ep_filename, new_ep_filename), success in zip(
+            transaction.renames, transaction.renamed
+        ):
+            self.rename_log.append((old_ep_filename, new_ep_filename, success))
 
-            episode_title = self.ep_titles[str(ep_no)]
+            if success:
+                renamed[old_ep_filename] = new_ep_filename
+            else:
+                dir_names.discard(new_ep_filename)
+                dir_names.claim(old_ep_filename)
 
-            ep_title_dict = {
-                "sn": self.season,
-                "pn": self.part,
-                "st": self.title,
-                "en": utils.format_zeros(ep_no, self.local_ep_range["max"]),
-                "et": episode_title,
-            }
+        self.dir_renamed = transaction.dir_renamed
 
-            new_ep_filename = (
-                Config.config_format_parse(EP_TITLE_FORMAT, ep_title_dict) + file_ext
-            )
+        profiler.count("files.renamed", len(renamed))
+        profiler.count("files.failed", len(transaction.renames) - len(renamed))
+        profiler.count("folders.renamed", int(transaction.dir_renamed))
 
-            if self.dir_path / new_ep_filename != ep_file_path:
-                new_ep_filename = utils.path_fix_exisiting(
-                    self.dir_path / new_ep_filename
-                ).name
+        if transaction.dir_renamed:
+            self.name_index(self.dir_path.parent).discard(self.dir_path.name)
+            utils.forget_name_index(self.dir_path)
 
-            try:
-                ep_file_path.rename(self.dir_path / new_ep_filename)
+        if self.scan_index is not None:
+            self.scan_index.rename_files(self.dir_path, renamed)
 
-                self.rename_log.append(
-                    Panel(
-                        f"[b]{old_ep_filename + file_ext}\n\n[green]{new_ep_filename}"
-                    )
-                )
+            if transaction.dir_renamed:
+                self.scan_index.rename_dir(self.dir_path, self.new_dir_path)
 
-                restore_dict["restore"].update(
-                    {f"{new_ep_filename}": f"{old_ep_filename}{file_ext}"}
-                )
+    def print_rename_log(self) -> None:
+        """
+        Prints the rename log.
+        """
 
-                restore_dict["rename_count"] += 1
-            except Exception:
-                self.rename_log.append(
-                    Panel(f"[b]{old_ep_filename}\n\n[red]Failed to rename")
-                )
+        panels = [
+            (
+                Panel(f"[b]{old_ep_filename}\n\n[green]{new_ep_filename}")
+                if success
+                else Panel(f"[b]{Path(old_ep_filename).stem}\n\n[red]Failed to rename")
+            )
+            for old_ep_filename, new_ep_filename, success in self.rename_log
+        ]
 
-        self.dir_path.rename(self.new_dir_path)
+        CONSOLE.print(Align(f"\n[h1][b][u][yellow]Renaming: {self.title}\n", "center"))
+        CONSOLE.print(Align(Columns(panels), "center"))
 
-        backup_dir = init_dir.parent / "ORIGINAL_EPISODE_FILENAMES"
+    def summary(self) -> dict:
+        """
+        Returns the rename log as a JSON serializable dict.
+        """
 
-        if not backup_dir.exists():
-            backup_dir.mkdir()
+        return {
+            "mal_id": int(self.mal_id),
+            "title": self.title,
+            "titles": self.titles,
+            "season": self.season,
+            "part": self.part,
+            "dir_path": str(self.dir_path),
+            "new_dir_path": str(self.new_dir_path),
+            "dir_renamed": self.dir_renamed,
+            "renamed": sum(success for _, _, success in self.rename_log),
+            "failed": sum(not success for _, _, success in self.rename_log),
+            "episodes": [
+                {"old": old_ep_filename, "new": new_ep_filename, "renamed": success}
+                for old_ep_filename, new_ep_filename, success in self.rename_log
+            ],
+            "planned": [
+                {"old": old_ep_filename, "new": new_ep_filename}
+                for old_ep_filename, new_ep_filename in self.planned
+            ],
+            "variants": {
+                lang: {
+                    "dir_name": dir_name,
+                    "episodes": [{"old": old, "new": new} for old, new in filenames],
+                }
+                for lang, (dir_name, filenames) in self.variants.items()
+            },
+        }
+
+    def rename_episodes(self, init_dir: Path) -> None:
+        """
+        Renames episode fileanmes using episode data.
+        """
 
-        with open(
-            backup_dir
-            / utils.path_fix_exisiting(backup_dir / f"{self.new_dir_path.name}.json"),
-            "w",
-            encoding="utf-8",
-        ) as file:
-            file.write(json.dumps(restore_dict, indent=4))
+        transaction = self.plan_renames(init_dir)
+        transaction.execute()
 
-        CONSOLE.print(Align(Columns(self.rename_log), "center"))
\ No newline at end of file
+        self.apply_renames(transaction)
+        self.print_rename_log()
@@ -1,14 +1,27 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass, field
 from pathlib import Path
 
-from . import conf_loader, utils
-from .anime import Anime
-from .error_handler import HandleError
+from . import conf_loader, library_state, parse_cache, profiler, scan_index, utils
+from .anime import MATCH_PATTERN, Anime
+from .episode_titles import normalize_ep_no
+from .error_handler import AnimeError, HandleError
+from .library_state import FolderStatus, LibraryState
+from .rename_engine import RenameTransaction
+from .scan_index import ScanIndex
 
 ANIME_TITLE_LANG = conf_loader.conf.anime_title_lang
 EP_TITLE_LANG = conf_loader.conf.ep_title_lang
 AUTO_NAME = conf_loader.conf.auto_rename
+RENAME_WORKERS = conf_loader.conf.rename_workers
+SCAN_INDEX_DIR = (
+    conf_loader.config_dir / "scan_index" if conf_loader.conf.scan_index else None
+)
+
+# The errors of a single Anime, which only skip it with skip_errors
+ANIME_ERRORS = (AnimeError, OSError)
 
 from rich.console import Console
 
@@ -24,41 +37,296 @@ class AnimeList:
     init_dir: Path = field(default_factory=Path)
     mal_id_list: list[int] = field(default_factory=list)
     animes: list[Anime] = field(default_factory=list)
+    index: ScanIndex = field(default=None, repr=False)
+    state: LibraryState = field(default=None, repr=False)
+    quiet: bool = False
+    # Skips the Anime(s) failing with ANIME_ERRORS instead of failing the run
+    skip_errors: bool = False
+    failed: list[tuple[Anime, Exception]] = field(default_factory=list)
+
+    def status(self, message: str):
+        """
+        Returns a spinner showing a status message, unless running quietly.
+        """
+
+        if self.quiet:
+            return nullcontext()
+
+        return CONSOLE.status(message, spinner="point")
 
     async def rename_animes(self):
+        """
+        Renames the Anime(s) as soon as their episode titles are fetched.
+
+        The renames of different Anime(s) run in parallel on a thread pool,
+        and their rename logs are printed in order once they're done.
+        """
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=RENAME_WORKERS)
+
+        fetching = {anime.prefetch_episodes(): i for i, anime in enumerate(self.animes)}
+        renaming = {}
+        renamed = [False] * len(self.animes)
+        skipped = [False] * len(self.animes)
+        next_log = 0
+
+        try:
+            while fetching or renaming:
+                status = "Fetching Episodes" if fetching else "Renaming"
+
+                with self.status(status):
+                    done, _ = await asyncio.wait(
+                        [*fetching, *renaming], return_when=asyncio.FIRST_COMPLETED
+                    )
+
+                for future in done:
+                    if future in fetching:
+                        i = fetching.pop(future)
+
+                        if self.skipped(self.animes[i], future):
+                            renamed[i] = skipped[i] = True
+                            continue
+
+                        transaction = self.animes[i].plan_renames(self.init_dir)
+                        renaming[
+                            loop.run_in_executor(executor, transaction.execute)
+                        ] = (i, transaction)
+                    else:
+                        future.result()
+                        i, transaction = renaming.pop(future)
+                        self.animes[i].apply_renames(transaction)
+                        self.record_renames(self.animes[i], transaction)
+                        renamed[i] = True
+
+                while next_log < len(self.animes) and renamed[next_log]:
+                    if not self.quiet and not skipped[next_log]:
+                        self.animes[next_log].print_rename_log()
+
+                    next_log += 1
+
+            self.remove_failed()
+        finally:
+            executor.shutdown()
+
+            if self.state is not None:
+                self.state.flush()
+
+    def skipped(self, anime: Anime, future: asyncio.Future) -> bool:
+        """
+        Checks if fetching the episode titles of an Anime failed with an error
+        skipping it, and keeps the error.
+        """
+
+        error = future.exception()
+
+        if error is None:
+            return False
+
+        if not self.skip_errors or not isinstance(error, ANIME_ERRORS):
+            raise error
+
+        self.failed.append((anime, error))
+
+        return True
+
+    def remove_failed(self) -> None:
+        failed = {id(anime) for anime, _ in self.failed}
+
+        self.animes = [anime for anime in self.animes if id(anime) not in failed]
+        self.mal_id_list = [int(anime.mal_id) for anime in self.animes]
+
+    def record_renames(self, anime: Anime, transaction: RenameTransaction) -> None:
+        """
+        Records the renamed episode files of an Anime in the library state.
+        """
+
+        if self.state is None:
+            return
+
+        entry = self.index.get(transaction.final_dir_path())
+
+        if entry is None:
+            return
+
+        files = {file.name: file for file in entry.files}
+        episodes = [
+            (
+                files[new_ep_filename],
+                normalize_ep_no(
+                    parse_cache.parse(
+                        utils.remove_part_no(old_ep_filename),
+                        utils.EP_ANITOMY_OPTIONS,
+                    )["episode_number"]
+                ),
+            )
+            for (old_ep_filename, new_ep_filename), success in zip(
+                transaction.renames, transaction.renamed
+            )
+            if success and new_ep_filename in files
+        ]
+
+        anime.folder_id = self.state.record(
+            anime.folder_id,
+            anime.mal_id,
+            anime.season,
+            anime.part,
+            transaction.final_dir_path(),
+            entry,
+            episodes,
+        )
+
+    def cancel_fetches(self) -> None:
+        """
+        Cancels episode titles that are still being fetched.
+        """
+
         for anime in self.animes:
-            with CONSOLE.status("Fetching Episodes", spinner="point"):
-                await anime.fetch_episodes()
-            anime.rename_episodes(init_dir=self.init_dir)
+            if anime.episodes_task is not None:
+                anime.episodes_task.cancel()
 
-    async def scan_animes(self) -> None:
+    async def scan_animes(self, dir_paths: list[Path] = None) -> None:
         """
-        Find dir(s) matching format and fetch Anime data.
+        Find dir(s) matching format (or renamed by a previous run) with
+        episodes to rename, and fetch Anime data.
+
+        With dir_paths, only those folders of the (already built) index are
+        used, and having none of them match the format isn't an error.
         """
-        with CONSOLE.status("Scanning for Anime(s)", spinner="point"):
-            anime_dir_paths: list[Path] = utils.find_formatted_subdir(self.init_dir)
+        self.state = library_state.get_library_state(
+            self.init_dir.parent / "ORIGINAL_EPISODE_FILENAMES"
+        )
+
+        if dir_paths is None:
+            with self.status("Scanning for Anime(s)"), profiler.span("scan"):
+                self.index = scan_index.scan(
+                    self.init_dir, MATCH_PATTERN, SCAN_INDEX_DIR
+                )
+                found = self.find_animes(map(Path, self.index.dirs))
+
+            if found == 0:
+                raise NoMatchingDir
+        else:
+            self.find_animes(dir_paths)
+
+        if len(self.animes) == 0:
+            return
+
+        with self.status("Fetching Anime data"):
+            # Episode filenames are parsed in one batch for all Anime(s)
+            scan_task = asyncio.create_task(self.scan_episodes())
+
+            await asyncio.gather(
+                scan_task,
+                *[self.fetch_anime(anime, scan_task) for anime in self.animes],
+            )
+
+        self.remove_failed()
+
+    def find_animes(self, dir_paths) -> int:
+        """
+        Adds the Anime(s) of the folders matching the format, or renamed by a
+        previous run, that have episodes to rename. Returns the number of
+        folders found, including those with nothing to rename.
+        """
+
+        found = 0
+
+        for path in dir_paths:
+            entry = self.index.get(path)
+
+            if entry is None or not entry.files:
+                continue
+
+            ids = utils.parse_dir_basename(path.name)
+            status = FolderStatus()
+
+            if self.state is not None:
+                status = self.state.status(str(path), entry)
 
-        if len(anime_dir_paths) == 0:
-            raise NoMatchingDir
+            folder = status.folder
 
-        with CONSOLE.status("Fetching Anime data", spinner="point"):
-            fetch_anime_tasks = []
+            if ids is None:
+                if folder is None:
+                    continue
 
-            for path in anime_dir_paths:
-                mal_id, season_no, part_no = utils.parse_dir_basename(path.name)
-                local_ep_min, local_ep_max = utils.get_local_ep_range(path)
-                self.mal_id_list.append(int(mal_id))
-                anime = Anime(
+                ids = (str(folder.mal_id), folder.season, folder.part)
+
+            found += 1
+            episode_names = None
+
+            if folder is not None:
+                episode_names = status.new_files
+
+                if len(episode_names) == 0:
+                    profiler.count("library_state.skipped_folders")
+                    continue
+
+            mal_id, season_no, part_no = ids
+            self.mal_id_list.append(int(mal_id))
+            self.animes.append(
+                Anime(
                     mal_id=mal_id,
                     season=season_no,
                     part=part_no,
                     dir_path=path,
-                    local_ep_range={"min": local_ep_min, "max": local_ep_max},
+                    local_ep_range={},
+                    scan_index=self.index,
+                    episode_names=episode_names,
+                    done_ep_numbers=status.done_ep_numbers,
+                    folder_id=folder.folder_id if folder is not None else None,
                 )
-                self.animes.append(anime)
-                fetch_anime_tasks.append(asyncio.create_task(anime.fetch_anime()))
+            )
+
+        return found
+
+    async def scan_episodes(self) -> None:
+        """
+        Parses the episode filenames and finds the local episode range of each Anime.
+        """
+
+        with profiler.span("parse filenames"):
+            await parse_cache.parse_many(
+                [
+                    utils.remove_part_no(path.name)
+                    for anime in self.animes
+                    for path in anime.episode_paths()
+                ],
+                utils.EP_ANITOMY_OPTIONS,
+            )
+
+        for anime in self.animes:
+            anime.local_ep_numbers = set(
+                utils.get_local_ep_numbers(
+                    anime.dir_path, ep_paths=anime.episode_paths()
+                )
+            )
+            # Padded like the episodes renamed by previous runs
+            ep_numbers = anime.local_ep_numbers | anime.done_ep_numbers
+            anime.local_ep_range.update(
+                {"min": min(ep_numbers), "max": max(ep_numbers)}
+            )
+
+    async def fetch_anime(self, anime: Anime, scan_task: asyncio.Task) -> None:
+        """
+        Fetches Anime data and starts fetching its episode titles right away,
+        so they are fetched while the user confirms the rename.
+
+        The episode numbers are needed to know which episode pages to fetch.
+        """
+
+        await scan_task
+
+        try:
+            await anime.fetch_anime()
+        except ANIME_ERRORS as error:
+            if not self.skip_errors:
+                raise
+
+            self.failed.append((anime, error))
+            return
 
-            await asyncio.gather(*fetch_anime_tasks)
+        anime.prefetch_episodes()
 
 
 class NoMatchingDir(Exception):
@@ -0,0 +1,252 @@
+"""
+Contains the backup store, keeping the original episode filenames of every
+renamed folder in one SQLite database in ORIGINAL_EPISODE_FILENAMES.
+
+Backups used to be written as one JSON file per folder. Those files are
+moved into the store (and out of the way) when it's opened.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+STORE_FILE_NAME = "backups.sqlite3"
+MIGRATED_DIR_NAME = ".migrated"
+
+_backup_store = None
+_backup_store_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class BackupInfo:
+    """
+    Dataclass for the metadata of a backup, listed without its filenames.
+    """
+
+    backup_id: int
+    name: str
+    mal_id: int
+    title: str
+    dir_path: str
+    season: str
+    part: str
+    rename_count: int
+
+
+class BackupStore:
+    """
+    The backups of a library. The metadata of the backups is kept apart from
+    their filenames, which are clustered by backup so that restoring one
+    backup only reads its own filenames.
+    """
+
+    def __init__(self, backup_dir: Path) -> None:
+        self.backup_dir = backup_dir
+        self.lock = threading.Lock()
+
+        os.makedirs(backup_dir, exist_ok=True)
+
+        # Backups are added from the rename threads
+        self.connection = sqlite3.connect(
+            backup_dir / STORE_FILE_NAME, check_same_thread=False
+        )
+        # The store is often on a network share, where WAL doesn't work. Stores
+        # created in WAL mode are switched back to the default rollback journal
+        self.connection.execute("PRAGMA journal_mode = DELETE")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS backups (
+                backup_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                mal_id INTEGER,
+                title TEXT,
+                dir_path TEXT NOT NULL,
+                season TEXT,
+                part TEXT,
+                rename_count INTEGER NOT NULL
+            )"""
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS filenames (
+                backup_id INTEGER NOT NULL,
+                new_name TEXT NOT NULL,
+                old_name TEXT NOT NULL,
+                PRIMARY KEY (backup_id, new_name)
+            ) WITHOUT ROWID"""
+        )
+        self.connection.commit()
+
+        self.names = {
+            name for name, in self.connection.execute("SELECT name FROM backups")
+        }
+
+        self.migrate()
+
+    def unique_name(self, name: str) -> str:
+        """
+        Returns the name expanded with a ' (x)' suffix if a backup has it
+        already, like the backup files were named.
+        """
+
+        unique, idx = name, 0
+
+        while unique in self.names:
+            idx += 1
+            unique = f"{name} ({idx})"
+
+        return unique
+
+    def insert(self, name: str, manifest: dict) -> str:
+        name = self.unique_name(name)
+        restore = manifest.get("restore") or {}
+
+        backup_id = self.connection.execute(
+            "INSERT INTO backups VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                manifest.get("mal_id"),
+                manifest.get("title"),
+                manifest["dir_path"],
+                manifest.get("season"),
+                manifest.get("part"),
+                len(restore),
+            ),
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO filenames VALUES (?, ?, ?)",
+            ((backup_id, new, old) for new, old in restore.items()),
+        )
+        self.names.add(name)
+
+        return name
+
+    def add(self, name: str, manifest: dict) -> str:
+        """
+        Adds the backup of a folder (a manifest with the names to restore),
+        and returns its name.
+        """
+
+        with self.lock:
+            name = self.insert(name, manifest)
+            self.connection.commit()
+
+        return name
+
+    def migrate(self) -> None:
+        """
+        Moves the backup files of earlier versions into the store. Files that
+        can't be read are left where they are.
+        """
+
+        json_paths = sorted(self.backup_dir.glob("*.json"))
+        migrated = []
+
+        for json_path in json_paths:
+            try:
+                with open(json_path, encoding="utf-8") as file:
+                    manifest = json.load(file)
+
+                # Added already by a migration that was interrupted
+                if not self.migrated(json_path.stem, manifest):
+                    self.insert(json_path.stem, manifest)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                continue
+
+            migrated.append(json_path)
+
+        if not migrated:
+            return
+
+        self.connection.commit()
+
+        migrated_dir = self.backup_dir / MIGRATED_DIR_NAME
+        os.makedirs(migrated_dir, exist_ok=True)
+
+        for json_path in migrated:
+            os.replace(json_path, migrated_dir / json_path.name)
+
+    def migrated(self, name: str, manifest: dict) -> bool:
+        if name not in self.names:
+            return False
+
+        row = self.connection.execute(
+            "SELECT 1 FROM backups WHERE name = ? AND dir_path = ?",
+            (name, manifest["dir_path"]),
+        ).fetchone()
+
+        return row is not None
+
+    def backups(self) -> list[BackupInfo]:
+        """
+        Returns the metadata of the backups, sorted by name.
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM backups ORDER BY name, backup_id"
+            ).fetchall()
+
+        return [BackupInfo(*row) for row in rows]
+
+    def load(self, info: BackupInfo) -> dict:
+        """
+        Returns a backup as a manifest, with the names to restore.
+        """
+
+        with self.lock:
+            restore = dict(
+                self.connection.execute(
+                    "SELECT new_name, old_name FROM filenames WHERE backup_id = ?",
+                    (info.backup_id,),
+                )
+            )
+
+        return {
+            "mal_id": info.mal_id,
+            "title": info.title,
+            "dir_path": info.dir_path,
+            "season": info.season,
+            "part": info.part,
+            "rename_count": info.rename_count,
+            "restore": restore,
+        }
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def has_backups(backup_dir: Path) -> bool:
+    """
+    Checks if a folder has a backup store, or backup files to migrate.
+    """
+
+    return (backup_dir / STORE_FILE_NAME).exists() or any(backup_dir.glob("*.json"))
+
+
+def get_backup_store(backup_dir: Path) -> BackupStore:
+    """
+    Returns the backup store in backup_dir, opening it on first use.
+    """
+
+    global _backup_store
+
+    with _backup_store_lock:
+        if _backup_store is not None and _backup_store.backup_dir != backup_dir:
+            _backup_store.close()
+            _backup_store = None
+
+        if _backup_store is None:
+            _backup_store = BackupStore(backup_dir)
+
+        return _backup_store
+
+
+def close_backup_store() -> None:
+    global _backup_store
+
+    with _backup_store_lock:
+        if _backup_store is not None:
+            _backup_store.close()
+            _backup_store = None
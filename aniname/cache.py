@@ -0,0 +1,173 @@
+"""
+Contains a persistent cache for data parsed from MyAnimeList.
+"""
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import conf_loader
+
+CACHE_FILE_NAME = "mal_cache.sqlite3"
+SCHEMA_VERSION = 2
+
+_metadata_cache = None
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """
+    Dataclass for a cached MyAnimeList page.
+    """
+
+    data: dict
+    etag: str
+    last_modified: str
+    fetched_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        """
+        Checks if the entry is younger than the TTL (in seconds).
+        """
+
+        return time.time() - self.fetched_at < ttl
+
+
+class MetadataCache:
+    """
+    A size-bounded LRU cache of parsed MyAnimeList pages stored in SQLite.
+
+    Pages are stored with the titles in all languages, so a page is served
+    from the cache whatever the title languages are.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(db_path)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < SCHEMA_VERSION:
+            # Pages used to be cached per title language
+            self.connection.execute("DROP TABLE IF EXISTS pages")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                mal_id INTEGER NOT NULL,
+                page_offset INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (mal_id, page_offset)
+            )"""
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)"
+        )
+        self.connection.commit()
+
+    def get(self, mal_id, offset: int) -> CacheEntry | None:
+        """
+        Returns the cached entry for a page, or None if it isn't cached.
+        """
+
+        row = self.connection.execute(
+            """SELECT data, etag, last_modified, fetched_at FROM pages
+            WHERE mal_id = ? AND page_offset = ?""",
+            (int(mal_id), offset),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        self.connection.execute(
+            """UPDATE pages SET accessed_at = ?
+            WHERE mal_id = ? AND page_offset = ?""",
+            (time.time(), int(mal_id), offset),
+        )
+        self.connection.commit()
+
+        return CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+
+    def put(
+        self,
+        mal_id,
+        offset: int,
+        data: dict,
+        etag: str = None,
+        last_modified: str = None,
+    ) -> None:
+        """
+        Stores a parsed page and evicts the least recently used entries.
+        """
+
+        now = time.time()
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                int(mal_id),
+                offset,
+                json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+                etag,
+                last_modified,
+                now,
+                now,
+            ),
+        )
+        self.connection.execute(
+            """DELETE FROM pages WHERE rowid IN (
+                SELECT rowid FROM pages ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+        self.connection.commit()
+
+    def touch(self, mal_id, offset: int) -> None:
+        """
+        Marks a cached page as freshly fetched after a successful revalidation.
+        """
+
+        now = time.time()
+
+        self.connection.execute(
+            """UPDATE pages SET fetched_at = ?, accessed_at = ?
+            WHERE mal_id = ? AND page_offset = ?""",
+            (now, now, int(mal_id), offset),
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_metadata_cache() -> MetadataCache | None:
+    """
+    Returns the shared metadata cache, or None if caching is disabled.
+    """
+
+    global _metadata_cache
+
+    if not conf_loader.conf.cache_enabled and not conf_loader.conf.offline:
+        return None
+
+    if _metadata_cache is None:
+        _metadata_cache = MetadataCache(
+            conf_loader.config_dir / CACHE_FILE_NAME,
+            conf_loader.conf.cache_max_entries,
+        )
+
+    return _metadata_cache
+
+
+def close_metadata_cache() -> None:
+    global _metadata_cache
+
+    if _metadata_cache is not None:
+        _metadata_cache.close()
+        _metadata_cache = None
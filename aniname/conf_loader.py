@@ -3,12 +3,32 @@ from pathlib import Path
 
 from appdirs import user_config_dir
 
-from .config import Config
-
 config_dir = Path(user_config_dir("AniName", False, roaming=True))
 
-os.makedirs(config_dir, exist_ok=True)
-
 conf_file_path = config_dir / "conf.ini"
 
-conf = Config(conf_file_path)
+_conf = None
+
+
+def get_conf():
+    """
+    Returns the options from the config file, which is read on first use.
+    """
+
+    global _conf
+
+    if _conf is None:
+        from .config import Config
+
+        os.makedirs(config_dir, exist_ok=True)
+        _conf = Config(conf_file_path)
+
+    return _conf
+
+
+def __getattr__(name: str):
+    # `conf_loader.conf` reads the config file when it's first accessed
+    if name == "conf":
+        return get_conf()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,12 +4,16 @@ Contains dataclass and methods required to use a config file.
 
 from configparser import ConfigParser, ParsingError
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 
 import regex
 
 from . import utils
 from .error_handler import HandleError
+from .providers import DUMP_FILE_NAME, PROVIDERS
+
+WATCH_BACKENDS = ("auto", "inotify", "polling")
 
 
 @dataclass(slots=True)
@@ -22,7 +26,41 @@ class Config:
     anime_title_format: str = field(init=False, default_factory=str)
     ep_title_lang: str = field(init=False, default_factory=str)
     anime_title_lang: str = field(init=False, default_factory=str)
+    # Languages of the extra name variants in the headless summary
+    variant_langs: list[str] = field(init=False, default_factory=list)
     auto_rename: bool = field(init=False, default_factory=bool)
+    cache_enabled: bool = field(init=False, default=True)
+    cache_ttl: float = field(init=False, default=168.0)
+    cache_max_entries: int = field(init=False, default=5000)
+    offline: bool = field(init=False, default=False)
+    scan_index: bool = field(init=False, default=True)
+    library_state: bool = field(init=False, default=True)
+    parse_cache: bool = field(init=False, default=True)
+    parse_cache_size: int = field(init=False, default=100000)
+    parse_workers: int = field(init=False, default=0)
+    parse_chunk_size: int = field(init=False, default=256)
+    rename_workers: int = field(init=False, default=4)
+    max_in_flight: int = field(init=False, default=4)
+    requests_per_second: float = field(init=False, default=2.0)
+    request_burst: int = field(init=False, default=4)
+    max_retries: int = field(init=False, default=5)
+    backoff_base: float = field(init=False, default=1.0)
+    backoff_max: float = field(init=False, default=60.0)
+    connection_limit: int = field(init=False, default=10)
+    connection_limit_per_host: int = field(init=False, default=4)
+    keepalive_timeout: float = field(init=False, default=30.0)
+    dns_cache_ttl: int = field(init=False, default=300)
+    timeout_total: float = field(init=False, default=60.0)
+    timeout_connect: float = field(init=False, default=15.0)
+    compression: bool = field(init=False, default=True)
+    proxy: str = field(init=False, default_factory=str)
+    user_agent: str = field(init=False, default_factory=str)
+    base_url: str = field(init=False, default="https://myanimelist.net")
+    metadata_provider: str = field(init=False, default="mal")
+    dump_path: Path = field(init=False, default=None)
+    watch_backend: str = field(init=False, default="auto")
+    watch_debounce: float = field(init=False, default=1.0)
+    watch_poll_interval: float = field(init=False, default=5.0)
 
     def __init__(self, conf_path: Path) -> None:
         """
@@ -44,7 +82,54 @@ auto_rename = true
 [formatting]
 
 episode_format = {S&sn|}{P&pn|}{E&en|}{{ - }}{et|}
-season_format = {S&sn|}{P&pn|}{{ - }}{st|}"""
+season_format = {S&sn|}{P&pn|}{{ - }}{st|}
+
+[cache]
+
+enabled = true
+ttl_hours = 168
+max_entries = 5000
+offline = false
+scan_index = true
+library_state = true
+parse_cache = true
+parse_cache_size = 100000
+
+[performance]
+
+parse_workers = 0
+parse_chunk_size = 256
+rename_workers = 4
+
+[network]
+
+max_in_flight = 4
+requests_per_second = 2
+burst = 4
+max_retries = 5
+backoff_base = 1
+backoff_max = 60
+connection_limit = 10
+connection_limit_per_host = 4
+keepalive_timeout = 30
+dns_cache_ttl = 300
+timeout_total = 60
+timeout_connect = 15
+compression = true
+proxy =
+user_agent =
+base_url = https://myanimelist.net
+
+[metadata]
+
+provider = mal
+dump_path =
+
+[watch]
+
+backend = auto
+debounce = 1
+poll_interval = 5"""
                 )
         except FileExistsError:
             pass
@@ -64,63 +149,260 @@ season_format = {S&sn|}{P&pn|}{{ - }}{st|}"""
             self.anime_title_lang = config_file["preferences"]["season_title_language"]
 
             self.auto_rename = config_file["preferences"]["auto_rename"]
+            # Only set from the command line
+            self.variant_langs = []
         except KeyError as exception:
             HandleError.config_key_error(exception)
 
+        try:
+            self.cache_enabled = config_file.getboolean(
+                "cache", "enabled", fallback=True
+            )
+            self.cache_ttl = config_file.getfloat("cache", "ttl_hours", fallback=168.0)
+            self.cache_max_entries = config_file.getint(
+                "cache", "max_entries", fallback=5000
+            )
+            self.offline = config_file.getboolean("cache", "offline", fallback=False)
+            self.scan_index = config_file.getboolean(
+                "cache", "scan_index", fallback=True
+            )
+            self.library_state = config_file.getboolean(
+                "cache", "library_state", fallback=True
+            )
+            self.parse_cache = config_file.getboolean(
+                "cache", "parse_cache", fallback=True
+            )
+            self.parse_cache_size = config_file.getint(
+                "cache", "parse_cache_size", fallback=100000
+            )
+
+            self.parse_workers = config_file.getint(
+                "performance", "parse_workers", fallback=0
+            )
+            self.parse_chunk_size = config_file.getint(
+                "performance", "parse_chunk_size", fallback=256
+            )
+            self.rename_workers = max(
+                1, config_file.getint("performance", "rename_workers", fallback=4)
+            )
+
+            self.max_in_flight = config_file.getint(
+                "network", "max_in_flight", fallback=4
+            )
+            self.requests_per_second = config_file.getfloat(
+                "network", "requests_per_second", fallback=2.0
+            )
+            self.request_burst = config_file.getint("network", "burst", fallback=4)
+            self.max_retries = config_file.getint("network", "max_retries", fallback=5)
+            self.backoff_base = config_file.getfloat(
+                "network", "backoff_base", fallback=1.0
+            )
+            self.backoff_max = config_file.getfloat(
+                "network", "backoff_max", fallback=60.0
+            )
+            self.connection_limit = config_file.getint(
+                "network", "connection_limit", fallback=10
+            )
+            self.connection_limit_per_host = config_file.getint(
+                "network", "connection_limit_per_host", fallback=4
+            )
+            self.keepalive_timeout = config_file.getfloat(
+                "network", "keepalive_timeout", fallback=30.0
+            )
+            self.dns_cache_ttl = config_file.getint(
+                "network", "dns_cache_ttl", fallback=300
+            )
+            self.timeout_total = config_file.getfloat(
+                "network", "timeout_total", fallback=60.0
+            )
+            self.timeout_connect = config_file.getfloat(
+                "network", "timeout_connect", fallback=15.0
+            )
+            self.compression = config_file.getboolean(
+                "network", "compression", fallback=True
+            )
+            self.proxy = config_file.get("network", "proxy", fallback="").strip()
+            self.user_agent = config_file.get(
+                "network", "user_agent", fallback=""
+            ).strip()
+            self.base_url = config_file.get(
+                "network", "base_url", fallback="https://myanimelist.net"
+            ).strip().rstrip("/")
+
+            self.metadata_provider = config_file.get(
+                "metadata", "provider", fallback="mal"
+            ).strip()
+
+            if self.metadata_provider not in PROVIDERS:
+                raise ValueError(
+                    f"provider must be one of {', '.join(PROVIDERS)}, "
+                    f"not {self.metadata_provider!r}"
+                )
+
+            dump_path = config_file.get("metadata", "dump_path", fallback="").strip()
+            self.dump_path = (
+                Path(dump_path) if dump_path else conf_path.parent / DUMP_FILE_NAME
+            )
+
+            self.watch_backend = config_file.get(
+                "watch", "backend", fallback="auto"
+            ).strip()
+
+            if self.watch_backend not in WATCH_BACKENDS:
+                raise ValueError(
+                    f"backend must be one of {', '.join(WATCH_BACKENDS)}, "
+                    f"not {self.watch_backend!r}"
+                )
+
+            self.watch_debounce = config_file.getfloat(
+                "watch", "debounce", fallback=1.0
+            )
+            self.watch_poll_interval = config_file.getfloat(
+                "watch", "poll_interval", fallback=5.0
+            )
+        except ValueError as exception:
+            HandleError.config_parsing_error(exception)
+
     @staticmethod
     def config_format_parse(title_format: str, args: dict) -> str:
         """
         Parses config format and replaces variables with values.
         """
 
-        format_split = regex.split(r"{((?:[^{}]|(?R))*)}", title_format)
+        return compile_format(title_format).render(args)
+
 
-        format_split = list(filter(None, format_split))
+@dataclass(slots=True)
+class FormatField:
+    """
+    Dataclass for a field of a compiled config format.
 
-        for i, arg in enumerate(format_split[:]):
-            arg_split = regex.split(r"([\\+]|[\&+]|[\|]|[\s+])", arg)
+    `tokens` are the literal text and variable names of the field, in order,
+    and `default` replaces the whole field when one of its variables is None.
+    """
 
-            default = ""
+    tokens: tuple[str, ...]
+    default: str
 
-            if arg_split[len(arg_split) - 2] == "|":
-                default = arg_split[len(arg_split) - 1]
-                arg_split = arg_split[:-2]
 
-            arg_split = list(filter(None, arg_split))
+@dataclass(slots=True)
+class CompiledFormat:
+    """
+    A config format parsed once, which can be rendered for many sets of values.
+    """
 
-            new_arg_split = []
+    fields: tuple[FormatField, ...]
+    programs: dict = field(default_factory=dict)
 
-            for j, sub_arg in enumerate(arg_split):
-                if sub_arg == "\\":
-                    pass
-                elif sub_arg == "&":
-                    if arg_split[j - 1] == "\\":
-                        new_arg_split.append(sub_arg)
-                elif str(sub_arg) in args:
-                    if args[sub_arg] is None:
-                        new_arg_split = [default]
-                        break
-                    new_arg_split.append(args[arg_split[j]])
+    def program(self, keys: tuple) -> tuple:
+        """
+        Resolves which tokens are variables for a set of value names, merging
+        adjacent literal text. Fields without variables are rendered here.
+        """
+
+        program = self.programs.get(keys)
+
+        if program is not None:
+            return program
+
+        program = []
+
+        for format_field in self.fields:
+            parts = []
+
+            for token in format_field.tokens:
+                if token in keys:
+                    parts.append((True, token))
+                elif parts and not parts[-1][0]:
+                    parts[-1] = (False, parts[-1][1] + token)
                 else:
-                    new_arg_split.append(sub_arg)
+                    parts.append((False, token))
+
+            if all(not is_var for is_var, _ in parts):
+                program.append("".join(part for _, part in parts))
+            else:
+                program.append((tuple(parts), format_field.default))
+
+        program = self.programs[keys] = tuple(program)
+
+        return program
+
+    def render(self, args: dict) -> str:
+        """
+        Replaces the variables of the format with values.
+        """
+
+        format_split = []
+
+        for rendered in self.program(tuple(args)):
+            if rendered.__class__ is not str:
+                parts, default = rendered
+                values = []
+
+                for is_var, part in parts:
+                    if is_var:
+                        part = args[part]
+
+                        if part is None:
+                            values = [default]
+                            break
 
-            format_split[i] = "".join(new_arg_split)
+                    values.append(part)
 
-        format_split = list(filter(None, format_split))
+                rendered = "".join(values)
 
-        while True:
+            if rendered:
+                format_split.append(rendered)
+
+        while format_split:
             if format_split[0].startswith("{") and format_split[0].endswith("}"):
                 del format_split[0]
-                if len(format_split) == 0:
-                    break
             else:
                 break
 
-        for i, arg in enumerate(format_split[:]):
+        for i, arg in enumerate(format_split):
             if arg.startswith("{") and arg.endswith("}"):
-                format_split[i] = str(format_split[i])[1:-1]
+                format_split[i] = arg[1:-1]
 
         if len(format_split) == 0:
             format_split.append("Episode name not found")
 
         return utils.format_punctuations("".join(format_split))
+
+
+@lru_cache(maxsize=None)
+def compile_format(title_format: str) -> CompiledFormat:
+    """
+    Parses a config format into its fields.
+
+    Escaped `&` become literal text and the text after a trailing `|` becomes
+    the default of a field.
+    """
+
+    format_fields = []
+
+    for arg in filter(None, regex.split(r"{((?:[^{}]|(?R))*)}", title_format)):
+        arg_split = regex.split(r"([\\+]|[\&+]|[\|]|[\s+])", arg)
+
+        default = ""
+
+        if arg_split[len(arg_split) - 2] == "|":
+            default = arg_split[len(arg_split) - 1]
+            arg_split = arg_split[:-2]
+
+        arg_split = list(filter(None, arg_split))
+
+        tokens = []
+
+        for j, sub_arg in enumerate(arg_split):
+            if sub_arg == "\\":
+                pass
+            elif sub_arg == "&":
+                if arg_split[j - 1] == "\\":
+                    tokens.append(sub_arg)
+            else:
+                tokens.append(sub_arg)
+
+        format_fields.append(FormatField(tuple(tokens), default))
+
+    return CompiledFormat(tuple(format_fields))
@@ -0,0 +1,249 @@
+"""
+Contains the table of the episode titles of an Anime in one language, keyed
+by normalized episode numbers.
+"""
+
+from collections.abc import Iterable, Iterator
+from sys import intern
+
+# The keys of whole episodes ("0", "1", ...), to compare the keys of pages with
+_ep_keys: list[str] = []
+
+
+def normalize_ep_no(ep_no) -> int | float | None:
+    """
+    Returns an episode number ("07", 7, "12.5") as an int, or as a float
+    for specials between episodes (12.5). Returns None if it isn't a number.
+    """
+
+    if type(ep_no) is int:
+        return ep_no
+
+    if type(ep_no) is str and ep_no.isdigit():
+        return int(ep_no)
+
+    # aniparse returns a list for a range of episodes (01-02)
+    if isinstance(ep_no, (list, tuple)):
+        ep_no = ep_no[0] if ep_no else None
+
+    try:
+        number = float(ep_no)
+    except (TypeError, ValueError):
+        return None
+
+    if number != number or number in (float("inf"), float("-inf")):
+        return None
+
+    return int(number) if number.is_integer() else number
+
+
+def page_range(page: dict[str, str]) -> tuple[int, int] | None:
+    """
+    Returns the first and last episode of a page listing a contiguous range
+    of whole episodes in order, or None for any other page.
+    """
+
+    if not page:
+        return None
+
+    first = next(iter(page))
+
+    if type(first) is not str or not first.isdigit():
+        return None
+
+    first = int(first)
+    last = first + len(page) - 1
+
+    if len(_ep_keys) <= last:
+        _ep_keys.extend(map(str, range(len(_ep_keys), last + 1)))
+
+    if list(page) != _ep_keys[first : last + 1]:
+        return None
+
+    return first, last
+
+
+class EpisodeTitles:
+    """
+    The episode titles of an Anime in one language.
+
+    Titles of a contiguous range of whole episode numbers are stored in a
+    list indexed from the first of them, and the others (specials and
+    episodes far apart) in a dict.
+    """
+
+    __slots__ = ("start", "dense", "sparse")
+
+    def __init__(self, titles: dict = None) -> None:
+        self.start = 0
+        self.dense: list[str | None] = []
+        self.sparse: dict[int | float, str] = {}
+
+        if titles:
+            self.pack(titles)
+
+    def pack(self, titles: dict[int | float, str]) -> None:
+        """
+        Stores titles by normalized episode number, putting the longest run
+        of whole episode numbers that is at least half filled in the list.
+        """
+
+        whole = sorted(ep_no for ep_no in titles if type(ep_no) is int)
+
+        # Leaves out the episodes far from the others until the range is dense
+        lo, hi = 0, len(whole) - 1
+
+        while lo < hi and (hi - lo + 1) * 2 < whole[hi] - whole[lo] + 1:
+            if whole[lo + 1] - whole[lo] > whole[hi] - whole[hi - 1]:
+                lo += 1
+            else:
+                hi -= 1
+
+        first, last = (whole[lo], whole[hi]) if whole else (0, -1)
+
+        self.start = first
+        self.dense = [None] * (last - first + 1)
+        self.sparse = {}
+
+        for ep_no, title in titles.items():
+            if type(ep_no) is int and first <= ep_no <= last:
+                self.dense[ep_no - first] = title
+            else:
+                self.sparse[ep_no] = title
+
+    def merge(self, pages: Iterable[dict[str, str]], ep_numbers: set = None) -> None:
+        """
+        Merges the titles of several pages ({ep_no: title}) at once, keeping
+        only the given episodes if ep_numbers is given.
+
+        The titles of a page listing a contiguous range of episodes (like
+        every MyAnimeList page) are copied into the list as a block.
+        """
+
+        for page in pages:
+            block = page_range(page)
+
+            if block is None:
+                self.merge_page(page, ep_numbers)
+                continue
+
+            first, last = block
+
+            if ep_numbers is None:
+                if self.grow(first, last):
+                    # Many titles (like "Episode 1") are the same for every Anime
+                    self.dense[first - self.start : last - self.start + 1] = map(
+                        intern, page.values()
+                    )
+                else:
+                    self.merge_page(page)
+                continue
+
+            wanted = [
+                ep_no
+                for ep_no in ep_numbers
+                if type(ep_no) is int and first <= ep_no <= last
+            ]
+
+            if wanted and self.grow(min(wanted), max(wanted)):
+                for ep_no in wanted:
+                    self.dense[ep_no - self.start] = intern(page[str(ep_no)])
+            else:
+                for ep_no in wanted:
+                    self.put(ep_no, page[str(ep_no)])
+
+    def merge_page(self, page: dict[str, str], ep_numbers: set = None) -> None:
+        """
+        Merges the titles of a page title by title.
+        """
+
+        for key, title in page.items():
+            ep_no = normalize_ep_no(key)
+
+            if ep_no is not None and (ep_numbers is None or ep_no in ep_numbers):
+                self.put(ep_no, title)
+
+    def grow(self, first: int, last: int) -> bool:
+        """
+        Extends the list to the range first-last, unless the list would then
+        be less than half filled. Titles of the dict in the new range are
+        moved into the list.
+        """
+
+        end = self.start + len(self.dense) - 1
+
+        if self.start <= first and last <= end:
+            return True
+
+        new_start = min(self.start, first) if self.dense else first
+        new_end = max(end, last) if self.dense else last
+
+        if (new_end - new_start + 1) > 2 * (len(self.dense) + last - first + 1):
+            return False
+
+        if self.dense:
+            self.dense = (
+                [None] * (self.start - new_start)
+                + self.dense
+                + [None] * (new_end - end)
+            )
+        else:
+            self.dense = [None] * (new_end - new_start + 1)
+
+        self.start = new_start
+
+        for ep_no in [
+            ep_no
+            for ep_no in self.sparse
+            if type(ep_no) is int and new_start <= ep_no <= new_end
+        ]:
+            self.dense[ep_no - new_start] = self.sparse.pop(ep_no)
+
+        return True
+
+    def put(self, ep_no: int | float, title: str) -> None:
+        i = ep_no - self.start if type(ep_no) is int else -1
+
+        if 0 <= i < len(self.dense):
+            self.dense[i] = intern(title)
+        else:
+            self.sparse[ep_no] = intern(title)
+
+    def get(self, ep_no, default: str = None) -> str | None:
+        if type(ep_no) is not int:
+            ep_no = normalize_ep_no(ep_no)
+
+        i = ep_no - self.start if type(ep_no) is int else -1
+
+        if 0 <= i < len(self.dense):
+            title = self.dense[i]
+            return default if title is None else title
+
+        return self.sparse.get(ep_no, default)
+
+    def __getitem__(self, ep_no) -> str:
+        i = ep_no - self.start if type(ep_no) is int else -1
+
+        # Most episodes are in the list
+        title = self.dense[i] if 0 <= i < len(self.dense) else self.get(ep_no)
+
+        if title is None:
+            raise KeyError(ep_no)
+
+        return title
+
+    def __contains__(self, ep_no) -> bool:
+        return self.get(ep_no) is not None
+
+    def items(self) -> Iterator[tuple[int | float, str]]:
+        for i, title in enumerate(self.dense):
+            if title is not None:
+                yield self.start + i, title
+
+        yield from self.sparse.items()
+
+    def __len__(self) -> int:
+        return len(self.dense) - self.dense.count(None) + len(self.sparse)
+
+    def __repr__(self) -> str:
+        return f"EpisodeTitles({dict(self.items())!r})"
@@ -2,13 +2,10 @@
 Contains a class with static methods to print appropriate error messages and exit.
 """
 
-import asyncio
 import sys
 
 from rich.console import Console
 
-from . import http_session, utils
-
 CONSOLE = Console()
 
 NO_MATCHING_DIR = """[b][red]No directories matching the scan format were found.
@@ -36,24 +33,68 @@ RESTORE_NOT_FOUND = """
 [yellow]Please make sure the following path exists:
 [u]{dir_path}[not u]
         
-[yellow]Alternatively, you can try editing the path in the [u]{json_file}.json[not u] file to fix the issue.\n"""
+[yellow]If the folder was moved, move it back to this path and restore the [u]{backup_name}[not u] backup again.\n"""
 
 NO_BACKUP_FOUND = """[b][red]No backup files were found."""
 
+OFFLINE_CACHE_MISS = """[b][red]Offline mode is enabled, but the following page is not cached:
+[u]{url}[not u]
+
+[yellow]Disable offline mode in the conf.ini file to fetch it from MyAnimeList.\n"""
+
+REQUEST_FAILED = """[b][red]The following request failed after several retries ({status}):
+[u]{url}[not u]
+
+[yellow]MyAnimeList may be throttling requests. Wait a while, or lower the
+requests_per_second option in the conf.ini file, and try again.\n"""
+
+DUMP_NOT_FOUND = """[b][red]The metadata dump does not exist:
+[u]{db_path}[not u]
+
+[yellow]Build it with [u]--build-dump[not u], or set the provider option in the conf.ini file to mal.\n"""
+
+DUMP_MISS = """[b][red]The following Anime is not in the metadata dump: [u]{mal_id}[not u]
+
+[yellow]Rebuild the dump with it, or set the provider option in the conf.ini file to mal.\n"""
+
+
+class AnimeError(Exception):
+    """
+    Base class of the errors of a single Anime (like a failed request), which
+    the watch daemon skips instead of exiting.
+    """
+
 
 class HandleError:
     """
     A class with static methods to print errors.
     """
 
+    # The watch daemon keeps running after the errors of a single Anime
+    exit_on_anime_error = True
+
     @staticmethod
     def print_exit(error_message: str, exit: bool=True) -> None:
         CONSOLE.print(error_message)
 
         if (exit):
-            asyncio.create_task(http_session.close_client_session())
+            import asyncio
+
+            from . import utils
+
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # The restore utility runs without an event loop
+                loop = None
+
+            if loop is not None:
+                from . import http_session
+
+                loop.create_task(http_session.close_client_session())
+
             utils.pause()
-            sys.exit()
+            sys.exit(1)
 
     @staticmethod
     def no_matching_dir() -> None:
@@ -88,13 +129,13 @@ class HandleError:
         )
 
     @staticmethod
-    def restore_not_found(dir_path: str, json_file: str) -> None:
+    def restore_not_found(dir_path: str, backup_name: str) -> None:
         """
         Prints an error message when the restore directory does not exist.
         """
 
         HandleError.print_exit(
-            RESTORE_NOT_FOUND.format(dir_path=str(dir_path), json_file=json_file), exit=False
+            RESTORE_NOT_FOUND.format(dir_path=str(dir_path), backup_name=backup_name), exit=False
         )
 
     @staticmethod
@@ -103,4 +144,44 @@ class HandleError:
         Prints an error message when no directories matching the scan format were found.
         """
 
-        HandleError.print_exit(NO_BACKUP_FOUND)
\ No newline at end of file
+        HandleError.print_exit(NO_BACKUP_FOUND)
+
+    @staticmethod
+    def offline_cache_miss(url: str) -> None:
+        """
+        Prints an error message when a page is missing from the cache in offline mode.
+        """
+
+        HandleError.print_exit(
+            OFFLINE_CACHE_MISS.format(url=url),
+            exit=HandleError.exit_on_anime_error,
+        )
+
+    @staticmethod
+    def request_failed(url: str, status) -> None:
+        """
+        Prints an error message when a request fails after all retries.
+        """
+
+        HandleError.print_exit(
+            REQUEST_FAILED.format(url=url, status=status),
+            exit=HandleError.exit_on_anime_error,
+        )
+
+    @staticmethod
+    def dump_not_found(db_path) -> None:
+        """
+        Prints an error message when the metadata dump does not exist.
+        """
+
+        HandleError.print_exit(DUMP_NOT_FOUND.format(db_path=db_path))
+
+    @staticmethod
+    def dump_miss(mal_id) -> None:
+        """
+        Prints an error message when an Anime is not in the metadata dump.
+        """
+
+        HandleError.print_exit(
+            DUMP_MISS.format(mal_id=mal_id), exit=HandleError.exit_on_anime_error
+        )
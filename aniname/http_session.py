@@ -2,16 +2,133 @@
 Contains the aiohttp session used for fetching data.
 """
 
+from dataclasses import asdict, dataclass
+from importlib.util import find_spec
+
 import aiohttp
 
+from . import conf_loader
+
 _client_session = None
+_connection_stats = None
+
+
+@dataclass(slots=True)
+class ConnectionStats:
+    """
+    Dataclass for the connection counters of the client session.
+    """
+
+    requests: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+    def reuse_rate(self) -> float:
+        """
+        Returns the share of requests sent on a kept-alive connection.
+        """
+
+        connections = self.new_connections + self.reused_connections
+
+        return self.reused_connections / connections if connections else 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self) | {"reuse_rate": round(self.reuse_rate(), 4)}
+
+
+def get_connection_stats() -> ConnectionStats:
+    global _connection_stats
+
+    if _connection_stats is None:
+        _connection_stats = ConnectionStats()
+
+    return _connection_stats
+
+
+def accept_encoding(compression: bool) -> str:
+    """
+    Returns the encodings to accept. Brotli is only accepted when a brotli
+    package is installed, as aiohttp needs one to decode it.
+    """
+
+    if not compression:
+        return "identity"
+
+    if find_spec("brotli") is not None or find_spec("brotlicffi") is not None:
+        return "gzip, deflate, br"
+
+    return "gzip, deflate"
+
+
+def trace_config(stats: ConnectionStats) -> aiohttp.TraceConfig:
+    """
+    Returns a trace config counting requests, connections and DNS lookups.
+    """
+
+    async def on_request_start(session, context, params) -> None:
+        stats.requests += 1
+
+    async def on_connection_create_end(session, context, params) -> None:
+        stats.new_connections += 1
+
+    async def on_connection_reuseconn(session, context, params) -> None:
+        stats.reused_connections += 1
+
+    async def on_dns_cache_hit(session, context, params) -> None:
+        stats.dns_cache_hits += 1
+
+    async def on_dns_cache_miss(session, context, params) -> None:
+        stats.dns_cache_misses += 1
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_connection_reuseconn.append(on_connection_reuseconn)
+    config.on_dns_cache_hit.append(on_dns_cache_hit)
+    config.on_dns_cache_miss.append(on_dns_cache_miss)
+
+    return config
+
+
+def create_client_session() -> aiohttp.ClientSession:
+    """
+    Creates a client session with the connection options of the config file.
+    """
+
+    conf = conf_loader.conf
+
+    connector = aiohttp.TCPConnector(
+        limit=conf.connection_limit,
+        limit_per_host=conf.connection_limit_per_host,
+        keepalive_timeout=conf.keepalive_timeout,
+        ttl_dns_cache=conf.dns_cache_ttl,
+    )
+
+    # A timeout of 0 disables it
+    timeout = aiohttp.ClientTimeout(
+        total=conf.timeout_total or None, connect=conf.timeout_connect or None
+    )
+
+    headers = {"Accept-Encoding": accept_encoding(conf.compression)}
+
+    if conf.user_agent:
+        headers["User-Agent"] = conf.user_agent
+
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers=headers,
+        trace_configs=[trace_config(get_connection_stats())],
+    )
 
 
 async def get_client_session():
     global _client_session
 
     if _client_session is None:
-        _client_session = aiohttp.ClientSession()
+        _client_session = create_client_session()
 
     return _client_session
 
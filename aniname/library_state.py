@@ -0,0 +1,344 @@
+"""
+Contains the state of a library: the episode files renamed in each folder,
+so that later runs only rename new or changed episodes.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .scan_index import DirEntry, FileEntry
+
+STATE_FILE_NAME = "library_state.sqlite3"
+SCHEMA_VERSION = 1
+# SQLite builds before 3.32 allow up to 999 parameters per query
+MAX_PARAMETERS = 500
+
+_library_state = None
+
+
+@dataclass(slots=True)
+class FolderRecord:
+    """
+    Dataclass for a folder whose episodes were renamed.
+
+    The digest is the digest of its episode files once they were all
+    renamed, so an unchanged folder is skipped without looking at its files.
+    """
+
+    folder_id: int
+    mal_id: int
+    season: str
+    part: str
+    dir_path: str
+    digest: str = None
+
+
+@dataclass(slots=True)
+class FileRecord:
+    """
+    Dataclass for a renamed episode file, as it was after being renamed.
+    """
+
+    folder_id: int
+    name: str
+    size: int
+    mtime: float
+    ep_no: int | float
+
+    def same_file(self, file: FileEntry) -> bool:
+        """
+        Checks if a file with the key of the record is the renamed file, and
+        not a new file reusing its inode.
+        """
+
+        return file.size == self.size and file.mtime == self.mtime
+
+    def matches(self, file: FileEntry) -> bool:
+        """
+        Checks if a file is unchanged since it was renamed (a restored file
+        has another name).
+        """
+
+        return file.name == self.name and self.same_file(file)
+
+
+@dataclass(slots=True)
+class FolderStatus:
+    """
+    Dataclass for the episode files of a directory still to be renamed.
+    """
+
+    folder: FolderRecord = None
+    new_files: list[str] = field(default_factory=list)
+    done_ep_numbers: set[int | float] = field(default_factory=set)
+
+
+def file_key(file: FileEntry, folder_id: int | None) -> str | None:
+    """
+    Returns the key of the record of an episode file: its device and inode,
+    or its folder, name, size and mtime on filesystems without inodes (None
+    if the folder isn't known).
+    """
+
+    if file.inode:
+        return f"{file.dev}:{file.inode}"
+
+    if folder_id is None:
+        return None
+
+    return f"{folder_id}/{file.name}/{file.size}/{file.mtime}"
+
+
+def files_digest(entry: DirEntry) -> str:
+    """
+    Returns a digest of the names, sizes, mtimes and inodes of the episode
+    files of a directory.
+    """
+
+    data = json.dumps([[f.name, f.size, f.mtime, f.inode] for f in entry.files])
+
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class LibraryState:
+    """
+    The renamed episode files of a library, stored in SQLite next to its
+    backups.
+
+    Folders are loaded at once, and the files of a folder are only read
+    when the folder changed. Files are recognised by their device and inode,
+    so a folder is still recognised after it was renamed.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self.connection = None
+        self.folders: dict[int, FolderRecord] = {}
+        self.folder_paths: dict[str, FolderRecord] = {}
+        # The file records read or written so far, by file_key()
+        self.files: dict[str, FileRecord] = {}
+        # Records to write with the next flush
+        self.pending_folders: dict[int, FolderRecord] = {}
+        self.pending_files: dict[str, FileRecord] = {}
+
+        if db_path.exists():
+            self.connect()
+            self.load()
+
+    def connect(self) -> None:
+        os.makedirs(self.db_path.parent, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.db_path)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < SCHEMA_VERSION:
+            # Files used to be recorded by their inode only
+            self.connection.execute("DROP TABLE IF EXISTS files")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS folders (
+                folder_id INTEGER PRIMARY KEY,
+                mal_id INTEGER NOT NULL,
+                season TEXT,
+                part TEXT,
+                dir_path TEXT NOT NULL,
+                digest TEXT
+            )"""
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                file_key TEXT PRIMARY KEY,
+                folder_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                ep_no INTEGER NOT NULL
+            )"""
+        )
+        self.connection.commit()
+
+    def load(self) -> None:
+        for row in self.connection.execute("SELECT * FROM folders"):
+            folder = FolderRecord(*row)
+            self.folders[folder.folder_id] = folder
+            self.folder_paths[folder.dir_path] = folder
+
+    def read_files(self, keys: list[str | None]) -> None:
+        """
+        Reads the records of episode files by their key.
+        """
+
+        keys = [key for key in keys if key is not None and key not in self.files]
+
+        if self.connection is None or not keys:
+            return
+
+        for i in range(0, len(keys), MAX_PARAMETERS):
+            chunk = keys[i : i + MAX_PARAMETERS]
+
+            for key, *row in self.connection.execute(
+                f"SELECT * FROM files WHERE file_key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ):
+                self.files[key] = FileRecord(*row)
+
+    def status(self, dir_path: str, entry: DirEntry) -> FolderStatus:
+        """
+        Returns the folder a directory was when its episodes were renamed
+        (None if they never were), and its episode files still to be renamed.
+        """
+
+        folder = self.folder_paths.get(dir_path)
+
+        if folder is not None and folder.digest == files_digest(entry):
+            return FolderStatus(folder)
+
+        folder_id = folder.folder_id if folder is not None else None
+        keys = [file_key(file, folder_id) for file in entry.files]
+        self.read_files(keys)
+        status = FolderStatus()
+
+        for file, key in zip(entry.files, keys):
+            record = self.files.get(key)
+
+            if record is None or not record.same_file(file):
+                status.new_files.append(file.name)
+                continue
+
+            if status.folder is None:
+                status.folder = self.folders.get(record.folder_id)
+
+            if record.name == file.name:
+                status.done_ep_numbers.add(record.ep_no)
+            else:
+                status.new_files.append(file.name)
+
+        # A folder that was moved or renamed, but whose episodes are unchanged
+        if status.folder is not None and not status.new_files:
+            self.update_folder(status.folder, dir_path, files_digest(entry))
+
+        return status
+
+    def update_folder(self, folder: FolderRecord, dir_path: str, digest: str) -> None:
+        if self.folder_paths.get(folder.dir_path) is folder:
+            del self.folder_paths[folder.dir_path]
+
+        folder.dir_path = dir_path
+        folder.digest = digest
+        self.folder_paths[dir_path] = folder
+        self.pending_folders[folder.folder_id] = folder
+
+    def record(
+        self,
+        folder_id: int | None,
+        mal_id,
+        season: str,
+        part: str,
+        dir_path: Path,
+        entry: DirEntry,
+        episodes: list[tuple[FileEntry, int | float]],
+    ) -> int:
+        """
+        Records the renamed episode files (and their episode number) of a
+        folder, whose directory entry is given, and returns its ID.
+        """
+
+        if folder_id is None:
+            folder_id = max(self.folders, default=0) + 1
+
+        for file, ep_no in episodes:
+            key = file_key(file, folder_id)
+            record = FileRecord(folder_id, file.name, file.size, file.mtime, ep_no)
+            self.files[key] = self.pending_files[key] = record
+
+        folder = self.folders.get(folder_id)
+
+        if folder is None:
+            folder = self.folders[folder_id] = FolderRecord(
+                folder_id, int(mal_id), season, part, str(dir_path)
+            )
+
+        # Only a folder whose episode files were all renamed can be skipped
+        keys = [file_key(file, folder_id) for file in entry.files]
+        done = all(
+            key in self.files and self.files[key].matches(file)
+            for file, key in zip(entry.files, keys)
+        )
+        self.update_folder(folder, str(dir_path), files_digest(entry) if done else None)
+
+        return folder_id
+
+    def flush(self) -> None:
+        """
+        Writes the new records to the database.
+        """
+
+        if not self.pending_folders and not self.pending_files:
+            return
+
+        if self.connection is None:
+            self.connect()
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (f.folder_id, f.mal_id, f.season, f.part, f.dir_path, f.digest)
+                for f in self.pending_folders.values()
+            ),
+        )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (key, f.folder_id, f.name, f.size, f.mtime, f.ep_no)
+                for key, f in self.pending_files.items()
+            ),
+        )
+        self.connection.commit()
+
+        self.pending_folders.clear()
+        self.pending_files.clear()
+
+    def close(self) -> None:
+        self.flush()
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def get_library_state(backup_dir: Path) -> LibraryState | None:
+    """
+    Returns the state of the library whose backups are in backup_dir, or
+    None if incremental runs are disabled.
+    """
+
+    global _library_state
+
+    from . import conf_loader
+
+    if not conf_loader.conf.library_state:
+        return None
+
+    db_path = backup_dir / STATE_FILE_NAME
+
+    if _library_state is not None and _library_state.db_path != db_path:
+        close_library_state()
+
+    if _library_state is None:
+        _library_state = LibraryState(db_path)
+
+    return _library_state
+
+
+def close_library_state() -> None:
+    global _library_state
+
+    if _library_state is not None:
+        _library_state.close()
+        _library_state = None
@@ -0,0 +1,169 @@
+"""
+Contains a metadata provider reading Anime data from a local SQLite dump.
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+
+from .episode_titles import normalize_ep_no
+from .error_handler import AnimeError, HandleError
+from .providers import MetadataProvider
+
+LANGUAGES = ("english", "romanji", "japanese")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS anime (
+    mal_id INTEGER PRIMARY KEY,
+    title_english TEXT NOT NULL,
+    title_romanji TEXT NOT NULL,
+    title_japanese TEXT NOT NULL,
+    type TEXT NOT NULL,
+    total_eps TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    mal_id INTEGER NOT NULL,
+    ep_no TEXT NOT NULL,
+    title_english TEXT NOT NULL,
+    title_romanji TEXT NOT NULL,
+    title_japanese TEXT NOT NULL,
+    PRIMARY KEY (mal_id, ep_no)
+) WITHOUT ROWID;
+"""
+
+
+class LocalDumpProvider(MetadataProvider):
+    """
+    Serves Anime data from a dump file, without any network access.
+
+    Both tables are keyed by the MAL ID, so opening the dump doesn't read it
+    and every lookup is a single index search.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        if not Path(db_path).is_file():
+            raise DumpNotFound(db_path)
+
+        self.connection = sqlite3.connect(
+            f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True
+        )
+
+    async def fetch_anime(self, mal_id, ep_numbers: set[int]) -> dict:
+        row = self.connection.execute(
+            """SELECT title_english, title_romanji, title_japanese, type, total_eps
+            FROM anime WHERE mal_id = ?""",
+            (int(mal_id),),
+        ).fetchone()
+
+        if row is None:
+            raise DumpMiss(mal_id)
+
+        return {
+            "mal_id": mal_id,
+            "titles": dict(zip(LANGUAGES, row[:3])),
+            "type": row[3],
+            "total_eps": row[4],
+            "ep_pages": None,
+            "ep_titles": self.episode_titles(mal_id, ep_numbers),
+        }
+
+    def episode_titles(self, mal_id, ep_numbers: set[int]) -> dict:
+        """
+        Returns the titles of the local episodes in every language.
+        """
+
+        ep_titles = {lang: {} for lang in LANGUAGES}
+
+        for ep_no, *titles in self.connection.execute(
+            """SELECT ep_no, title_english, title_romanji, title_japanese
+            FROM episodes WHERE mal_id = ?""",
+            (int(mal_id),),
+        ):
+            if normalize_ep_no(ep_no) in ep_numbers:
+                for lang, title in zip(LANGUAGES, titles):
+                    ep_titles[lang][ep_no] = title
+
+        return ep_titles
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def read_records(json_path: Path):
+    """
+    Yields the Anime records of a JSON file (a list of records) or an NDJSON
+    file (one record per line).
+    """
+
+    with open(json_path, encoding="utf-8") as file:
+        first = file.read(1)
+        file.seek(0)
+
+        if first == "[":
+            yield from json.load(file)
+            return
+
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def episode_row(ep_titles: dict, ep_no: str, title_english: str) -> list[str]:
+    # A title missing in a language falls back to the English one
+    return [ep_titles.get(lang, {}).get(ep_no, title_english) for lang in LANGUAGES]
+
+
+def build_dump(json_path: Path, db_path: Path) -> int:
+    """
+    Builds a dump from the Anime records of a JSON file and returns the number
+    of Anime(s) in it. Records are in the format of the metadata providers.
+    """
+
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    count = 0
+
+    with connection:
+        for record in read_records(json_path):
+            mal_id = int(record["mal_id"])
+            titles = record["titles"]
+            ep_titles = record.get("ep_titles", {})
+
+            connection.execute(
+                "INSERT OR REPLACE INTO anime VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    mal_id,
+                    *(titles[lang] for lang in LANGUAGES),
+                    record["type"],
+                    str(record["total_eps"]),
+                ),
+            )
+            connection.execute("DELETE FROM episodes WHERE mal_id = ?", (mal_id,))
+            connection.executemany(
+                "INSERT INTO episodes VALUES (?, ?, ?, ?, ?)",
+                (
+                    (mal_id, ep_no, *episode_row(ep_titles, ep_no, title))
+                    for ep_no, title in ep_titles.get("english", {}).items()
+                ),
+            )
+            count += 1
+
+    connection.execute("VACUUM")
+    connection.close()
+
+    return count
+
+
+class DumpNotFound(Exception):
+    """Raised when the dump file of the dump provider does not exist."""
+
+    def __init__(self, db_path: Path) -> None:
+        HandleError.dump_not_found(db_path)
+
+
+class DumpMiss(AnimeError):
+    """Raised when an Anime is not in the dump."""
+
+    def __init__(self, mal_id) -> None:
+        super().__init__(mal_id)
+        HandleError.dump_miss(mal_id)
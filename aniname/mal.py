@@ -3,21 +3,74 @@ Contains functions needed to scrape and parse data from MyAnimeList.
 """
 
 import asyncio
+import time
+from collections import OrderedDict
 from sys import platform
 
-import lxml.html
 import regex
+from lxml import etree
 
-from . import conf_loader
-
-from .http_session import get_client_session
+from . import conf_loader, profiler
+from .cache import get_metadata_cache
+from .error_handler import AnimeError, HandleError
+from .providers import MetadataProvider
+from .scheduler import get_scheduler
 
 if platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-ANIME_TITLE_LANG = conf_loader.conf.anime_title_lang
-EP_TITLE_LANG = conf_loader.conf.ep_title_lang
-FIRST_100 = True  # to be used in the future
+BASE_URL = conf_loader.conf.base_url
+CACHE_TTL = conf_loader.conf.cache_ttl * 3600
+OFFLINE = conf_loader.conf.offline
+LANGUAGES = ("english", "romanji", "japanese")
+CHUNK_SIZE = 64 * 1024
+MEMORY_PAGES = 256
+
+# The pages used recently ((mal_id, offset): (fetched_at, data)), so that a
+# long-running process like the watch daemon doesn't read them again. Only
+# used when the cache is enabled, like the metadata cache
+_pages: OrderedDict = OrderedDict()
+
+# Strings returned by the XPaths don't keep references to the parsed document
+XPATH_OG_TITLE = etree.XPath(
+    "//meta[@property='og:title']/@content", smart_strings=False
+)
+XPATH_ENGLISH = etree.XPath(
+    '//span[text()="English:"]/following-sibling::text()', smart_strings=False
+)
+XPATH_JAPANESE = etree.XPath(
+    '//span[text()="Japanese:"]/following-sibling::text()', smart_strings=False
+)
+XPATH_TYPE = etree.XPath(
+    '//span[text()="Type:"]/following-sibling::a/text()', smart_strings=False
+)
+XPATH_EPISODES = etree.XPath(
+    '//span[text()="Episodes:"]/following-sibling::text()', smart_strings=False
+)
+XPATH_LAST_PAGE = etree.XPath(
+    '//div[@class="pagination ac"]/a[last()]/@href', smart_strings=False
+)
+XPATH_ROW_EP_NO = etree.XPath(
+    'td[@class="episode-number nowrap"]/text()', smart_strings=False
+)
+XPATH_ROW_TITLE_EN = etree.XPath(
+    'td[@class="episode-title fs12"]/a[@class="fl-l fw-b "]/text()',
+    smart_strings=False,
+)
+XPATH_ROW_TITLE_RJ = etree.XPath(
+    'td[@class="episode-title fs12"]/span[@class="di-ib"]/text()',
+    smart_strings=False,
+)
+LAST_PAGE_OFFSET = regex.compile(r"\?offset=(\d+)$")
+TITLE_RJ_SEPARATOR = regex.compile(r"\n+|\xa0+")
+
+
+def episode_page_url(mal_id, offset: int) -> str:
+    """
+    Returns the URL of an episode page of an Anime on MyAnimeList.
+    """
+
+    return f"{BASE_URL}/anime/{mal_id}/_/episode?offset={offset}"
 
 
 def clean_title(title: str) -> str:
@@ -36,34 +89,209 @@ def clean_jp_title(title: str) -> str:
     return (title.strip().strip("()")).replace("\xa0", " ")
 
 
-async def fetch(url, mal_id=None):
+async def fetch_page(mal_id, offset: int = 0) -> dict:
     """
-    Fetch data from url.
+    Fetches and parses an episode page, serving it from the metadata cache
+    when possible.
+
+    The page has the titles in all languages, see parse_info() and
+    episode_titles().
     """
 
-    session = await get_client_session()
+    with profiler.span("fetch page", mal_id=mal_id, offset=offset):
+        return await fetch_page_data(mal_id, offset)
+
+
+async def fetch_page_data(mal_id, offset: int) -> dict:
+    key = (int(mal_id), offset)
+    remembered = _pages.get(key) if memory_cache_enabled() else None
+
+    if remembered is not None and (
+        OFFLINE or time.time() - remembered[0] < CACHE_TTL
+    ):
+        _pages.move_to_end(key)
+        profiler.count("metadata_cache.memory_hits")
+        return remembered[1]
+
+    cache = get_metadata_cache()
+
+    entry = cache.get(mal_id, offset) if cache is not None else None
+
+    if entry is not None and (OFFLINE or entry.is_fresh(CACHE_TTL)):
+        profiler.count("metadata_cache.hits")
+        remember_page(key, entry.fetched_at, entry.data)
+        return entry.data
+
+    profiler.count("metadata_cache.misses")
+
+    if OFFLINE:
+        raise OfflineCacheMiss(mal_id, offset)
+
+    headers = {}
+
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+    url = episode_page_url(mal_id, offset)
+
+    async with get_scheduler().request(url, headers=headers) as response:
+        if response.status == 304 and entry is not None:
+            profiler.count("metadata_cache.revalidated")
+            cache.touch(mal_id, offset)
+            remember_page(key, time.time(), entry.data)
+            return entry.data
+
+        # The page is parsed as it is received instead of being buffered
+        parser = EpisodePageParser(response.charset or "utf-8")
+
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            profiler.count("http.bytes", len(chunk))
+            parser.feed(chunk)
 
-    async with session.get(url) as response:
-        html = await response.text()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
 
-        if mal_id is not None:
-            data = {mal_id: lxml.html.fromstring(html)}
-        else:
-            data = lxml.html.fromstring(html)
+    data = parser.close(mal_id)
+    profiler.observe("page.parse_seconds", parser.parse_time)
+
+    if cache is not None:
+        cache.put(mal_id, offset, data, etag, last_modified)
+
+    remember_page(key, time.time(), data)
 
     return data
 
 
-def parse_anime(html, mal_id):
+def memory_cache_enabled() -> bool:
+    return conf_loader.conf.cache_enabled or conf_loader.conf.offline
+
+
+def remember_page(key: tuple, fetched_at: float, data: dict) -> None:
+    if not memory_cache_enabled():
+        return
+
+    _pages[key] = (fetched_at, data)
+    _pages.move_to_end(key)
+
+    if len(_pages) > MEMORY_PAGES:
+        _pages.popitem(last=False)
+
+
+def page_offsets(ep_numbers: set) -> list[int]:
     """
-    Parses results from the fetch_anime() function
+    Returns the offsets of the episode pages listing the given episodes.
     """
 
-    title_romanji = (html.xpath("//meta[@property='og:title']/@content")[0]).strip()
+    offsets = {int(ep_no - 1) // 100 * 100 for ep_no in ep_numbers if ep_no > 0}
 
-    title_english = html.xpath('//span[text()="English:"]/following-sibling::text()')
+    return sorted(offsets) or [0]
 
-    title_japanese = html.xpath('//span[text()="Japanese:"]/following-sibling::text()')
+
+class MALScraper(MetadataProvider):
+    """
+    Scrapes Anime data from the episode pages on MyAnimeList.
+    """
+
+    async def fetch_anime(self, mal_id, ep_numbers: set) -> dict:
+        # Any episode page has the Anime data, so the first one needed is used
+        return await fetch_page(mal_id, page_offsets(ep_numbers)[0])
+
+    async def fetch_episodes(
+        self, mal_id, ep_numbers: set, anime_data: dict
+    ) -> list[dict[str, dict[str, str]]]:
+        ep_pages = anime_data["ep_pages"]
+
+        # Anime(s) with 100 episodes or less only have one page
+        max_offset = (len(ep_pages) - 1) * 100 if ep_pages else 0
+
+        pages = await asyncio.gather(
+            *[
+                fetch_page(mal_id, offset)
+                for offset in page_offsets(ep_numbers)[1:]
+                if offset <= max_offset
+            ]
+        )
+
+        return [page["ep_titles"] for page in pages]
+
+
+class EpisodePageParser:
+    """
+    Parses an episode page incrementally. Episode rows are extracted and
+    released as soon as they are parsed, so the document never holds more
+    than the anime information and the row being parsed.
+    """
+
+    def __init__(self, encoding: str = "utf-8") -> None:
+        self.parser = etree.HTMLPullParser(events=("end",), encoding=encoding)
+        self.rows: list[tuple] = []
+        self.parse_time = 0.0
+
+    def feed(self, data: bytes) -> None:
+        start = time.perf_counter()
+        self.parser.feed(data)
+        self.read_rows()
+        self.parse_time += time.perf_counter() - start
+
+    def read_rows(self) -> None:
+        for _, element in self.parser.read_events():
+            if element.tag != "tr":
+                continue
+
+            row = parse_row(element)
+
+            if row is None:
+                continue
+
+            self.rows.append(row)
+
+            # Releases the row and the rows before it
+            element.clear(keep_tail=True)
+
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def close(self, mal_id) -> dict:
+        """
+        Finishes parsing and returns the parsed page.
+        """
+
+        start = time.perf_counter()
+        html = self.parser.close()
+        self.read_rows()
+
+        data = parse_info(html, mal_id)
+        data["ep_titles"] = episode_titles(self.rows)
+        self.parse_time += time.perf_counter() - start
+
+        return data
+
+
+def parse_page(page: bytes, mal_id, encoding: str = "utf-8") -> dict:
+    """
+    Parses a whole episode page.
+    """
+
+    parser = EpisodePageParser(encoding)
+    parser.feed(page)
+
+    return parser.close(mal_id)
+
+
+def parse_info(html, mal_id) -> dict:
+    """
+    Parses the Anime information of an episode page, with the Anime title
+    in every language.
+    """
+
+    title_romanji = XPATH_OG_TITLE(html)[0].strip()
+
+    title_english = XPATH_ENGLISH(html)
+
+    title_japanese = XPATH_JAPANESE(html)
 
     if title_english != []:
         title_english = title_english[0].strip()
@@ -75,84 +303,71 @@ def parse_anime(html, mal_id):
     else:
         title_japanese = title_romanji
 
-    anime_type = html.xpath('//span[text()="Type:"]/following-sibling::a/text()')[0]
+    anime_type = XPATH_TYPE(html)[0]
 
-    total_episodes = (
-        html.xpath('//span[text()="Episodes:"]/following-sibling::text()')[0]
-    ).strip()
+    total_episodes = XPATH_EPISODES(html)[0].strip()
 
-    last_page = html.xpath('//div[@class="pagination ac"]/a[last()]/@href')
+    last_page = XPATH_LAST_PAGE(html)
 
     ep_pages = None
 
     if len(last_page) != 0:
-        max_offset = int(regex.findall(r"\?offset=(\d+)$", last_page[0])[0])
+        max_offset = int(LAST_PAGE_OFFSET.findall(last_page[0])[0])
         ep_pages = [
-            f"https://myanimelist.net/anime/{mal_id}/_/episode?offset={i}"
-            for i in range(0, max_offset + 100, 100)
+            episode_page_url(mal_id, i) for i in range(0, max_offset + 100, 100)
         ]
 
-    anime_title = title_english
-
-    if ANIME_TITLE_LANG == "japanese":
-        anime_title = title_japanese
-
-    if ANIME_TITLE_LANG == "romanji":
-        anime_title = title_romanji
-
-    data = {
+    return {
         "mal_id": mal_id,
-        "title": anime_title,
+        "titles": {
+            "english": title_english,
+            "romanji": title_romanji,
+            "japanese": title_japanese,
+        },
         "type": anime_type,
         "total_eps": total_episodes,
         "ep_pages": ep_pages,
     }
 
-    if FIRST_100 == True:
-        # Parses the first 100 or less episode titles from the already loaded HTML
-        episode_titles = parse_episodes([html])
-        data["ep_titles"] = episode_titles
-
-    return data
-
 
-def parse_episodes(htmls):
+def parse_row(row) -> tuple[str, str, str, str] | None:
     """
-    Parses results from the fetch_episodes() function
+    Parses a row of the episode table into the episode number and its
+    English, romanji and Japanese titles. Returns None for other rows.
     """
 
-    data = {"english": {}, "romanji": {}, "japanese": {}}
+    ep_no = XPATH_ROW_EP_NO(row)
 
-    for html in htmls:
-        episode_numbers = html.xpath('//td[@class="episode-number nowrap"]/text()')
+    if ep_no == []:
+        return None
 
-        titles = html.xpath('//td[@class="episode-title fs12"]')
+    title_english = XPATH_ROW_TITLE_EN(row)
+    title_english = title_english[0] if title_english != [] else ""
 
-        titles_english = []
-        title_rj = []
+    title_rj = XPATH_ROW_TITLE_RJ(row)
+    title_rj = title_rj[0] if title_rj != [] else f"{title_english}\xa0{title_english}"
 
-        for i, title in enumerate(titles):
-            titles_english.append("")
+    title_rj = TITLE_RJ_SEPARATOR.split(title_rj)
+    title_romanji = title_rj[0]
+    title_japanese = title_rj[1] if len(title_rj) > 1 else title_rj[0]
 
-            titles_english[i] = title.xpath('a[@class="fl-l fw-b "]/text()')[0]
+    return ep_no[0], title_english, title_romanji, title_japanese
 
-            t_rj = title.xpath('span[@class="di-ib"]/text()')
 
-            if t_rj != []:
-                title_rj.append(t_rj[0])
+def episode_titles(rows: list[tuple[str, str, str, str]]) -> dict:
+    """
+    Returns the episode titles in every language ({language: {ep_no: title}}).
+    """
 
-            else:
-                title_rj.append(f"{titles_english[i]}\xa0{titles_english[i]}")
+    return {
+        lang: {row[0]: row[column] for row in rows}
+        for column, lang in enumerate(LANGUAGES, 1)
+    }
 
-        titles_romanji, titles_japanese = map(
-            list, zip(*[regex.split(r"\n+|\xa0+", ele) for ele in title_rj])
-        )
 
-        for title_en, title_ro, title_jp, ep_no in zip(
-            titles_english, titles_romanji, titles_japanese, episode_numbers
-        ):
-            data["english"].update({ep_no: (title_en)})
-            data["romanji"].update({ep_no: (title_ro)})
-            data["japanese"].update({ep_no: (title_jp)})
+class OfflineCacheMiss(AnimeError):
+    """Raised when a page is not cached while running in offline mode."""
 
-    return data[EP_TITLE_LANG]
+    def __init__(self, mal_id, offset: int) -> None:
+        super().__init__(mal_id, offset)
+        HandleError.offline_cache_miss(episode_page_url(mal_id, offset))
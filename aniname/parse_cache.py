@@ -0,0 +1,281 @@
+"""
+Contains a cache for parsed episode filenames, so each filename is parsed
+by aniparse only once.
+"""
+
+import json
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import Executor
+from functools import lru_cache
+from pathlib import Path
+
+from . import profiler
+
+CACHE_FILE_NAME = "parse_cache.sqlite3"
+
+_parse_cache = None
+_executor = None
+
+
+def aniparse(name: str, options: dict) -> dict:
+    """
+    Parses a filename with aniparse, which is imported on first use.
+    """
+
+    from aniparse import parse
+
+    # aniparse fills its defaults into the options, which would change their key
+    return parse(name, options=dict(options))
+
+
+@lru_cache(maxsize=None)
+def aniparse_version() -> str:
+    from importlib import metadata
+
+    try:
+        return metadata.version("aniparse")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def parse_chunk(names: list[str], options: dict) -> list[dict]:
+    """
+    Parses a chunk of filenames with aniparse (run in the worker processes).
+    """
+
+    return [aniparse(name, options=options) for name in names]
+
+
+def options_key(options: dict) -> str:
+    """
+    Returns a key identifying aniparse options (and the aniparse version).
+    """
+
+    return json.dumps([aniparse_version(), options], sort_keys=True)
+
+
+class ParseCache:
+    """
+    A size-bounded LRU cache of aniparse results, optionally backed by SQLite
+    so filenames are not parsed again on the next run.
+    """
+
+    def __init__(self, max_entries: int, db_path: Path = None) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.pending: dict = {}
+        self.options_keys: dict = {}
+        self.connection = None
+
+        if db_path is not None:
+            self.connection = sqlite3.connect(db_path)
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS parses (
+                    name TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (name, options)
+                )"""
+            )
+            self.connection.commit()
+
+    def options_key(self, options: dict) -> str:
+        cached = self.options_keys.get(id(options))
+
+        if cached is None or cached[0] is not options:
+            cached = self.options_keys[id(options)] = (options, options_key(options))
+
+        return cached[1]
+
+    def get(self, name: str, options: dict) -> dict | None:
+        """
+        Returns the cached result for a filename, or None if it isn't cached.
+        """
+
+        key = (name, self.options_key(options))
+        result = self.entries.get(key)
+
+        if result is not None:
+            self.entries.move_to_end(key)
+            return result
+
+        if self.connection is None:
+            return None
+
+        row = self.connection.execute(
+            "SELECT result FROM parses WHERE name = ? AND options = ?", key
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        result = json.loads(row[0])
+        self.store(key, result)
+
+        return result
+
+    def put(self, name: str, options: dict, result: dict) -> None:
+        key = (name, self.options_key(options))
+        self.store(key, result)
+
+        if self.connection is not None:
+            self.pending[key] = result
+
+    def store(self, key: tuple, result: dict) -> None:
+        self.entries[key] = result
+
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def parse(self, name: str, options: dict) -> dict:
+        """
+        Parses a filename with aniparse, using the cached result if there is one.
+        """
+
+        result = self.get(name, options)
+
+        if result is None:
+            result = aniparse(name, options=options)
+            self.put(name, options, result)
+
+        return dict(result)
+
+    async def parse_many(
+        self,
+        names: list[str],
+        options: dict,
+        executor: Executor = None,
+        chunk_size: int = 256,
+    ) -> None:
+        """
+        Parses the filenames that aren't cached yet, in chunks on the executor
+        when one is given, so parse() only returns cached results afterwards.
+        """
+
+        unique = dict.fromkeys(names)
+        missing = [name for name in unique if self.get(name, options) is None]
+
+        profiler.count("parse_cache.hits", len(unique) - len(missing))
+        profiler.count("parse_cache.misses", len(missing))
+
+        if executor is None:
+            with profiler.span("aniparse", files=len(missing)):
+                for name in missing:
+                    self.put(name, options, aniparse(name, options=options))
+            return
+
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        chunks = [
+            missing[i : i + chunk_size] for i in range(0, len(missing), chunk_size)
+        ]
+
+        with profiler.span("aniparse", files=len(missing), chunks=len(chunks)):
+            results = await asyncio.gather(
+                *[
+                    loop.run_in_executor(executor, parse_chunk, chunk, options)
+                    for chunk in chunks
+                ]
+            )
+
+        for chunk, chunk_results in zip(chunks, results):
+            for name, result in zip(chunk, chunk_results):
+                self.put(name, options, result)
+
+    def flush(self) -> None:
+        """
+        Writes new results to the persistent cache.
+        """
+
+        if self.connection is None or not self.pending:
+            return
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO parses VALUES (?, ?, ?)",
+            (
+                (name, options, json.dumps(result, ensure_ascii=False))
+                for (name, options), result in self.pending.items()
+            ),
+        )
+        self.connection.commit()
+        self.pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def get_parse_cache() -> ParseCache:
+    global _parse_cache
+
+    if _parse_cache is None:
+        from . import conf_loader
+
+        conf = conf_loader.conf
+        db_path = None
+
+        if conf.parse_cache:
+            db_path = conf_loader.config_dir / CACHE_FILE_NAME
+
+        _parse_cache = ParseCache(conf.parse_cache_size, db_path)
+
+    return _parse_cache
+
+
+def parse(name: str, options: dict) -> dict:
+    """
+    Parses a filename with aniparse using the shared cache.
+    """
+
+    return get_parse_cache().parse(name, options)
+
+
+def get_executor() -> Executor | None:
+    """
+    Returns the process pool used to parse filenames, or None if parsing
+    in worker processes is disabled.
+    """
+
+    global _executor
+
+    from . import conf_loader
+
+    if conf_loader.conf.parse_workers <= 0:
+        return None
+
+    if _executor is None:
+        from concurrent.futures import ProcessPoolExecutor
+
+        _executor = ProcessPoolExecutor(max_workers=conf_loader.conf.parse_workers)
+
+    return _executor
+
+
+async def parse_many(names: list[str], options: dict) -> None:
+    """
+    Parses filenames that aren't cached yet, using the worker processes
+    when enabled.
+    """
+
+    from . import conf_loader
+
+    await get_parse_cache().parse_many(
+        names, options, get_executor(), conf_loader.conf.parse_chunk_size
+    )
+
+
+def close_parse_cache() -> None:
+    global _parse_cache, _executor
+
+    if _parse_cache is not None:
+        _parse_cache.close()
+        _parse_cache = None
+
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -0,0 +1,264 @@
+"""
+Contains the profiler recording the spans, counters and histograms of a run.
+
+The profiler is only created with --profile. Until then span() returns a
+shared no-op context manager and count() and observe() return right away.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+PROFILE_FORMATS = ("json", "chrome")
+
+NULL_SPAN = nullcontext()
+
+_profiler = None
+
+# The track of the innermost span, which is inherited by the tasks it creates
+_track: ContextVar[str] = ContextVar("track", default=None)
+
+
+@dataclass(slots=True)
+class Span:
+    """
+    Dataclass for a timed span, relative to the start of the profile.
+    """
+
+    name: str
+    track: str
+    start: float
+    duration: float
+    args: dict
+
+
+@dataclass(slots=True)
+class Profiler:
+    """
+    Records spans, counters and histograms (lists of observed values).
+    """
+
+    started_at: float = field(default_factory=time.perf_counter)
+    spans: list[Span] = field(default_factory=list)
+    counters: dict[str, float] = field(default_factory=dict)
+    histograms: dict[str, list[float]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @contextmanager
+    def span(self, name: str, track: str = None, **args):
+        """
+        Times the code in the context. Spans without a track are put on the
+        track of their parent span, or on the track of their thread.
+        """
+
+        if track is None:
+            track = _track.get() or threading.current_thread().name
+
+        token = _track.set(track)
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            _track.reset(token)
+
+            self.spans.append(
+                Span(name, track, start - self.started_at, duration, args)
+            )
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self.lock:
+            self.histograms.setdefault(name, []).append(value)
+
+    def report(self) -> dict:
+        """
+        Returns the profile, with the spans summarized by name.
+        """
+
+        durations = {}
+
+        for span in self.spans:
+            durations.setdefault(span.name, []).append(span.duration)
+
+        return {
+            "duration": time.perf_counter() - self.started_at,
+            "spans": {name: summarize(values) for name, values in durations.items()},
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {
+                name: summarize(values)
+                for name, values in sorted(self.histograms.items())
+            },
+            "timeline": [
+                {
+                    "name": span.name,
+                    "track": span.track,
+                    "start": round(span.start, 6),
+                    "duration": round(span.duration, 6),
+                    "args": span.args,
+                }
+                for span in sorted(self.spans, key=lambda span: span.start)
+            ],
+        }
+
+    def chrome_trace(self) -> dict:
+        """
+        Returns the profile in the Chrome trace format (chrome://tracing or
+        https://ui.perfetto.dev). Overlapping spans of a track are split into
+        lanes, as the spans of a thread must be nested.
+        """
+
+        events = []
+        lane_ids = {}
+
+        for span, lane in assign_lanes(self.spans):
+            if lane not in lane_ids:
+                lane_ids[lane] = len(lane_ids) + 1
+                events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": 1,
+                        "tid": lane_ids[lane],
+                        "args": {"name": lane},
+                    }
+                )
+
+            events.append(
+                {
+                    "ph": "X",
+                    "name": span.name,
+                    "cat": "aniname",
+                    "pid": 1,
+                    "tid": lane_ids[lane],
+                    "ts": span.start * 1e6,
+                    "dur": span.duration * 1e6,
+                    "args": span.args,
+                }
+            )
+
+        report = self.report()
+
+        events.append(
+            {
+                "ph": "C",
+                "name": "counters",
+                "pid": 1,
+                "ts": report["duration"] * 1e6,
+                "args": report["counters"],
+            }
+        )
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"histograms": report["histograms"]},
+        }
+
+    def export(self, path: Path, profile_format: str = "json") -> None:
+        data = self.chrome_trace() if profile_format == "chrome" else self.report()
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=1, default=str)
+
+
+def summarize(values: list[float]) -> dict:
+    """
+    Returns the count, total and distribution of observed values.
+    """
+
+    values = sorted(values)
+    count = len(values)
+
+    def percentile(p: float) -> float:
+        return values[min(count - 1, int(p * count))]
+
+    return {
+        "count": count,
+        "total": sum(values),
+        "min": values[0],
+        "mean": sum(values) / count,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": values[-1],
+    }
+
+
+def assign_lanes(spans: list[Span]) -> list[tuple[Span, str]]:
+    """
+    Assigns every span to a lane of its track, so that the spans of a lane
+    are either nested or apart.
+    """
+
+    assigned = []
+    tracks: dict[str, list[list[float]]] = {}
+
+    for span in sorted(spans, key=lambda span: (span.start, -span.duration)):
+        # The ends of the open spans of each lane, innermost last
+        lanes = tracks.setdefault(span.track, [])
+        end = span.start + span.duration
+
+        for lane_no, stack in enumerate(lanes):
+            while stack and stack[-1] <= span.start:
+                stack.pop()
+
+            if not stack or end <= stack[-1]:
+                break
+        else:
+            lane_no = len(lanes)
+            stack = []
+            lanes.append(stack)
+
+        stack.append(end)
+        lane = span.track if lane_no == 0 else f"{span.track} ({lane_no + 1})"
+        assigned.append((span, lane))
+
+    return assigned
+
+
+def enable() -> Profiler:
+    global _profiler
+
+    if _profiler is None:
+        _profiler = Profiler()
+
+    return _profiler
+
+
+def get_profiler() -> Profiler | None:
+    return _profiler
+
+
+def span(name: str, track: str = None, **args):
+    """
+    Returns a span timing the code in its context, or a no-op context
+    manager when profiling is off.
+    """
+
+    if _profiler is None:
+        return NULL_SPAN
+
+    return _profiler.span(name, track, **args)
+
+
+def count(name: str, value: float = 1) -> None:
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+def observe(name: str, value: float) -> None:
+    if _profiler is not None:
+        _profiler.observe(name, value)
+
+
+def enabled() -> bool:
+    return _profiler is not None
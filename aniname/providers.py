@@ -0,0 +1,70 @@
+"""
+Contains the interface of the providers Anime data is fetched from.
+"""
+
+from abc import ABC, abstractmethod
+
+from . import conf_loader
+
+PROVIDERS = ("mal", "dump")
+DUMP_FILE_NAME = "mal_dump.sqlite3"
+
+_provider = None
+
+
+class MetadataProvider(ABC):
+    """
+    Base class of the metadata providers.
+
+    Anime data is returned in the format of a parsed MyAnimeList page:
+    {"mal_id", "titles": {language: title}, "type", "total_eps", "ep_pages",
+    "ep_titles": {language: {ep_no: title}}}
+    """
+
+    @abstractmethod
+    async def fetch_anime(self, mal_id, ep_numbers: set) -> dict:
+        """
+        Returns the data of an Anime, with the titles of as many of the
+        episodes as the provider returns at once.
+        """
+
+    async def fetch_episodes(
+        self, mal_id, ep_numbers: set, anime_data: dict
+    ) -> list[dict[str, dict[str, str]]]:
+        """
+        Returns the titles of the episodes fetch_anime() didn't return, as
+        the "ep_titles" of each page they are on.
+        """
+
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+def get_provider() -> MetadataProvider:
+    """
+    Returns the metadata provider selected in the config file.
+    """
+
+    global _provider
+
+    if _provider is None:
+        if conf_loader.conf.metadata_provider == "dump":
+            from .local_dump import LocalDumpProvider
+
+            _provider = LocalDumpProvider(conf_loader.conf.dump_path)
+        else:
+            from .mal import MALScraper
+
+            _provider = MALScraper()
+
+    return _provider
+
+
+def close_provider() -> None:
+    global _provider
+
+    if _provider is not None:
+        _provider.close()
+        _provider = None
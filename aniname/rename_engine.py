@@ -0,0 +1,466 @@
+"""
+Contains the engine that renames episode files and folders as a transaction.
+
+A transaction is planned first and written to a write-ahead journal before
+anything is renamed, so an interrupted rename can be rolled forward or back.
+"""
+
+import json
+import os
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import backup_store, profiler
+
+JOURNAL_DIR_NAME = ".journal"
+FSYNC_BATCH = 64
+
+
+def plan_steps(renames: list[tuple[Path, Path]]) -> list[tuple[Path, Path, int]]:
+    """
+    Orders renames so that no file is renamed onto a file that is still to be
+    renamed, breaking swap cycles with a temporary name.
+
+    Returns (source, destination, rename index) steps.
+    """
+
+    # Files keeping their name have no step, but keep their index
+    renames = [(src, dst, i) for i, (src, dst) in enumerate(renames) if src != dst]
+    sources = {src for src, _, _ in renames}
+
+    ready = deque()
+    # Renames waiting for the file at their destination to be renamed first
+    blocked: dict[Path, tuple[Path, Path, int]] = {}
+
+    for src, dst, i in renames:
+        if dst in sources:
+            blocked[dst] = (src, dst, i)
+        else:
+            ready.append((src, dst, i))
+
+    steps = []
+
+    while ready or blocked:
+        while ready:
+            step = ready.popleft()
+            steps.append(step)
+
+            if step[0] in blocked:
+                ready.append(blocked.pop(step[0]))
+
+        if blocked:
+            src, dst, i = next(iter(blocked.values()))
+            tmp = src.with_name(f".{uuid.uuid4().hex[:8]}.{src.name}")
+
+            steps.append((src, tmp, i))
+            blocked[dst] = (tmp, dst, i)
+
+            if src in blocked:
+                ready.append(blocked.pop(src))
+
+    return steps
+
+
+@dataclass(slots=True)
+class RenameTransaction:
+    """
+    Dataclass for renaming the episode files of a folder, and the folder
+    itself, as a transaction.
+
+    `renames` are (old name, new name) pairs of files in `dir_path`. The
+    `manifest`, if given, is completed with the names to restore and added
+    to the backup store (next to the journal) as `manifest_name` once the
+    transaction is executed.
+    """
+
+    dir_path: Path
+    renames: list[tuple[str, str]]
+    journal_dir: Path
+    new_dir_path: Path = None
+    manifest_name: str = None
+    manifest: dict = None
+    renamed: list[bool] = field(init=False, default_factory=list)
+    dir_renamed: bool = field(init=False, default=False)
+    planned: list[tuple[Path, Path, int]] = field(init=False, default_factory=list)
+    journal: "Journal" = field(init=False, default=None, repr=False)
+
+    def steps(self) -> list[tuple[Path, Path, int]]:
+        steps = plan_steps(
+            [(self.dir_path / old, self.dir_path / new) for old, new in self.renames]
+        )
+
+        if self.new_dir_path is not None and self.new_dir_path != self.dir_path:
+            steps.append((self.dir_path, self.new_dir_path, -1))
+
+        return steps
+
+    def begin(self) -> None:
+        """
+        Plans the steps of the transaction and journals them.
+        """
+
+        self.planned = self.steps()
+        self.journal = Journal.create(self.journal_dir, self, self.planned)
+        self.renamed = [old == new for old, new in self.renames]
+
+    def independent(self) -> bool:
+        """
+        Checks if the steps can run in any order (no step renames a file onto
+        the source of another step).
+        """
+
+        sources = {src for src, _, _ in self.planned}
+
+        return all(dst not in sources for _, dst, _ in self.planned)
+
+    def complete(self, step_no: int) -> None:
+        """
+        Records a completed step.
+        """
+
+        self.journal.done(step_no)
+        _, dst, i = self.planned[step_no]
+
+        if i == -1:
+            self.dir_renamed = True
+        elif dst.name == self.renames[i][1]:
+            self.renamed[i] = True
+
+    def run(self) -> None:
+        """
+        Executes the planned steps in order.
+        """
+
+        # Paths still occupied because renaming them away failed
+        occupied = set()
+
+        for step_no, (src, dst, _) in enumerate(self.planned):
+            if dst in occupied or not rename_path(src, dst):
+                occupied.add(src)
+                continue
+
+            self.complete(step_no)
+
+    def finish(self) -> None:
+        """
+        Writes the manifest and removes the journal.
+        """
+
+        self.write_manifest()
+        self.journal.commit()
+
+    def execute(self) -> None:
+        """
+        Journals and executes the renames, then writes the manifest.
+        """
+
+        with profiler.span("rename", folder=self.dir_path.name):
+            self.begin()
+            self.run()
+            self.finish()
+
+    def final_dir_path(self) -> Path:
+        return self.new_dir_path if self.dir_renamed else self.dir_path
+
+    def write_manifest(self) -> None:
+        """
+        Adds the names to restore to the backup store.
+        """
+
+        if self.manifest_name is None:
+            return
+
+        restore = {
+            new: old
+            for (old, new), renamed in zip(self.renames, self.renamed)
+            if renamed and old != new
+        }
+
+        manifest = dict(self.manifest or {})
+        manifest["dir_path"] = str(self.final_dir_path())
+        manifest["rename_count"] = len(restore)
+        manifest["restore"] = restore
+
+        store = backup_store.get_backup_store(self.journal_dir.parent)
+        store.add(self.manifest_name, manifest)
+
+
+@dataclass(slots=True)
+class Journal:
+    """
+    An append-only journal of a transaction, with fsyncs batched every
+    FSYNC_BATCH completed steps.
+    """
+
+    path: Path
+    file: object = None
+    unsynced: int = 0
+
+    @classmethod
+    def create(
+        cls, journal_dir: Path, transaction: RenameTransaction, steps: list
+    ) -> "Journal":
+        """
+        Writes the plan of a transaction to a new journal.
+        """
+
+        os.makedirs(journal_dir, exist_ok=True)
+
+        journal = cls(journal_dir / f"{uuid.uuid4().hex}.wal")
+        journal.file = open(journal.path, "w", encoding="utf-8")
+        journal.append(
+            {
+                "type": "plan",
+                "dir_path": str(transaction.dir_path),
+                "new_dir_path": (
+                    str(transaction.new_dir_path) if transaction.new_dir_path else None
+                ),
+                "renames": transaction.renames,
+                "steps": [[str(src), str(dst), i] for src, dst, i in steps],
+                "manifest_name": transaction.manifest_name,
+                "manifest": transaction.manifest,
+            }
+        )
+        journal.sync()
+
+        return journal
+
+    def append(self, record: dict) -> None:
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def done(self, step_no: int) -> None:
+        """
+        Records a completed step.
+        """
+
+        self.append({"type": "done", "step": step_no})
+        self.unsynced += 1
+
+        if self.unsynced >= FSYNC_BATCH:
+            self.sync()
+
+    def commit(self) -> None:
+        """
+        Marks the transaction as complete and removes the journal.
+        """
+
+        self.file.close()
+        os.remove(self.path)
+
+
+def rename_path(src: Path, dst: Path) -> bool:
+    """
+    Renames a path, returning whether the rename succeeded.
+    """
+
+    try:
+        src.rename(dst)
+    except OSError:
+        return False
+
+    return True
+
+
+def execute_all(transactions: list[RenameTransaction], executor: Executor) -> None:
+    """
+    Executes transactions on an executor. The episode renames of independent
+    transactions run in parallel, other transactions run in order as one task.
+    """
+
+    futures = {}
+    remaining = [0] * len(transactions)
+    parallel = [False] * len(transactions)
+
+    for t_no, transaction in enumerate(transactions):
+        transaction.begin()
+        parallel[t_no] = transaction.independent()
+
+        if not parallel[t_no]:
+            futures[executor.submit(transaction.run)] = (t_no, None)
+            remaining[t_no] += 1
+            continue
+
+        for step_no, (src, dst, i) in enumerate(transaction.planned):
+            if i != -1:
+                futures[executor.submit(rename_path, src, dst)] = (t_no, step_no)
+                remaining[t_no] += 1
+
+    def finish(t_no: int) -> None:
+        transaction = transactions[t_no]
+
+        # The folder is renamed after its episodes
+        if parallel[t_no] and transaction.planned and transaction.planned[-1][2] == -1:
+            if rename_path(*transaction.planned[-1][:2]):
+                transaction.complete(len(transaction.planned) - 1)
+
+        transaction.finish()
+
+    for t_no, count in enumerate(remaining):
+        if count == 0:
+            finish(t_no)
+
+    pending = set(futures)
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            t_no, step_no = futures[future]
+
+            if future.result() and step_no is not None:
+                transactions[t_no].complete(step_no)
+
+            remaining[t_no] -= 1
+
+            if remaining[t_no] == 0:
+                finish(t_no)
+
+
+def read_journal(journal_path: Path) -> tuple[dict, set[int]] | None:
+    """
+    Reads the plan and completed steps of a journal.
+    """
+
+    plan = None
+    done = set()
+
+    try:
+        with open(journal_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last record may have been cut off by the interruption
+                    break
+
+                if record["type"] == "plan":
+                    plan = record
+                elif record["type"] == "done":
+                    done.add(record["step"])
+    except OSError:
+        return None
+
+    if plan is None:
+        return None
+
+    return plan, done
+
+
+def manifest_name(plan: dict) -> str | None:
+    """
+    Returns the name of the manifest of a journaled plan. Journals of earlier
+    versions have the path of a manifest file instead.
+    """
+
+    if "manifest_name" in plan:
+        return plan["manifest_name"]
+
+    if plan.get("manifest_path"):
+        return Path(plan["manifest_path"]).stem
+
+    return None
+
+
+def pending_journals(backup_dir: Path) -> list[Path]:
+    """
+    Returns the journals of transactions that were interrupted.
+    """
+
+    journal_dir = backup_dir / JOURNAL_DIR_NAME
+
+    if not journal_dir.exists():
+        return []
+
+    return sorted(journal_dir.glob("*.wal"))
+
+
+def recover(journal_path: Path, rollback: bool = False) -> RenameTransaction | None:
+    """
+    Rolls an interrupted transaction forward (completing its renames and
+    writing its manifest) or back (undoing its completed renames).
+    """
+
+    journal = read_journal(journal_path)
+
+    if journal is None:
+        os.remove(journal_path)
+        return None
+
+    plan, done = journal
+    steps = [(Path(src), Path(dst), i) for src, dst, i in plan["steps"]]
+
+    transaction = RenameTransaction(
+        dir_path=Path(plan["dir_path"]),
+        renames=[tuple(rename) for rename in plan["renames"]],
+        journal_dir=journal_path.parent,
+        new_dir_path=Path(plan["new_dir_path"]) if plan["new_dir_path"] else None,
+        manifest_name=manifest_name(plan),
+        manifest=plan["manifest"],
+    )
+
+    dir_renamed = any(i == -1 for i in (steps[step_no][2] for step_no in done))
+
+    if not dir_renamed and steps and steps[-1][2] == -1:
+        dir_renamed = not steps[-1][0].exists() and steps[-1][1].exists()
+
+    def locate(path: Path) -> Path:
+        # Episode files moved with their folder if it was renamed
+        if dir_renamed and path.parent == transaction.dir_path:
+            return transaction.new_dir_path / path.name
+
+        return path
+
+    steps = [
+        (src, dst, i) if i == -1 else (locate(src), locate(dst), i)
+        for src, dst, i in steps
+    ]
+
+    if dir_renamed:
+        done.add(len(steps) - 1)
+
+    # A step may have been completed without being journaled yet
+    for step_no, (src, dst, _) in enumerate(steps):
+        if step_no not in done and not src.exists() and dst.exists():
+            done.add(step_no)
+
+    if rollback:
+        # Episode files are renamed back inside the renamed folder, before the
+        # folder itself is renamed back
+        for step_no in sorted(done, key=lambda n: (steps[n][2] == -1, -n)):
+            src, dst, _ = steps[step_no]
+
+            if dst.exists() and not src.exists():
+                dst.rename(src)
+
+        os.remove(journal_path)
+        return transaction
+
+    transaction.renamed = [old == new for old, new in transaction.renames]
+
+    for step_no, (src, dst, i) in enumerate(steps):
+        if step_no not in done:
+            if not src.exists() or dst.exists():
+                continue
+
+            try:
+                src.rename(dst)
+            except OSError:
+                continue
+
+        if i == -1:
+            transaction.dir_renamed = True
+        elif dst.name == transaction.renames[i][1]:
+            transaction.renamed[i] = True
+
+    transaction.write_manifest()
+    os.remove(journal_path)
+
+    return transaction
@@ -2,24 +2,20 @@
 The main application to restore episode filenames from backup.
 """
 
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from tkinter import filedialog
 
 from rich import box, print
-from rich.align import Align
-from rich.columns import Columns
 from rich.console import Console
-from rich.panel import Panel
-from rich.prompt import Confirm, Prompt
 from rich.table import Table
 from rich.tree import Tree
 
-from . import utils
+from . import backup_store, conf_loader, rename_engine
+from .backup_store import BackupInfo, BackupStore
 from .error_handler import HandleError
-
-os.system("cls||clear")
+from .rename_engine import JOURNAL_DIR_NAME, RenameTransaction
 
 CONSOLE = Console()
 
@@ -33,6 +29,10 @@ def print_divider(message: str) -> None:
 
 
 def initialize() -> Path:
+    from tkinter import filedialog
+
+    from rich.prompt import Prompt
+
     input_dir = Prompt.ask(
         "[b][u]Press Enter to select the folder containing the backup files (or paste the path)"
     )
@@ -43,7 +43,7 @@ def initialize() -> Path:
     return Path(input_dir)
 
 
-def print_backup_files(json_paths: list[Path]) -> None:
+def print_backup_files(backups: list[BackupInfo]) -> None:
     table = Table(
         title="\n[b][yellow]Backup File(s) Found",
         box=box.ROUNDED,
@@ -59,98 +59,215 @@ def print_backup_files(json_paths: list[Path]) -> None:
     table.add_column("Total Episodes")
     table.add_column("MAL ID")
 
-    for i, json_path in enumerate(json_paths, 1):
-        with open(json_path, encoding="utf-8") as f:
-            f = json.load(f)
-            table.add_row(
-                str(i),
-                json_path.stem,
-                f["title"],
-                f["season"] or "-",
-                f["part"] or "-",
-                str(f["rename_count"]),
-                f"[b][blue][link https://myanimelist.net/anime/{f['mal_id']}]{f['mal_id']}",
-            )
+    for i, info in enumerate(backups, 1):
+        table.add_row(
+            str(i),
+            info.name,
+            info.title,
+            info.season or "-",
+            info.part or "-",
+            str(info.rename_count),
+            f"[b][blue][link https://myanimelist.net/anime/{info.mal_id}]{info.mal_id}",
+        )
 
     CONSOLE.print(table, justify="center")
 
 
-def restore(input_dir: Path = None):
-    if input_dir is None:
-        input_dir = initialize()
+@dataclass(slots=True)
+class RestoreJob:
+    """
+    Dataclass for restoring the episode filenames of one backup.
+    """
 
-    json_paths = sorted(list(input_dir.glob(r"*.json")))
+    name: str
+    backup: dict
+    transaction: RenameTransaction = None
+    not_found: list[str] = field(default_factory=list)
+    conflicts: list[str] = field(default_factory=list)
 
-    if len(json_paths) == 0:
-        raise NoBackupsFound
+    def plan(self, journal_dir: Path) -> None:
+        """
+        Plans the renames from a single listing of the episode folder.
+        """
 
-    print_backup_files(json_paths)
+        dir_path = Path(self.backup["dir_path"])
+        names = {os.path.normcase(name) for name in os.listdir(dir_path)}
+        renames = []
 
-    json_list = [i.stem for i in json_paths]
+        for new_name, old_name in self.backup["restore"].items():
+            if os.path.normcase(new_name) in names:
+                renames.append((new_name, old_name))
+            else:
+                self.not_found.append(new_name)
 
-    INPUT = Prompt.ask("\n[b][u]Select Backup Files (separated by spaces)")
-    CHOICES = [int(i) - 1 for i in INPUT.split()]
+        sources = {os.path.normcase(new_name) for new_name, _ in renames}
 
-    print_divider("[b]Reverting[/b]")
+        for new_name, old_name in renames[:]:
+            old_key = os.path.normcase(old_name)
+
+            # Don't overwrite a file that isn't renamed away first
+            if old_key != os.path.normcase(new_name) and (
+                old_key in names and old_key not in sources
+            ):
+                renames.remove((new_name, old_name))
+                self.conflicts.append(new_name)
 
-    rename_paths = []
+        self.transaction = RenameTransaction(dir_path, renames, journal_dir)
 
-    for choice in CHOICES:
-        failed = False
+    def restored(self) -> int:
+        if self.transaction is None:
+            return 0
 
-        with open(json_paths[choice], encoding="utf-8") as f:
-            f = json.load(f)
+        return sum(self.transaction.renamed)
 
-            rename_path = Path(f["dir_path"])
+    def failed(self) -> list[str]:
+        if self.transaction is None:
+            return []
 
-            CONSOLE.print(
-                Align(f"\n[h1][b][u][yellow]Reverting: {f['title']}\n", "center")
+        return [
+            new_name
+            for (new_name, _), renamed in zip(
+                self.transaction.renames, self.transaction.renamed
             )
-            
-            if not rename_path.exists():
-                HandleError.restore_not_found(str(rename_path), json_list[choice])
-                continue
+            if not renamed
+        ]
 
 
-            rename_paths.append(rename_path)
+def load_backups(store: BackupStore, backups: list[BackupInfo]) -> list[RestoreJob]:
+    """
+    Reads the filenames of the selected backups only.
+    """
 
-            new_titles = f["restore"]
+    return [RestoreJob(info.name, store.load(info)) for info in backups]
 
+
+def print_restore_report(jobs: list[RestoreJob]) -> None:
+    table = Table(
+        title="\n[b][yellow]Restored",
+        box=box.ROUNDED,
+        show_lines=True,
+        highlight=True,
+    )
+
+    table.add_column("Anime", style="white")
+    table.add_column("Folder", style="white")
+    table.add_column("Restored", style="green")
+    table.add_column("Not Found", style="red")
+    table.add_column("Failed", style="red")
+
+    for job in jobs:
+        dir_path = Path(job.backup["dir_path"])
+
+        table.add_row(
+            job.backup["title"],
+            f"[link {dir_path.as_uri()}]{dir_path.name}",
+            str(job.restored()),
+            str(len(job.not_found)),
+            str(len(job.failed()) + len(job.conflicts)),
+        )
+
+    CONSOLE.print(table, justify="center")
+
+    for job in jobs:
+        if job.not_found:
             tree = Tree(
-                "[b][red]The following files were not found and hence they couldn't be renamed",
+                f"[b][red]{job.backup['title']}: The following files were not found"
+                " and hence they couldn't be renamed",
                 style="bold",
             )
 
-            for title in new_titles:
-                if (rename_path / title).exists():
-                    (rename_path / title).rename(rename_path / new_titles[title])
+            for name in job.not_found:
+                tree.add(name)
 
-                    renderables = [Panel(f"[b]{title}\n\n[green]{new_titles[title]}")]
-                    CONSOLE.print(Align(Columns(renderables), "center"))
+            print()
+            print(tree)
 
-                else:
-                    failed = True
-                    tree.add(title)
+        if job.conflicts or job.failed():
+            tree = Tree(
+                f"[b][red]{job.backup['title']}: The following files couldn't be"
+                " renamed",
+                style="bold",
+            )
+
+            for name in job.conflicts + job.failed():
+                tree.add(name)
 
-        if failed is True:
             print()
             print(tree)
-            print()
 
-    if len(rename_paths) == 0:
-        return
 
-    print_divider("[b]Overview[/b]")
+def restore(input_dir: Path = None, choices: list[int] = None):
+    """
+    Restores the selected backups, which are asked for unless `choices`
+    (their S. No) are given.
+    """
 
-    for rename_path in rename_paths:
-        tree = Tree(
-            f":open_file_folder: [link {rename_path.as_uri()}]{rename_path}",
-            guide_style="bold bright_blue",
-        )
-        utils.walk_directory(rename_path, tree)
-        print()
-        print(tree)
-        print()
+    from rich.prompt import Prompt
+
+    if input_dir is None:
+        input_dir = initialize()
+
+    # Don't create a store in a folder without backups
+    if not backup_store.has_backups(input_dir):
+        raise NoBackupsFound
+
+    store = backup_store.get_backup_store(input_dir)
+    backups = store.backups()
+
+    if len(backups) == 0:
+        raise NoBackupsFound
+
+    print_backup_files(backups)
+
+    if choices is None:
+        INPUT = Prompt.ask("\n[b][u]Select Backup Files (separated by spaces)")
+        choices = [int(i) for i in INPUT.split()]
+
+    CHOICES = [choice - 1 for choice in choices]
+
+    print_divider("[b]Reverting[/b]")
+
+    selected = load_backups(store, [backups[choice] for choice in CHOICES])
+    backup_store.close_backup_store()
+
+    # Backups of the same folder are restored one after another
+    rounds: list[list[RestoreJob]] = []
+    seen: dict[Path, int] = {}
+
+    for job in selected:
+        dir_path = Path(job.backup["dir_path"])
+        round_no = seen.get(dir_path, -1) + 1
+        seen[dir_path] = round_no
+
+        if round_no == len(rounds):
+            rounds.append([])
+
+        rounds[round_no].append(job)
+
+    jobs = []
+
+    with ThreadPoolExecutor(conf_loader.conf.rename_workers) as executor:
+        for round_jobs in rounds:
+            planned = []
+
+            # Planned once the previous round was restored, so that a file it
+            # restored isn't overwritten
+            for job in round_jobs:
+                try:
+                    job.plan(input_dir / JOURNAL_DIR_NAME)
+                except OSError:
+                    HandleError.restore_not_found(job.backup["dir_path"], job.name)
+                    continue
+
+                planned.append(job)
+
+            rename_engine.execute_all([job.transaction for job in planned], executor)
+            jobs.extend(planned)
+
+    if len(jobs) == 0:
+        return
+
+    print_restore_report(jobs)
 
 
 class NoBackupsFound(Exception):
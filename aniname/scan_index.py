@@ -0,0 +1,354 @@
+"""
+Contains an index of the directories and episode files in the Anime Directory,
+built by walking it once.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+
+INDEX_VERSION = 2
+
+
+@dataclass(slots=True)
+class FileEntry:
+    """
+    Dataclass for an indexed episode file.
+    """
+
+    name: str
+    size: int
+    mtime: float
+    # 0 on filesystems without inode numbers
+    inode: int
+    dev: int
+
+
+@dataclass(slots=True)
+class DirEntry:
+    """
+    Dataclass for an indexed directory.
+    """
+
+    mtime: float
+    dirs: list[str] = field(default_factory=list)
+    files: list[FileEntry] = field(default_factory=list)
+    other_files: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ScanIndex:
+    """
+    Dataclass containing the indexed directories of the Anime Directory.
+
+    Directories whose mtime didn't change since the previous index are not
+    listed again, their entries are taken from the previous index instead.
+    Their episode files are still stat-ed, as a file replaced in place
+    doesn't change the mtime of its directory.
+    """
+
+    root: Path
+    match_pattern: str = r"*.mkv"
+    dirs: dict[str, DirEntry] = field(default_factory=dict)
+    reused_dirs: int = field(init=False, default=0)
+    # Episode files of reused directories that changed (or were removed)
+    changed_files: int = field(init=False, default=0)
+
+    def build(self, previous: "ScanIndex" = None) -> None:
+        """
+        Walks the Anime Directory and indexes it.
+        """
+
+        previous_dirs = previous.dirs if previous is not None else {}
+        stack = [(str(self.root), os.stat(self.root).st_mtime)]
+
+        while stack:
+            dir_path, mtime = stack.pop()
+            entry = previous_dirs.get(dir_path)
+
+            if entry is not None and entry.mtime == mtime:
+                self.reused_dirs += 1
+                subdirs = []
+
+                for name in entry.dirs:
+                    try:
+                        subdirs.append((name, os.stat(os.path.join(dir_path, name))))
+                    except OSError:
+                        pass
+
+                self.stat_files(dir_path, entry)
+                self.dirs[dir_path] = entry
+            else:
+                entry, subdirs = self.list_dir(dir_path, mtime)
+
+                if entry is None:
+                    continue
+
+                self.dirs[dir_path] = entry
+
+            for name, stat in subdirs:
+                stack.append((os.path.join(dir_path, name), stat.st_mtime))
+
+    def stat_files(self, dir_path: str, entry: DirEntry) -> None:
+        """
+        Updates the sizes, mtimes and inodes of the episode files of a reused
+        directory entry.
+        """
+
+        files = []
+
+        for file in entry.files:
+            try:
+                stat = os.stat(os.path.join(dir_path, file.name))
+            except OSError:
+                self.changed_files += 1
+                continue
+
+            if (file.size, file.mtime, file.inode) != (
+                stat.st_size,
+                stat.st_mtime,
+                stat.st_ino,
+            ):
+                file.size, file.mtime = stat.st_size, stat.st_mtime
+                file.inode, file.dev = stat.st_ino, stat.st_dev
+                self.changed_files += 1
+
+            files.append(file)
+
+        entry.files = files
+
+    def list_dir(self, dir_path: str, mtime: float) -> tuple:
+        """
+        Lists a directory and stats its episode files.
+        """
+
+        entry = DirEntry(mtime)
+        subdirs = []
+
+        try:
+            with os.scandir(dir_path) as scan:
+                for dir_entry in scan:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        entry.dirs.append(dir_entry.name)
+                        subdirs.append((dir_entry.name, dir_entry.stat()))
+                    elif fnmatch(dir_entry.name, self.match_pattern):
+                        stat = dir_entry.stat()
+
+                        # On Windows only os.stat() gets the inode and device
+                        if not stat.st_ino:
+                            stat = os.stat(dir_entry.path)
+
+                        entry.files.append(
+                            FileEntry(
+                                dir_entry.name,
+                                stat.st_size,
+                                stat.st_mtime,
+                                stat.st_ino,
+                                stat.st_dev,
+                            )
+                        )
+                    else:
+                        entry.other_files.append(dir_entry.name)
+        except OSError:
+            return None, []
+
+        entry.files.sort(key=lambda file: file.name)
+
+        return entry, subdirs
+
+    def refresh(self, dir_paths: list[Path]) -> None:
+        """
+        Lists directories again after they changed, and adds new directories
+        to (or removes deleted ones from) their parent.
+        """
+
+        for dir_path in map(str, dir_paths):
+            parent = self.dirs.get(os.path.dirname(dir_path))
+            name = os.path.basename(dir_path)
+
+            try:
+                entry, _ = self.list_dir(dir_path, os.stat(dir_path).st_mtime)
+            except OSError:
+                entry = None
+
+            if entry is None:
+                self.dirs.pop(dir_path, None)
+
+                if parent is not None and name in parent.dirs:
+                    parent.dirs.remove(name)
+
+                continue
+
+            self.dirs[dir_path] = entry
+
+            if parent is not None and name not in parent.dirs:
+                parent.dirs.append(name)
+
+    def get(self, dir_path: Path) -> DirEntry | None:
+        return self.dirs.get(str(dir_path))
+
+    def episode_paths(self, dir_path: Path) -> list[Path]:
+        """
+        Returns the sorted paths of the episode files in a directory.
+        """
+
+        entry = self.get(dir_path)
+
+        if entry is None:
+            return sorted(dir_path.glob(self.match_pattern))
+
+        return [dir_path / file.name for file in entry.files]
+
+    def names(self, dir_path: Path) -> list[str] | None:
+        """
+        Returns the names of all entries in a directory, or None if it isn't indexed.
+        """
+
+        entry = self.get(dir_path)
+
+        if entry is None:
+            return None
+
+        return entry.dirs + [file.name for file in entry.files] + entry.other_files
+
+    def rename_files(self, dir_path: Path, renamed: dict[str, str]) -> None:
+        """
+        Updates the index after episode files were renamed (old name: new name).
+        """
+
+        entry = self.get(dir_path)
+
+        if entry is None:
+            return
+
+        for file in entry.files:
+            file.name = renamed.get(file.name, file.name)
+
+        entry.files.sort(key=lambda file: file.name)
+
+    def rename_dir(self, old_path: Path, new_path: Path) -> None:
+        """
+        Updates the index after a directory was renamed.
+        """
+
+        old_path, new_path = str(old_path), str(new_path)
+        stack = [(old_path, new_path)]
+
+        while stack:
+            old, new = stack.pop()
+            entry = self.dirs.pop(old, None)
+
+            if entry is None:
+                continue
+
+            self.dirs[new] = entry
+            stack.extend(
+                (os.path.join(old, name), os.path.join(new, name))
+                for name in entry.dirs
+            )
+
+        parent = self.dirs.get(os.path.dirname(old_path))
+
+        if parent is not None and os.path.basename(old_path) in parent.dirs:
+            parent.dirs.remove(os.path.basename(old_path))
+            parent.dirs.append(os.path.basename(new_path))
+
+    def save(self, index_path: Path) -> None:
+        """
+        Saves the index to a file.
+        """
+
+        data = {
+            "version": INDEX_VERSION,
+            "root": str(self.root),
+            "match_pattern": self.match_pattern,
+            "dirs": {
+                dir_path: [
+                    entry.mtime,
+                    entry.dirs,
+                    [[f.name, f.size, f.mtime, f.inode, f.dev] for f in entry.files],
+                    entry.other_files,
+                ]
+                for dir_path, entry in self.dirs.items()
+            },
+        }
+
+        tmp_path = index_path.with_suffix(".tmp")
+
+        # json.dumps encodes in C, json.dump encodes in Python chunk by chunk
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: Path) -> "ScanIndex | None":
+        """
+        Loads an index saved with save(), or returns None if it can't be used.
+        """
+
+        try:
+            with open(index_path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != INDEX_VERSION:
+            return None
+
+        index = cls(Path(data["root"]), data["match_pattern"])
+
+        for dir_path, (mtime, dirs, files, other_files) in data["dirs"].items():
+            index.dirs[dir_path] = DirEntry(
+                mtime, dirs, [FileEntry(*file) for file in files], other_files
+            )
+
+        return index
+
+
+def index_file_path(index_dir: Path, root: Path) -> Path:
+    """
+    Returns the path of the saved index of an Anime Directory.
+    """
+
+    digest = hashlib.sha1(str(root.resolve()).encode("utf-8")).hexdigest()[:16]
+
+    return index_dir / f"{digest}.json"
+
+
+def scan(root: Path, match_pattern=r"*.mkv", index_dir: Path = None) -> ScanIndex:
+    """
+    Indexes the Anime Directory, reusing the saved index in index_dir if given.
+    """
+
+    index = ScanIndex(root, match_pattern)
+
+    if index_dir is None:
+        index.build()
+        return index
+
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = index_file_path(index_dir, root)
+
+    previous = ScanIndex.load(index_path)
+
+    if previous is not None and (
+        previous.root != root or previous.match_pattern != match_pattern
+    ):
+        previous = None
+
+    index.build(previous)
+
+    # Nothing to save when no directory or episode file changed
+    if (
+        previous is None
+        or index.reused_dirs != len(index.dirs)
+        or len(previous.dirs) != len(index.dirs)
+        or index.changed_files
+    ):
+        index.save(index_path)
+
+    return index
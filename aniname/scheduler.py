@@ -0,0 +1,233 @@
+"""
+Contains the scheduler that limits, rate limits and retries requests.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+from yarl import URL
+
+from . import conf_loader, profiler
+from .error_handler import AnimeError, HandleError
+from .http_session import get_client_session
+
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+
+_scheduler = None
+
+
+@dataclass(slots=True)
+class SchedulerStats:
+    """
+    Dataclass for the request counters of a scheduler.
+    """
+
+    queued: int = 0
+    in_flight: int = 0
+    completed: int = 0
+    retried: int = 0
+    failed: int = 0
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    """
+    A token bucket that allows `rate` requests per second with bursts of `capacity`.
+    """
+
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated_at: float = field(init=False, default_factory=time.monotonic)
+    paused_until: float = field(init=False, default=0.0)
+
+    def __post_init__(self) -> None:
+        self.tokens = self.capacity
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available and takes it.
+        """
+
+        while True:
+            now = time.monotonic()
+
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, delay: float) -> None:
+        """
+        Stops handing out tokens for `delay` seconds.
+        """
+
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+
+class RequestScheduler:
+    """
+    Limits the number of requests in flight, rate limits them per host and
+    retries failed requests with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        rate: float,
+        burst: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+    ) -> None:
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.buckets: dict[str, TokenBucket] = {}
+        self.stats = SchedulerStats()
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+
+        return self.buckets[host]
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """
+        Returns the delay before the next attempt.
+        """
+
+        ceiling = min(self.backoff_max, self.backoff_base * 2**attempt)
+        delay = random.uniform(0, ceiling)
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+
+        return delay
+
+    @asynccontextmanager
+    async def request(self, url: str, headers: dict = None):
+        """
+        Sends a GET request and yields the response once it didn't fail.
+        """
+
+        bucket = self.bucket(URL(url).host)
+        session = await get_client_session()
+        proxy = conf_loader.conf.proxy or None
+
+        self.stats.queued += 1
+
+        for attempt in range(self.max_retries + 1):
+            waited_at = time.perf_counter()
+            await bucket.acquire()
+
+            async with self.semaphore:
+                profiler.observe("http.wait_seconds", time.perf_counter() - waited_at)
+                profiler.count("http.requests")
+
+                if attempt == 0:
+                    self.stats.queued -= 1
+
+                self.stats.in_flight += 1
+                retry_after = None
+                yielded = False
+
+                try:
+                    with profiler.span("http request", url=url, attempt=attempt):
+                        async with session.get(
+                            url, headers=headers, proxy=proxy
+                        ) as response:
+                            profiler.count(f"http.status.{response.status}")
+
+                            if response.status not in RETRY_STATUSES:
+                                yielded = True
+                                yield response
+                                self.stats.completed += 1
+                                return
+
+                            status = response.status
+                            retry_after = parse_retry_after(
+                                response.headers.get("Retry-After")
+                            )
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                    if yielded:
+                        raise
+
+                    status = type(exception).__name__
+                finally:
+                    self.stats.in_flight -= 1
+
+            if attempt == self.max_retries:
+                break
+
+            self.stats.retried += 1
+            profiler.count("http.retries")
+            delay = self.backoff(attempt, retry_after)
+
+            if retry_after is not None:
+                bucket.pause(delay)
+
+            await asyncio.sleep(delay)
+
+        self.stats.failed += 1
+        raise RequestFailed(url, status)
+
+
+def parse_retry_after(value: str) -> float | None:
+    """
+    Parses the value of a Retry-After header into seconds.
+    """
+
+    if value is None:
+        return None
+
+    if value.strip().isdigit():
+        return float(value)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_scheduler() -> RequestScheduler:
+    global _scheduler
+
+    if _scheduler is None:
+        conf = conf_loader.conf
+        _scheduler = RequestScheduler(
+            max_in_flight=conf.max_in_flight,
+            rate=conf.requests_per_second,
+            burst=conf.request_burst,
+            max_retries=conf.max_retries,
+            backoff_base=conf.backoff_base,
+            backoff_max=conf.backoff_max,
+        )
+
+    return _scheduler
+
+
+class RequestFailed(AnimeError):
+    """Raised when a request still fails after all retries."""
+
+    def __init__(self, url: str, status) -> None:
+        super().__init__(url, status)
+        HandleError.request_failed(url, status)
@@ -2,19 +2,32 @@
 Contains utility functions required by other modules.
 """
 
+import os
+import sys
+import threading
 from pathlib import Path
 
 import regex
-from aniparse import parse as aniparse
 from rich.markup import escape
 from rich.text import Text
 from rich.tree import Tree
 
+from . import parse_cache
+from .episode_titles import normalize_ep_no
+
 EP_ANITOMY_OPTIONS = {"allowed_delimiters": " -_.&+,|"}
 ANI_ANITOMY_OPTIONS = {
     "allowed_delimiters": " -_.&+,|",
     "title_before_episode": "false",
 }
+INVALID_PUNCTUATIONS = regex.compile(r'["\/<>\?\\\| +]+')
+NUMERIC_SUFFIX = regex.compile(r"^(.*) \((\d+)\)$")
+
+# Set when running without a user to answer prompts
+HEADLESS = False
+
+_name_indexes: dict[str, "NameIndex"] = {}
+_name_indexes_lock = threading.Lock()
 
 
 def parse_dir_basename(dir_basename: str) -> tuple:
@@ -48,36 +61,58 @@ def remove_part_no(dir_name: str) -> str:
     return regex.sub(r"([Pp][\d]+)", "", dir_name)
 
 
-def get_local_ep_range(ani_dir: Path, match_pattern=r"*.mkv") -> tuple[int]:
+def get_local_ep_range(
+    ani_dir: Path, match_pattern=r"*.mkv", ep_paths: list[Path] = None
+) -> tuple[int]:
     """
     Gets the range of episodes files present in a directory.
     """
 
-    ep_paths = list(ani_dir.glob(match_pattern))
+    ep_no_list = get_local_ep_numbers(ani_dir, match_pattern, ep_paths)
+
+    return min(ep_no_list), max(ep_no_list)
+
 
-    ep_no_list = [
-        int(
-            aniparse(remove_part_no(ep_path.stem), options=EP_ANITOMY_OPTIONS)[
+def get_local_ep_numbers(
+    ani_dir: Path, match_pattern=r"*.mkv", ep_paths: list[Path] = None
+) -> list[int | float]:
+    """
+    Gets the numbers of the episode files present in a directory (floats for
+    specials like 12.5).
+    """
+
+    if ep_paths is None:
+        ep_paths = list(ani_dir.glob(match_pattern))
+
+    ep_numbers = [
+        normalize_ep_no(
+            parse_cache.parse(remove_part_no(ep_path.name), EP_ANITOMY_OPTIONS)[
                 "episode_number"
             ]
         )
         for ep_path in ep_paths
     ]
 
-    return min(ep_no_list), max(ep_no_list)
+    return [ep_no for ep_no in ep_numbers if ep_no is not None]
 
 
-def format_zeros(number: int, max_number=1) -> str:
+def format_zeros(number: int | float, max_number=1) -> str:
     """
     Adds an appropriate number of leading zeros to a number based on the max number.
+    Only the whole part of a special episode (6.5) is padded, like episode 6.
     """
 
     if number is None:
         return None
 
+    max_number = int(max_number)
+
     if max_number < 10:
         max_number *= 10
-    return str(number).zfill(len(str(max_number)))
+
+    whole, point, fraction = str(number).partition(".")
+
+    return whole.zfill(len(str(max_number))) + point + fraction
 
 
 def episode_anitomy_dict(ep_file_paths: list[Path]) -> list[dict]:
@@ -86,7 +121,7 @@ def episode_anitomy_dict(ep_file_paths: list[Path]) -> list[dict]:
     """
 
     anitomy_dict = [
-        (aniparse(remove_part_no(path.name), options=EP_ANITOMY_OPTIONS))
+        parse_cache.parse(remove_part_no(path.name), EP_ANITOMY_OPTIONS)
         for path in ep_file_paths
     ]
 
@@ -104,7 +139,7 @@ def anime_anitomy_dict(anime_file_paths: list[Path]) -> list[dict]:
     """
 
     anitomy_dict = [
-        (aniparse(path.name, options=ANI_ANITOMY_OPTIONS)) for path in anime_file_paths
+        parse_cache.parse(path.name, ANI_ANITOMY_OPTIONS) for path in anime_file_paths
     ]
 
     for i, ani_dict in enumerate(anime_file_paths):
@@ -118,68 +153,157 @@ def format_punctuations(dir_basename: str) -> str:
     Returns string with punctuations appropriate for Windows file name.
     """
 
-    dir_basename = regex.sub(":", " ", str(dir_basename))
-    dir_basename = regex.sub(r'["\/<>\?\\\| +]+', " ", str(dir_basename))
+    dir_basename = str(dir_basename).replace(":", " ")
+    dir_basename = INVALID_PUNCTUATIONS.sub(" ", dir_basename)
 
     return dir_basename.strip()
 
 
-def path_fix_exisiting(new_path: Path) -> Path:
+class NameIndex:
     """
-    Expands name portion of file/folder name with numeric ' (x)' suffix to
-    return name that doesn't exist already.
+    An in-memory index of the names in a directory, listed once and updated
+    as files are renamed, used to allocate ' (x)' suffixes without listing
+    the directory again.
     """
 
-    name = new_path.name
-    dir_path = new_path.parent
+    def __init__(self, dir_path: Path, names: list[str] = None) -> None:
+        self.dir_path = dir_path
+        self.names: set[str] = set()
+        # Counts of the ' (x)' suffixes in use for each name without extension
+        self.suffixes: dict[str, dict[int, int]] = {}
+        self.lock = threading.Lock()
+
+        if names is None:
+            try:
+                with os.scandir(dir_path) as scan:
+                    names = [entry.name for entry in scan]
+            except OSError:
+                names = []
 
-    if not (dir_path / name).exists():
-        return dir_path / name
+        for name in names:
+            self.add(name)
 
-    name_split = name.rsplit(".", 1)
-    name = name_split[0]
-    ext = "." + name_split[1] if len(name_split) == 2 else ""
+    @staticmethod
+    def split_suffix(name: str) -> tuple[str, int] | None:
+        match = NUMERIC_SUFFIX.match(name.rsplit(".", 1)[0])
 
-    names = [x.name for x in dir_path.iterdir() if x.name.startswith(name)]
-    names = [x.rsplit(".", 1)[0] for x in names]
+        if match is None:
+            return None
 
-    suffixes = [x.replace(name, "") for x in names]
+        return match.group(1), int(match.group(2))
 
-    # filter suffixes that match ' (x)' pattern
-    suffixes = [x[2:-1] for x in suffixes if x.startswith(" (") and x.endswith(")")]
+    def add(self, name: str) -> None:
+        key = os.path.normcase(name)
 
-    indexes = [int(x) for x in suffixes if set(x) <= set("0123456789")]
-    idx = 1
-    if indexes:
-        idx += sorted(indexes)[-1]
+        if key in self.names:
+            return
 
-    return dir_path / f"{name} ({idx}){ext}"
+        self.names.add(key)
+        suffix = self.split_suffix(name)
 
+        if suffix is not None:
+            counts = self.suffixes.setdefault(suffix[0], {})
+            counts[suffix[1]] = counts.get(suffix[1], 0) + 1
 
-def walk_directory(directory: Path, tree: Tree) -> None:
+    def discard(self, name: str) -> None:
+        """
+        Removes a name from the index after it was renamed or deleted.
+        """
+
+        with self.lock:
+            key = os.path.normcase(name)
+
+            if key not in self.names:
+                return
+
+            self.names.discard(key)
+            suffix = self.split_suffix(name)
+
+            if suffix is not None:
+                counts = self.suffixes[suffix[0]]
+                counts[suffix[1]] -= 1
+
+                if counts[suffix[1]] == 0:
+                    del counts[suffix[1]]
+
+    def claim(self, name: str) -> Path:
+        """
+        Returns the path for a name, expanded with a ' (x)' suffix if the name
+        exists already, and adds it to the index.
+        """
+
+        with self.lock:
+            if os.path.normcase(name) in self.names:
+                name_split = name.rsplit(".", 1)
+                stem = name_split[0]
+                ext = "." + name_split[1] if len(name_split) == 2 else ""
+
+                idx = 1 + max(self.suffixes.get(stem) or [0])
+                name = f"{stem} ({idx}){ext}"
+
+            self.add(name)
+
+        return self.dir_path / name
+
+
+def name_index(dir_path: Path, names: list[str] = None) -> NameIndex:
+    """
+    Returns the shared name index of a directory, listing it on first use
+    unless its names are given.
+    """
+
+    key = str(dir_path)
+
+    with _name_indexes_lock:
+        index = _name_indexes.get(key)
+
+        if index is None:
+            index = _name_indexes[key] = NameIndex(dir_path, names)
+
+    return index
+
+
+def forget_name_index(dir_path: Path) -> None:
+    """
+    Drops the name index of a directory that was renamed or changed externally.
+    """
+
+    with _name_indexes_lock:
+        _name_indexes.pop(str(dir_path), None)
+
+
+def walk_directory(directory: Path, tree: Tree, index=None) -> None:
     """
     Recursively build a Tree with directory contents.
+    The directory listings are taken from the scan index when available.
     """
 
     # Credits: https://github.com/Textualize/rich/blob/master/examples/tree.py
 
+    entry = index.get(directory) if index is not None else None
+
+    if entry is not None:
+        paths = [(directory / name, True) for name in entry.dirs]
+        paths += [(directory / file.name, False) for file in entry.files]
+        paths += [(directory / name, False) for name in entry.other_files]
+    else:
+        paths = [(path, path.is_dir()) for path in directory.iterdir()]
+
     # Sort dirs first then by filename
-    paths = sorted(
-        directory.iterdir(),
-        key=lambda path: (path.is_file(), path.name.lower()),
-    )
-    for path in paths:
+    paths = sorted(paths, key=lambda path: (not path[1], path[0].name.lower()))
+
+    for path, is_dir in paths:
         # Remove hidden files
         if path.name.startswith("."):
             continue
-        if path.is_dir():
+        if is_dir:
             style = "dim" if path.name.startswith("__") else ""
             branch = tree.add(
                 f"[bold magenta]:open_file_folder: [link {path.as_uri()}]{escape(path.name)}",
                 style=style,
                 guide_style=style,
             )
-            walk_directory(path, branch)
+            walk_directory(path, branch, index)
         else:
             text_filename = Text(path.name, "green")
             # text_filename.highlight_regex(r"\..*$", "bold red")
@@ -190,39 +314,12 @@ def walk_directory(directory: Path, tree: Tree) -> None:
             tree.add(Text(icon) + text_filename)
 
 
-def find_formatted_subdir(dir_path: Path, match_pattern=r"*.mkv") -> list[Path]:
-    """
-    Scans all sub directories to find the ones having .mkv files and matching the required format.
-    """
-
-    scan_result: set[Path] = set()
-
-    matching_paths = dir_path.rglob(match_pattern)
-    for path in matching_paths:
-        if parse_dir_basename(path.parent.name) is not None:
-            scan_result.add(Path(path.parent))
-
-    return list(scan_result)
-
-
-def find_ani_subdir(dir_path: Path, match_pattern=r"*.mkv") -> list[Path]:
-    """
-    Scans all sub directories to find the ones having .mkv files.
-    """
-
-    scan_result: set[Path] = set()
-
-    matching_paths = dir_path.rglob(match_pattern)
-    for path in matching_paths:
-        if parse_dir_basename(path.parent.name) is None:
-            scan_result.add(path.parent)
-
-    return list(scan_result)
-
-
 def pause() -> None:
     """
-    Pauses program until the Enter key is pressed
+    Pauses program until the Enter key is pressed (skipped in headless mode)
     """
 
+    if HEADLESS or not sys.stdin.isatty():
+        return
+
     input("Press the Enter key to continue . . .")
\ No newline at end of file
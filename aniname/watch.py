@@ -0,0 +1,408 @@
+"""
+Contains the watch daemon, renaming the episodes added to the Anime Directory
+as they arrive.
+
+Changes are reported by inotify on Linux, or found by polling the mtimes of
+the directories elsewhere.
+"""
+
+import asyncio
+import errno
+import json
+import os
+import struct
+import sys
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+
+from . import (
+    backup_store,
+    conf_loader,
+    library_state,
+    parse_cache,
+    profiler,
+    scan_index,
+    utils,
+)
+from .anime import MATCH_PATTERN
+from .anime_list import ANIME_ERRORS, SCAN_INDEX_DIR, AnimeList
+from .error_handler import CONSOLE, HandleError
+
+DEBOUNCE = conf_loader.conf.watch_debounce
+POLL_INTERVAL = conf_loader.conf.watch_poll_interval
+BACKEND = conf_loader.conf.watch_backend
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+# struct inotify_event, followed by a name of len bytes
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Watches every directory of the Anime Directory with inotify, and
+    collects the directories whose entries changed.
+    """
+
+    def __init__(self, root: Path) -> None:
+        import ctypes
+        import ctypes.util
+
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        self.root = str(root)
+        self.watches: dict[int, str] = {}
+        self.changed: set[str] = set()
+        self.event = asyncio.Event()
+
+        try:
+            self.add_tree(self.root)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+        # Only the changes made from now on are reported
+        self.changed.clear()
+
+        asyncio.get_running_loop().add_reader(self.fd, self.read)
+
+    def add_watch(self, dir_path: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+
+        if wd < 0:
+            error = self.ctypes.get_errno()
+
+            # Out of watches, the polling watcher has to be used instead
+            if error == errno.ENOSPC:
+                raise OSError(error, "the inotify watch limit was reached")
+
+            return
+
+        # A directory that was moved keeps its watch, which is moved with it
+        self.watches[wd] = dir_path
+
+    def add_tree(self, dir_path: str) -> None:
+        """
+        Watches a directory and its subdirectories. They are also marked as
+        changed, as their entries may have been created before being watched.
+        """
+
+        for path, _, _ in os.walk(dir_path):
+            self.add_watch(path)
+            self.changed.add(path)
+
+    def read(self) -> None:
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+
+        while offset < len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so everything is looked at again
+                self.add_tree(self.root)
+                continue
+
+            dir_path = self.watches.get(wd)
+
+            if dir_path is None:
+                continue
+
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self.changed.add(dir_path)
+            elif mask & IN_ISDIR:
+                path = os.path.join(dir_path, name)
+                self.changed.add(dir_path)
+
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                else:
+                    self.changed.add(path)
+            else:
+                self.changed.add(dir_path)
+
+        if self.changed:
+            self.event.set()
+
+    async def wait(self, timeout: float = None) -> set[str]:
+        """
+        Returns the directories that changed, waiting for changes for at most
+        timeout seconds.
+        """
+
+        if not self.changed:
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            # Not the builtin TimeoutError before Python 3.11
+            except asyncio.TimeoutError:
+                pass
+
+        self.event.clear()
+        changed, self.changed = self.changed, set()
+
+        return changed
+
+    def close(self) -> None:
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Finds the directories of the Anime Directory whose entries changed by
+    comparing their mtimes at every poll.
+    """
+
+    def __init__(self, root: Path, interval: float) -> None:
+        self.root = str(root)
+        self.interval = interval
+        self.mtimes = self.snapshot()
+        self.next_poll = asyncio.get_running_loop().time() + interval
+
+    def snapshot(self) -> dict[str, int]:
+        mtimes = {}
+        stack = [self.root]
+
+        while stack:
+            dir_path = stack.pop()
+
+            try:
+                mtimes[dir_path] = os.stat(dir_path).st_mtime_ns
+
+                with os.scandir(dir_path) as scan:
+                    for entry in scan:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                pass
+
+        return mtimes
+
+    async def wait(self, timeout: float = None) -> set[str]:
+        loop = asyncio.get_running_loop()
+        delay = self.next_poll - loop.time()
+
+        if timeout is not None and timeout < delay:
+            await asyncio.sleep(timeout)
+            return set()
+
+        await asyncio.sleep(max(delay, 0))
+        self.next_poll = loop.time() + self.interval
+
+        mtimes = await asyncio.to_thread(self.snapshot)
+        changed = {
+            dir_path
+            for dir_path in mtimes.keys() | self.mtimes.keys()
+            if mtimes.get(dir_path) != self.mtimes.get(dir_path)
+        }
+        self.mtimes = mtimes
+
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def create_watcher(root: Path, backend: str = BACKEND):
+    """
+    Returns an inotify watcher, or a polling watcher when inotify can't be
+    used (or the polling backend is chosen).
+    """
+
+    if backend != "polling" and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            if backend == "inotify":
+                raise
+
+    return PollingWatcher(root, POLL_INTERVAL)
+
+
+def episode_sizes(dir_path: str) -> dict[str, int] | None:
+    """
+    Returns the sizes of the episode files in a directory.
+    """
+
+    try:
+        with os.scandir(dir_path) as scan:
+            return {
+                entry.name: entry.stat().st_size
+                for entry in scan
+                if fnmatch(entry.name, MATCH_PATTERN) and entry.is_file()
+            }
+    except OSError:
+        return None
+
+
+@dataclass(slots=True)
+class WatchDaemon:
+    """
+    Renames the episodes of the Anime Directory once, and then the new
+    episodes of every folder that changes.
+
+    The changes of a folder are debounced: it's only renamed once it hasn't
+    changed for the debounce time, and the sizes of its episode files stayed
+    the same, so that episodes still being written aren't renamed.
+
+    A folder failing with an error of its Anime (like a failed request) is
+    skipped until it changes again.
+    """
+
+    root: Path
+    headless: bool = False
+    debounce: float = DEBOUNCE
+    index: scan_index.ScanIndex = field(init=False, default=None, repr=False)
+    # Folder: (deadline, sizes of its episode files at the last change)
+    pending: dict[str, tuple[float, dict]] = field(init=False, default_factory=dict)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        # Started first so that no changes made during the first pass are missed
+        watcher = create_watcher(self.root)
+        HandleError.exit_on_anime_error = False
+
+        try:
+            self.index = scan_index.scan(self.root, MATCH_PATTERN, SCAN_INDEX_DIR)
+            await self.process([Path(dir_path) for dir_path in self.index.dirs])
+
+            while True:
+                timeout = None
+
+                if self.pending:
+                    deadline = min(deadline for deadline, _ in self.pending.values())
+                    timeout = max(deadline - loop.time(), 0)
+
+                changed = await watcher.wait(timeout)
+                now = loop.time()
+
+                for dir_path in changed:
+                    self.pending[dir_path] = (
+                        now + self.debounce,
+                        episode_sizes(dir_path),
+                    )
+
+                due = self.due_folders(now)
+
+                if due:
+                    self.index.refresh(sorted(due, key=len))
+                    await self.process([Path(dir_path) for dir_path in due])
+        finally:
+            watcher.close()
+            HandleError.exit_on_anime_error = True
+
+            from . import http_session
+
+            await http_session.close_client_session()
+            parse_cache.close_parse_cache()
+            library_state.close_library_state()
+            backup_store.close_backup_store()
+
+    def due_folders(self, now: float) -> list[str]:
+        """
+        Returns the folders whose debounce time is over, and debounces the
+        ones whose episode files are still growing again.
+        """
+
+        due = []
+
+        for dir_path, (deadline, sizes) in list(self.pending.items()):
+            if deadline > now:
+                continue
+
+            current_sizes = episode_sizes(dir_path)
+
+            if current_sizes != sizes:
+                self.pending[dir_path] = (now + self.debounce, current_sizes)
+                continue
+
+            del self.pending[dir_path]
+            due.append(dir_path)
+
+        return due
+
+    async def process(self, dir_paths: list[Path]) -> None:
+        """
+        Renames the episodes of changed folders.
+        """
+
+        if not dir_paths:
+            return
+
+        for dir_path in dir_paths:
+            # Their names may have changed since they were listed
+            utils.forget_name_index(dir_path)
+            utils.forget_name_index(dir_path.parent)
+
+        anime_list = AnimeList(
+            init_dir=self.root, quiet=self.headless, index=self.index, skip_errors=True
+        )
+
+        try:
+            with profiler.span("watch batch", folders=len(dir_paths)):
+                await anime_list.scan_animes(dir_paths)
+                await anime_list.rename_animes()
+        except ANIME_ERRORS as error:
+            # An error out of any single Anime skips the whole batch
+            profiler.count("watch.failed_folders", len(dir_paths))
+            CONSOLE.print(
+                f"[b][yellow]Skipped {len(dir_paths)} folder(s) ({error!r}), they will"
+                " be renamed when they change again"
+            )
+            return
+        finally:
+            parse_cache.get_parse_cache().flush()
+
+        for anime, error in anime_list.failed:
+            profiler.count("watch.failed_folders")
+            CONSOLE.print(
+                f"[b][yellow]Skipped [u]{anime.dir_path}[/u] ({type(error).__name__}),"
+                " it will be renamed when it changes again"
+            )
+
+        if self.headless:
+            for anime in anime_list.animes:
+                sys.stdout.write(json.dumps(anime.summary(), ensure_ascii=False) + "\n")
+
+            sys.stdout.flush()
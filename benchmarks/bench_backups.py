@@ -0,0 +1,91 @@
+"""
+Benchmarks listing and loading backups from the backup store against the
+previous backup files (one indented JSON file per folder, all parsed to list
+them), including migrating the files into the store.
+
+Usage: python benchmarks/bench_backups.py [backups] [episodes]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aniname.backup_store import BackupStore
+
+
+def manifest(backup_no: int, episodes: int) -> dict:
+    return {
+        "mal_id": backup_no,
+        "title": f"Anime {backup_no}",
+        "dir_path": f"/library/Anime/Anime {backup_no}",
+        "season": None,
+        "part": None,
+        "rename_count": episodes,
+        "restore": {
+            f"E{ep_no:02} - Episode {ep_no}.mkv": f"[Group] Show{backup_no} - "
+            f"{ep_no:02} [1080p].mkv"
+            for ep_no in range(1, episodes + 1)
+        },
+    }
+
+
+def legacy_list(backup_dir: Path) -> list[dict]:
+    """
+    Lists the backup files like the restore utility used to.
+    """
+
+    backups = []
+
+    for json_path in sorted(backup_dir.glob("*.json")):
+        with open(json_path, encoding="utf-8") as f:
+            backups.append(json.load(f))
+
+    return backups
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    episodes = int(sys.argv[2]) if len(sys.argv) > 2 else 26
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backup_dir = Path(tmp)
+
+        for backup_no in range(1, count + 1):
+            with open(backup_dir / f"Anime {backup_no}.json", "w") as file:
+                file.write(json.dumps(manifest(backup_no, episodes), indent=4))
+
+        _, legacy_time = timed(legacy_list, backup_dir)
+
+        store, migrate_time = timed(BackupStore, backup_dir)
+        store.close()
+
+        store, open_time = timed(BackupStore, backup_dir)
+        backups, list_time = timed(store.backups)
+        backup, load_time = timed(store.load, backups[len(backups) // 2])
+        store.close()
+
+        assert len(backups) == count, len(backups)
+        assert len(backup["restore"]) == episodes, backup
+
+    print(f"{count} backups of {episodes} episodes\n")
+    print(f"list backup files:   {legacy_time:.0f} ms")
+    print(f"migrate to store:    {migrate_time:.0f} ms")
+    print(f"open store:          {open_time:.1f} ms")
+    print(f"list store:          {list_time:.1f} ms")
+    print(f"load one backup:     {load_time:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmarks the metadata dump provider: building a dump, opening it and
+looking up every Anime in it.
+
+Usage: python benchmarks/bench_dump.py [number of Anime(s)]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aniname.local_dump import LocalDumpProvider, build_dump
+
+
+def record(mal_id: int, total_eps: int) -> dict:
+    return {
+        "mal_id": mal_id,
+        "titles": {
+            "english": f"Anime {mal_id}",
+            "romanji": f"Anime Romaji {mal_id}",
+            "japanese": f"アニメ {mal_id}",
+        },
+        "type": "TV",
+        "total_eps": str(total_eps),
+        "ep_titles": {
+            "english": {str(ep): f"Episode {ep}" for ep in range(1, total_eps + 1)},
+            "romanji": {str(ep): f"Episode R {ep}" for ep in range(1, total_eps + 1)},
+            "japanese": {str(ep): f"エピソード {ep}" for ep in range(1, total_eps + 1)},
+        },
+    }
+
+
+async def lookup_all(provider: LocalDumpProvider, count: int) -> None:
+    for mal_id in range(1, count + 1):
+        data = await provider.fetch_anime(mal_id, set(range(1, 13)))
+        assert data["ep_titles"]["english"]["12"] == "Episode 12"
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        records_path = Path(tmp) / "records.ndjson"
+        dump_path = Path(tmp) / "dump.sqlite3"
+
+        with open(records_path, "w", encoding="utf-8") as file:
+            for mal_id in range(1, count + 1):
+                # Every 50th Anime is a long running one
+                total_eps = 500 if mal_id % 50 == 0 else 24
+                file.write(json.dumps(record(mal_id, total_eps)) + "\n")
+
+        start = time.perf_counter()
+        build_dump(records_path, dump_path)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        provider = LocalDumpProvider(dump_path)
+        open_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(lookup_all(provider, count))
+        lookup_time = time.perf_counter() - start
+
+        provider.close()
+
+        size = dump_path.stat().st_size / 1024 / 1024
+
+    print(f"Anime(s):        {count}")
+    print(f"dump size:       {size:.1f} MiB")
+    print(f"build:           {build_time * 1000:.0f} ms")
+    print(f"open:            {open_time * 1000:.2f} ms")
+    print(f"lookups:         {lookup_time * 1000:.0f} ms")
+    print(f"per lookup:      {lookup_time / count * 1000000:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
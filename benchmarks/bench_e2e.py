@@ -0,0 +1,257 @@
+"""
+Benchmarks a whole rename and restore of a synthetic library against the mock
+MyAnimeList server (mock_mal.py), reporting the scan, fetch, rename and
+restore timings of every run.
+
+Each run renames the library and restores it, so runs after the first one
+use the saved scan index and parse cache (and the cached pages with --cache).
+Save the results of a run with --save, and compare later runs with --baseline
+to catch regressions.
+
+Usage: python benchmarks/bench_e2e.py [--folders N] [--episodes N] [--runs N]
+       [--latency SECONDS] [--jitter SECONDS] [--error-rate RATE]
+       [--throttle-rate RATE] [--cache] [--save FILE] [--baseline FILE]
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from make_library import generate
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PHASES = ["scan", "fetch", "rename", "restore"]
+
+CONF = """[preferences]
+season_title_language = english
+episode_title_language = english
+auto_rename = true
+
+[formatting]
+episode_format = {{S&sn|}}{{P&pn|}}{{E&en|}}{{{{ - }}}}{{et|}}
+season_format = {{S&sn|}}{{P&pn|}}{{{{ - }}}}{{st|}}
+
+[cache]
+enabled = {cache}
+
+[network]
+base_url = {base_url}
+max_in_flight = 16
+requests_per_second = 500
+burst = 50
+max_retries = 8
+backoff_base = 0.05
+backoff_max = 2
+"""
+
+
+def start_server(args) -> tuple[subprocess.Popen, str]:
+    """
+    Starts the mock server in its own process, so that serving pages isn't
+    timed, and returns it with its URL.
+    """
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCHMARKS_DIR, "mock_mal.py"),
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--error-rate={args.error_rate}",
+            f"--throttle-rate={args.throttle_rate}",
+            "--retry-after=0.2",
+            "--seed=0",
+            *([f"--pages={args.pages}"] if args.pages else []),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    return server, server.stdout.readline().strip()
+
+
+def server_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.load(response)
+
+
+def timed_anime_list(library: Path):
+    """
+    Returns an AnimeList recording when the episode filenames are parsed,
+    which ends the scan. Anime data is only fetched after it.
+    """
+
+    from aniname.anime_list import AnimeList
+
+    class TimedAnimeList(AnimeList):
+        __slots__ = ("scanned_at",)
+
+        async def scan_episodes(self) -> None:
+            await AnimeList.scan_episodes(self)
+            self.scanned_at = time.perf_counter()
+
+    return TimedAnimeList(init_dir=library, quiet=True)
+
+
+async def run_cycle(library: Path) -> dict[str, float]:
+    """
+    Renames the library and restores it, returning the timing of each phase.
+    """
+
+    from aniname import (
+        backup_store,
+        http_session,
+        library_state,
+        mal,
+        parse_cache,
+        restore_utility,
+    )
+
+    # Each run starts like a new process, reading cached pages from SQLite
+    mal._pages.clear()
+
+    timings = {}
+    anime_list = timed_anime_list(library)
+
+    start = time.perf_counter()
+    await anime_list.scan_animes()
+    await asyncio.gather(*[anime.episodes_task for anime in anime_list.animes])
+
+    timings["scan"] = anime_list.scanned_at - start
+    timings["fetch"] = time.perf_counter() - anime_list.scanned_at
+
+    start = time.perf_counter()
+    await anime_list.rename_animes()
+    timings["rename"] = time.perf_counter() - start
+
+    await http_session.close_client_session()
+    parse_cache.close_parse_cache()
+    library_state.close_library_state()
+
+    backup_dir = library.parent / "ORIGINAL_EPISODE_FILENAMES"
+    backups = backup_store.get_backup_store(backup_dir).backups()
+
+    start = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        restore_utility.restore(backup_dir, list(range(1, len(backups) + 1)))
+
+    timings["restore"] = time.perf_counter() - start
+
+    renamed = sum(anime.summary()["renamed"] for anime in anime_list.animes)
+
+    # The restore utility only restores episode filenames, so the folders are
+    # renamed back (untimed) for the next run to start from the same library
+    for anime in anime_list.animes:
+        if anime.dir_renamed:
+            anime.new_dir_path.rename(anime.dir_path)
+
+    backup_store.close_backup_store()
+    (backup_dir / backup_store.STORE_FILE_NAME).unlink()
+
+    return timings | {"renamed": renamed}
+
+
+async def run_all(library: Path, runs: int) -> list[dict]:
+    # All runs share one event loop, like the singletons they use
+    return [await run_cycle(library) for _ in range(runs)]
+
+
+def compare(best: dict, baseline_path: Path, tolerance: float) -> bool:
+    """
+    Prints the phases slower than the baseline by more than the tolerance,
+    and returns whether there are any.
+    """
+
+    baseline = json.loads(baseline_path.read_text())
+    regressed = False
+
+    for phase in PHASES:
+        limit = baseline["best"][phase] * tolerance
+
+        if best[phase] > limit:
+            print(
+                f"  {phase} regressed: {best[phase] * 1000:.0f} ms, "
+                f"baseline {baseline['best'][phase] * 1000:.0f} ms"
+            )
+            regressed = True
+
+    return regressed
+
+
+def main() -> None:
+    parser = ArgumentParser(description="End-to-end benchmark of AniName")
+    parser.add_argument("--folders", type=int, default=500)
+    parser.add_argument("--episodes", type=int, default=26)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--pages", type=Path, help="Directory of recorded pages")
+    parser.add_argument("--cache", action="store_true", help="Cache fetched pages")
+    parser.add_argument("--save", type=Path, help="Save the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare with saved results")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    server, base_url = start_server(args)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            library = Path(tmp) / "library" / "Anime"
+            files = generate(library, args.folders, args.episodes)
+
+            config_dir = Path(tmp) / "config"
+            config_dir.mkdir()
+            (config_dir / "conf.ini").write_text(
+                CONF.format(cache=str(args.cache).lower(), base_url=base_url),
+                encoding="utf-8",
+            )
+
+            from aniname import conf_loader, utils
+
+            conf_loader.config_dir = config_dir
+            conf_loader.conf_file_path = config_dir / "conf.ini"
+            utils.HEADLESS = True
+
+            print(f"{args.folders} folders, {files} episode files, {base_url}\n")
+
+            results = asyncio.run(run_all(library, args.runs))
+    finally:
+        stats = server_stats(base_url)
+        server.terminate()
+        server.wait()
+
+    print(f"{'run':5}" + "".join(f"{phase + ' (ms)':>14}" for phase in PHASES))
+
+    for run, timings in enumerate(results, 1):
+        assert timings["renamed"] == files, timings
+        print(f"{run:<5}" + "".join(f"{timings[p] * 1000:14.0f}" for p in PHASES))
+
+    best = {phase: min(timings[phase] for timings in results) for phase in PHASES}
+    print(f"{'best':5}" + "".join(f"{best[p] * 1000:14.0f}" for p in PHASES))
+    print(f"\nmock server: {stats}")
+
+    if args.save is not None:
+        args.save.write_text(
+            json.dumps({"options": vars(args), "best": best}, default=str, indent=4)
+        )
+
+    if args.baseline is not None and compare(best, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
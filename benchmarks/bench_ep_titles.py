@@ -0,0 +1,74 @@
+"""
+Benchmarks merging the episode titles of the pages of a long-running Anime
+and looking them up, with the episode title table against the previous
+string-keyed dicts merged page by page.
+
+Usage: python benchmarks/bench_ep_titles.py [episodes]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aniname.episode_titles import EpisodeTitles
+
+
+def pages(episodes: int) -> list[dict[str, str]]:
+    return [
+        {
+            str(ep_no): f"Episode Title {ep_no}"
+            for ep_no in range(offset + 1, min(episodes, offset + 100) + 1)
+        }
+        for offset in range(0, episodes, 100)
+    ]
+
+
+def legacy_merge(pages: list[dict[str, str]]) -> dict[str, str]:
+    titles = {}
+
+    for page in pages:
+        titles.update(page)
+
+    return titles
+
+
+def main() -> None:
+    episodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1100
+    ep_pages = pages(episodes)
+    ep_numbers = list(range(1, episodes + 1))
+
+    legacy = legacy_merge(ep_pages)
+    table = EpisodeTitles()
+    table.merge(ep_pages)
+
+    assert all(legacy[str(ep_no)] == table[ep_no] for ep_no in ep_numbers)
+
+    runs = 200
+    timings = {
+        "merge (dicts)": timeit.timeit(lambda: legacy_merge(ep_pages), number=runs),
+        "merge (table)": timeit.timeit(
+            lambda: EpisodeTitles().merge(ep_pages), number=runs
+        ),
+        "lookups (dicts)": timeit.timeit(
+            lambda: [legacy[str(ep_no)] for ep_no in ep_numbers], number=runs
+        ),
+        "lookups (table)": timeit.timeit(
+            lambda: [table[ep_no] for ep_no in ep_numbers], number=runs
+        ),
+    }
+
+    print(f"{episodes} episodes on {len(ep_pages)} pages\n")
+
+    for name, seconds in timings.items():
+        print(f"{name + ':':20} {seconds / runs * 1e6:8.0f} µs")
+
+    print(
+        f"\nsize: dicts {sys.getsizeof(legacy)} bytes, "
+        f"table {sys.getsizeof(table.dense) + sys.getsizeof(table.sparse)} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
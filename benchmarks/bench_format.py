@@ -0,0 +1,145 @@
+"""
+Benchmarks rendering config formats with the compiled renderer against the
+previous parser, which parsed the format again for every episode.
+
+Usage: python benchmarks/bench_format.py [episodes]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import regex
+
+from aniname import utils
+from aniname.config import compile_format
+
+FORMATS = [
+    "{S&sn|}{P&pn|}{E&en|}{{ - }}{et|}",
+    "{E&en|}{{ - }}{et|}",
+    "{et|} ({E&en|})",
+    "{sn&x|}{en|}{{ - }}{et|}",
+    "{S&sn|}{P&pn|}{{ - }}{st|}",
+    "{st|} ({S&sn|}{P&pn|})",
+    "{st|Anime}",
+    r"{st\&co|}{{ & }}{E&en|00}",
+]
+
+
+def legacy_config_format_parse(title_format: str, args: dict) -> str:
+    """
+    The previous implementation of Config.config_format_parse.
+    """
+
+    format_split = regex.split(r"{((?:[^{}]|(?R))*)}", title_format)
+
+    format_split = list(filter(None, format_split))
+
+    for i, arg in enumerate(format_split[:]):
+        arg_split = regex.split(r"([\\+]|[\&+]|[\|]|[\s+])", arg)
+
+        default = ""
+
+        if arg_split[len(arg_split) - 2] == "|":
+            default = arg_split[len(arg_split) - 1]
+            arg_split = arg_split[:-2]
+
+        arg_split = list(filter(None, arg_split))
+
+        new_arg_split = []
+
+        for j, sub_arg in enumerate(arg_split):
+            if sub_arg == "\\":
+                pass
+            elif sub_arg == "&":
+                if arg_split[j - 1] == "\\":
+                    new_arg_split.append(sub_arg)
+            elif str(sub_arg) in args:
+                if args[sub_arg] is None:
+                    new_arg_split = [default]
+                    break
+                new_arg_split.append(args[arg_split[j]])
+            else:
+                new_arg_split.append(sub_arg)
+
+        format_split[i] = "".join(new_arg_split)
+
+    format_split = list(filter(None, format_split))
+
+    while True:
+        if format_split[0].startswith("{") and format_split[0].endswith("}"):
+            del format_split[0]
+            if len(format_split) == 0:
+                break
+        else:
+            break
+
+    for i, arg in enumerate(format_split[:]):
+        if arg.startswith("{") and arg.endswith("}"):
+            format_split[i] = str(format_split[i])[1:-1]
+
+    if len(format_split) == 0:
+        format_split.append("Episode name not found")
+
+    return utils.format_punctuations("".join(format_split))
+
+
+def episode_args(episodes: int) -> list[dict]:
+    return [
+        {
+            "sn": season,
+            "pn": part,
+            "st": "Shingeki no Kyojin",
+            "en": utils.format_zeros(ep_no, episodes),
+            "et": title,
+        }
+        for ep_no in range(1, episodes + 1)
+        for season, part, title in [
+            ("01", None, f"Episode {ep_no}: To You, in 2000 Years"),
+            (None, None, None),
+            ("03", "02", ""),
+        ]
+    ]
+
+
+def main() -> None:
+    episodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    all_args = episode_args(episodes)
+
+    for title_format in FORMATS:
+        for args in all_args:
+            expected = legacy_config_format_parse(title_format, args)
+            assert compile_format(title_format).render(args) == expected, (
+                title_format,
+                args,
+            )
+
+    print(f"Outputs identical for {len(FORMATS)} formats x {len(all_args)} values\n")
+    print(f"{'format':40} {'before (us)':>12} {'after (us)':>12} {'speedup':>8}")
+
+    for title_format in FORMATS:
+        before = min(
+            timeit.repeat(
+                lambda: [legacy_config_format_parse(title_format, a) for a in all_args],
+                number=1,
+                repeat=5,
+            )
+        )
+        after = min(
+            timeit.repeat(
+                lambda: [compile_format(title_format).render(a) for a in all_args],
+                number=1,
+                repeat=5,
+            )
+        )
+
+        print(
+            f"{title_format:40} {before / len(all_args) * 1e6:12.2f}"
+            f" {after / len(all_args) * 1e6:12.2f} {before / after:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Benchmarks parsing MyAnimeList episode pages with the streaming parser against
+the previous parser, which built the whole document from the decoded page
+and compiled its XPaths on every call.
+
+Saved pages (*.html) in the given directory are used as fixtures, otherwise
+pages are generated with mal_fixture.py.
+
+Both parsers take about the same time per page. The streaming parser is
+measured for its peak memory: the largest page is parsed in a new process,
+and the growth of its peak RSS is reported (on Linux only).
+
+Usage: python benchmarks/bench_mal_parse.py [pages directory]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lxml.html
+import regex
+
+from aniname import mal
+from mal_fixture import episode_page
+
+
+def legacy_parse_anime(html, mal_id, lang):
+    """
+    The previous implementation of mal.parse_anime, which only kept the titles
+    of one language.
+    """
+
+    title_romanji = (html.xpath("//meta[@property='og:title']/@content")[0]).strip()
+
+    title_english = html.xpath('//span[text()="English:"]/following-sibling::text()')
+
+    title_japanese = html.xpath('//span[text()="Japanese:"]/following-sibling::text()')
+
+    if title_english != []:
+        title_english = title_english[0].strip()
+    else:
+        title_english = title_romanji
+
+    if title_japanese != []:
+        title_japanese = title_japanese[0].strip()
+    else:
+        title_japanese = title_romanji
+
+    anime_type = html.xpath('//span[text()="Type:"]/following-sibling::a/text()')[0]
+
+    total_episodes = (
+        html.xpath('//span[text()="Episodes:"]/following-sibling::text()')[0]
+    ).strip()
+
+    last_page = html.xpath('//div[@class="pagination ac"]/a[last()]/@href')
+
+    ep_pages = None
+
+    if len(last_page) != 0:
+        max_offset = int(regex.findall(r"\?offset=(\d+)$", last_page[0])[0])
+        ep_pages = [
+            mal.episode_page_url(mal_id, i) for i in range(0, max_offset + 100, 100)
+        ]
+
+    anime_title = title_english
+
+    if lang == "japanese":
+        anime_title = title_japanese
+
+    if lang == "romanji":
+        anime_title = title_romanji
+
+    return {
+        "mal_id": mal_id,
+        "title": anime_title,
+        "type": anime_type,
+        "total_eps": total_episodes,
+        "ep_pages": ep_pages,
+        "ep_titles": legacy_parse_episodes([html], lang),
+    }
+
+
+def legacy_parse_episodes(htmls, lang):
+    """
+    The previous implementation of mal.parse_episodes.
+    """
+
+    data = {"english": {}, "romanji": {}, "japanese": {}}
+
+    for html in htmls:
+        episode_numbers = html.xpath('//td[@class="episode-number nowrap"]/text()')
+
+        titles = html.xpath('//td[@class="episode-title fs12"]')
+
+        titles_english = []
+        title_rj = []
+
+        for i, title in enumerate(titles):
+            titles_english.append("")
+
+            titles_english[i] = title.xpath('a[@class="fl-l fw-b "]/text()')[0]
+
+            t_rj = title.xpath('span[@class="di-ib"]/text()')
+
+            if t_rj != []:
+                title_rj.append(t_rj[0])
+
+            else:
+                title_rj.append(f"{titles_english[i]}\xa0{titles_english[i]}")
+
+        titles_romanji, titles_japanese = map(
+            list, zip(*[regex.split(r"\n+|\xa0+", ele) for ele in title_rj])
+        )
+
+        for title_en, title_ro, title_jp, ep_no in zip(
+            titles_english, titles_romanji, titles_japanese, episode_numbers
+        ):
+            data["english"].update({ep_no: (title_en)})
+            data["romanji"].update({ep_no: (title_ro)})
+            data["japanese"].update({ep_no: (title_jp)})
+
+    return data[lang]
+
+
+def legacy_parse(page: bytes, mal_id, lang: str = "english") -> dict:
+    # The previous parser was run again for each title language
+    return legacy_parse_anime(lxml.html.fromstring(page.decode("utf-8")), mal_id, lang)
+
+
+def localize(data: dict, lang: str) -> dict:
+    """
+    Returns a page parsed by the streaming parser in the previous format.
+    """
+
+    data = dict(data)
+    data["title"] = data.pop("titles")[lang]
+    data["ep_titles"] = data["ep_titles"][lang]
+
+    return data
+
+
+def streaming_parse(page: bytes, mal_id) -> dict:
+    # Fed in chunks, like the pages received from aiohttp
+    parser = mal.EpisodePageParser()
+
+    for i in range(0, len(page), mal.CHUNK_SIZE):
+        parser.feed(page[i : i + mal.CHUNK_SIZE])
+
+    return parser.close(mal_id)
+
+
+PARSERS = {"before": legacy_parse, "after": streaming_parse}
+LINUX = sys.platform.startswith("linux")
+
+
+def fixture_pages(pages_dir: str = None) -> list[bytes]:
+    if pages_dir is not None:
+        return [path.read_bytes() for path in sorted(Path(pages_dir).glob("*.html"))]
+
+    return [
+        episode_page(21, offset, 1100, "One Piece").encode("utf-8")
+        for offset in range(0, 1100, 100)
+    ]
+
+
+def peak_memory(name: str, page: bytes) -> int:
+    """
+    Returns the growth of the peak RSS (in bytes) of a new process parsing a
+    page with a parser. libxml2 doesn't allocate with the Python allocator, so
+    tracemalloc doesn't see the parsed document.
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        page_path = Path(tmp) / "page.html"
+        page_path.write_bytes(page)
+
+        return int(
+            subprocess.run(
+                [sys.executable, __file__, "--peak", name, str(page_path)],
+                capture_output=True,
+                check=True,
+            ).stdout
+        )
+
+
+def memory_status(field: str) -> int:
+    """
+    Returns a memory field of /proc/self/status (VmRSS, VmHWM) in bytes.
+    """
+
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+    raise KeyError(field)
+
+
+def print_peak(name: str, page_path: str) -> None:
+    page = Path(page_path).read_bytes()
+    parse = PARSERS[name]
+
+    # Resets the peak RSS left by the imports (Linux 4.0+)
+    with open("/proc/self/clear_refs", "w") as file:
+        file.write("5")
+
+    start = memory_status("VmRSS")
+    parse(page, 21)
+
+    print(memory_status("VmHWM") - start)
+
+
+def main() -> None:
+    if sys.argv[1:2] == ["--peak"]:
+        print_peak(*sys.argv[2:4])
+        return
+
+    pages = fixture_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+
+    for page in pages:
+        data = streaming_parse(page, 21)
+
+        for lang in mal.LANGUAGES:
+            assert localize(data, lang) == legacy_parse(page, 21, lang)
+
+    print(f"Outputs identical for {len(pages)} pages in {len(mal.LANGUAGES)} languages")
+    print(f"Average page size: {sum(map(len, pages)) / len(pages) / 1024:.0f} KiB\n")
+
+    print(f"{'parser':12} {'per page (ms)':>14} {'peak memory (KiB)':>18}")
+
+    for name, parse in PARSERS.items():
+        peak = peak_memory(name, max(pages, key=len)) if LINUX else 0
+        elapsed = min(
+            timeit.repeat(
+                lambda: [parse(page, 21) for page in pages], number=1, repeat=5
+            )
+        )
+        print(f"{name:12} {elapsed / len(pages) * 1000:14.2f} {peak / 1024:18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmarks the memory used to rename a synthetic library fetched from the
+mock MyAnimeList server (mock_mal.py): the peak RSS of the run, and the
+memory still held by the Anime(s) once they are renamed.
+
+Every fifth Anime of the library is a long-runner with 150 episodes (two
+episode pages), see mal_fixture.total_episodes().
+
+Usage: python benchmarks/bench_memory.py [--folders N] [--episodes N]
+"""
+
+import asyncio
+import gc
+import os
+import resource
+import sys
+import tempfile
+from argparse import ArgumentParser
+from dataclasses import fields
+from pathlib import Path
+from types import FunctionType, ModuleType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_e2e import CONF, start_server
+from make_library import generate
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak RSS of the process in bytes.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def held_size(animes: list) -> int:
+    """
+    Returns the size of the objects referenced by the Anime(s), counting
+    shared objects once. The shared scan index isn't counted.
+    """
+
+    stack = [
+        getattr(anime, f.name)
+        for anime in animes
+        for f in fields(anime)
+        if f.name not in ("scan_index", "episodes_task")
+    ]
+    seen = set()
+    size = 0
+
+    while stack:
+        obj = stack.pop()
+
+        if id(obj) in seen or isinstance(obj, (type, ModuleType, FunctionType)):
+            continue
+
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+
+    return size
+
+
+async def run(library: Path) -> tuple[int, int]:
+    """
+    Renames the library, returning the number of renamed files and the
+    memory held by the Anime(s) afterwards.
+    """
+
+    from aniname import backup_store, http_session, library_state, parse_cache
+    from aniname.anime_list import AnimeList
+
+    anime_list = AnimeList(init_dir=library, quiet=True)
+
+    await anime_list.scan_animes()
+    await anime_list.rename_animes()
+
+    await http_session.close_client_session()
+    parse_cache.close_parse_cache()
+    library_state.close_library_state()
+    backup_store.close_backup_store()
+
+    renamed = sum(anime.summary()["renamed"] for anime in anime_list.animes)
+
+    return renamed, held_size(anime_list.animes)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Memory benchmark of AniName")
+    parser.add_argument("--folders", type=int, default=2000)
+    parser.add_argument("--episodes", type=int, default=150)
+    args = parser.parse_args()
+
+    args.latency = args.jitter = args.error_rate = args.throttle_rate = 0
+    args.pages = None
+
+    server, base_url = start_server(args)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            library = Path(tmp) / "library" / "Anime"
+            files = generate(library, args.folders, args.episodes)
+
+            config_dir = Path(tmp) / "config"
+            config_dir.mkdir()
+            (config_dir / "conf.ini").write_text(
+                CONF.format(cache="false", base_url=base_url), encoding="utf-8"
+            )
+
+            from aniname import conf_loader, utils
+
+            conf_loader.config_dir = config_dir
+            conf_loader.conf_file_path = config_dir / "conf.ini"
+            utils.HEADLESS = True
+
+            print(f"{args.folders} folders, {files} episode files\n")
+
+            start_rss = peak_rss()
+            renamed, held = asyncio.run(run(library))
+    finally:
+        server.terminate()
+        server.wait()
+
+    assert renamed == files, renamed
+
+    print(f"peak RSS:            {peak_rss() / 2**20:.0f} MiB")
+    print(f"peak RSS of the run: {(peak_rss() - start_rss) / 2**20:.0f} MiB")
+    print(f"held by the Anime(s): {held / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
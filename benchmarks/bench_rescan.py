@@ -0,0 +1,125 @@
+"""
+Benchmarks rescanning a synthetic library where nothing changed since it was
+renamed, and adding one new episode to a folder renamed by the first run.
+
+Anime data is read from a local metadata dump, so nothing is fetched.
+
+Usage: python benchmarks/bench_rescan.py [folders] [max episodes]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_dump import record
+from make_library import generate
+from mal_fixture import total_episodes
+
+CONF = """[preferences]
+season_title_language = english
+episode_title_language = english
+auto_rename = true
+
+[formatting]
+episode_format = {{S&sn|}}{{P&pn|}}{{E&en|}}{{{{ - }}}}{{et|}}
+season_format = {{S&sn|}}{{P&pn|}}{{{{ - }}}}{{st|}}
+
+[metadata]
+provider = dump
+dump_path = {dump_path}
+"""
+
+
+async def run(library: Path, rename: bool = True):
+    """
+    Scans the library (and renames it), timing the scan.
+    """
+
+    from aniname import library_state, parse_cache, utils
+    from aniname.anime_list import AnimeList
+
+    anime_list = AnimeList(init_dir=library, quiet=True)
+
+    start = time.perf_counter()
+    await anime_list.scan_animes()
+    scan_time = time.perf_counter() - start
+
+    if rename:
+        await anime_list.rename_animes()
+
+    # Like a new run, which loads the saved index, caches and state again
+    parse_cache.close_parse_cache()
+    library_state.close_library_state()
+    utils._name_indexes.clear()
+
+    return anime_list, scan_time
+
+
+def main() -> None:
+    folders = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_episodes = int(sys.argv[2]) if len(sys.argv) > 2 else 26
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = Path(tmp) / "library" / "Anime"
+        files = generate(library, folders, max_episodes)
+
+        config_dir = Path(tmp) / "config"
+        config_dir.mkdir()
+        records_path = Path(tmp) / "records.ndjson"
+        dump_path = config_dir / "dump.sqlite3"
+
+        with open(records_path, "w", encoding="utf-8") as file:
+            for mal_id in range(1, folders + 1):
+                file.write(json.dumps(record(mal_id, total_episodes(mal_id))) + "\n")
+
+        (config_dir / "conf.ini").write_text(
+            CONF.format(dump_path=dump_path), encoding="utf-8"
+        )
+
+        from aniname import conf_loader, utils
+
+        conf_loader.config_dir = config_dir
+        conf_loader.conf_file_path = config_dir / "conf.ini"
+        utils.HEADLESS = True
+
+        from aniname.local_dump import build_dump
+
+        build_dump(records_path, dump_path)
+
+        print(f"{folders} folders, {files} episode files\n")
+
+        anime_list, first_scan = asyncio.run(run(library))
+        renamed = sum(anime.summary()["renamed"] for anime in anime_list.animes)
+        assert renamed == files, renamed
+
+        rescans = [asyncio.run(run(library, rename=False)) for _ in range(3)]
+
+        for anime_list, _ in rescans:
+            assert len(anime_list.animes) == 0, len(anime_list.animes)
+
+        # A new episode in a folder that was renamed by the first run
+        dir_path = next(p for p in library.iterdir() if p.name.endswith("Anime 3"))
+        (dir_path / f"[Group] Show3 - {max_episodes + 1} [1080p].mkv").touch()
+
+        start = time.perf_counter()
+        anime_list, new_scan = asyncio.run(run(library))
+        new_time = time.perf_counter() - start
+
+        assert [anime.summary()["renamed"] for anime in anime_list.animes] == [1]
+
+    print(f"first scan:          {first_scan * 1000:.0f} ms")
+    print(f"unchanged rescan:    {min(scan for _, scan in rescans) * 1000:.0f} ms")
+    print(
+        f"one new episode:     {new_time * 1000:.0f} ms "
+        f"(scan {new_scan * 1000:.0f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
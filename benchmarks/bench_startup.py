@@ -0,0 +1,104 @@
+"""
+Checks the import time of the CLI against a budget, using `python -X importtime`.
+
+`--help` and the restore utility must not import the rename dependencies
+(tkinter, aiohttp, lxml, aniparse) and must stay within their budgets.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budgets (in milliseconds) of the best run
+CASES = [
+    ("--help", [os.path.join(ROOT, "aniname"), "--help"], 75),
+    (
+        "--restore",
+        [
+            "-c",
+            "import aniname.__main__, aniname.restore_utility as r; r.conf_loader.conf",
+        ],
+        250,
+    ),
+]
+
+FORBIDDEN = ["tkinter", "aiohttp", "lxml", "aniparse", "aniname.anime_list"]
+
+
+def import_times(args: list[str]) -> tuple[dict[str, int], set[str]]:
+    """
+    Runs Python with -X importtime and returns the cumulative import time
+    (in microseconds) of each top-level import, and all imported modules.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        stdin=subprocess.DEVNULL,
+    )
+
+    times = {}
+    modules = set()
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+
+    return times, modules
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    failed = False
+
+    print(f"{'case':12} {'imports (ms)':>12} {'budget (ms)':>12}  slowest imports")
+
+    for name, args, budget in CASES:
+        best = None
+        modules = set()
+
+        for _ in range(runs):
+            times, modules = import_times(args)
+
+            if best is None or sum(times.values()) < sum(best.values()):
+                best = times
+
+        total = sum(best.values()) / 1000
+        slowest = sorted(best.items(), key=lambda item: item[1], reverse=True)[:3]
+
+        print(
+            f"{name:12} {total:12.1f} {budget:12}  "
+            + ", ".join(f"{module} {us / 1000:.1f}" for module, us in slowest)
+        )
+
+        loaded = [
+            module
+            for module in FORBIDDEN
+            if any(m == module or m.startswith(module + ".") for m in modules)
+        ]
+
+        if loaded:
+            print(f"  {name} imports {', '.join(loaded)}")
+            failed = True
+
+        if total > budget:
+            print(f"  {name} is over its budget")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Generates a synthetic Anime library of {mal_id}, {mal_id}S{n} and
+{mal_id}S{n}P{m} folders of empty .mkv episode files, for the Anime(s) served
+by mock_mal.py.
+
+Usage: python benchmarks/make_library.py OUTPUT_DIR [folders] [max episodes]
+"""
+
+import random
+import sys
+from pathlib import Path
+
+from mal_fixture import total_episodes
+
+
+def folder_name(mal_id: int, rng: random.Random) -> str:
+    roll = rng.random()
+
+    if roll < 0.6:
+        return str(mal_id)
+
+    if roll < 0.9:
+        return f"{mal_id}S{rng.randint(1, 4)}"
+
+    return f"{mal_id}S{rng.randint(1, 4)}P{rng.randint(1, 2)}"
+
+
+def generate(
+    output_dir: Path, folders: int, max_episodes: int = 26, seed: int = 0
+) -> int:
+    """
+    Creates the library and returns the number of episode files in it.
+    Every folder has a different MAL ID, so every Anime is fetched.
+    """
+
+    rng = random.Random(seed)
+    files = 0
+
+    for mal_id in range(1, folders + 1):
+        dir_path = output_dir / folder_name(mal_id, rng)
+        dir_path.mkdir(parents=True, exist_ok=True)
+
+        for ep_no in range(1, min(total_episodes(mal_id), max_episodes) + 1):
+            (dir_path / f"[Group] Show{mal_id} - {ep_no:02d} [1080p].mkv").touch()
+            files += 1
+
+    return files
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+
+    output_dir = Path(sys.argv[1])
+    folders = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    max_episodes = int(sys.argv[3]) if len(sys.argv) > 3 else 26
+
+    files = generate(output_dir, folders, max_episodes)
+
+    print(f"{folders} folders and {files} episode files created in {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Generates MyAnimeList episode pages for the benchmarks, following the markup
+of the real pages (layout table, sidebar, pagination and episode table).
+"""
+
+from html import escape
+
+# Markup the real pages have around the episode table (scripts, menus, ads)
+FILLER = "".join(
+    f'<div class="widget" id="w{i}"><script type="text/javascript">'
+    f"window.MAL = window.MAL || {{}}; MAL.widget{i} = {{'id': {i}, 'lazy': true}};"
+    f'</script><ul class="menu">'
+    + "".join(f'<li><a href="/{i}/{j}">Item {j}</a></li>' for j in range(8))
+    + "</ul></div>\n"
+    for i in range(120)
+)
+
+
+def episode_row(ep_no: int) -> str:
+    return (
+        '<tr class="episode-list-data">'
+        f'<td class="episode-number nowrap">{ep_no}</td>'
+        '<td class="episode-video nowrap"><a href="#"><img src="/images/video.png"'
+        ' width="24" height="15" alt="Watch"></a></td>'
+        '<td class="episode-title fs12">'
+        f'<a href="/anime/0/_/episode/{ep_no}" class="fl-l fw-b ">'
+        f"Episode Title {ep_no}</a><br>"
+        f'<span class="di-ib">Episode Romaji {ep_no}&nbsp;(エピソード {ep_no})'
+        "</span></td>"
+        '<td class="episode-aired nowrap">Oct 4, 2006</td>'
+        '<td class="episode-poll scored" data-raw="4.5">'
+        '<div class="average">4.5</div></td>'
+        '<td class="episode-forum ac"><a href="#">Forum</a></td></tr>\n'
+    )
+
+
+def episode_page(mal_id: int, offset: int, total_eps: int, title: str) -> str:
+    """
+    Returns the episode page of an Anime, listing up to 100 episodes from offset.
+    """
+
+    rows = "".join(
+        episode_row(ep_no)
+        for ep_no in range(offset + 1, min(total_eps, offset + 100) + 1)
+    )
+
+    pagination = ""
+
+    if total_eps > 100:
+        links = "".join(
+            f'<a class="link" href="https://myanimelist.net/anime/{mal_id}/_/episode'
+            f'?offset={page_offset}">{page_offset + 1} - {page_offset + 100}</a>'
+            for page_offset in range(0, total_eps, 100)
+        )
+        pagination = f'<div class="pagination ac">{links}</div>'
+
+    title = escape(title)
+
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="UTF-8">
+<meta property="og:title" content="{title}">
+<title>{title} - Episodes - MyAnimeList.net</title></head>
+<body class="page-common"><div id="myanimelist"><div class="wrapper">
+<div id="contentWrapper"><div><h1 class="title-name h1_bold_none">
+<strong>{title}</strong></h1></div>
+<div id="content"><table border="0" cellpadding="0" cellspacing="0" width="100%">
+<tr><td class="borderClass" width="225" valign="top"><div class="leftside">
+<h2>Alternative Titles</h2>
+<div class="spaceit_pad"><span class="dark_text">Japanese:</span> {title} JP</div>
+<div class="spaceit_pad"><span class="dark_text">English:</span> {title} EN</div>
+<h2>Information</h2>
+<div class="spaceit_pad"><span class="dark_text">Type:</span>
+<a href="https://myanimelist.net/topanime.php?type=tv">TV</a></div>
+<div class="spaceit_pad"><span class="dark_text">Episodes:</span> {total_eps}</div>
+</div></td><td valign="top" style="padding-left: 5px;">
+<div class="js-scrollfix-bottom-rel">{FILLER}{pagination}
+<table border="0" cellpadding="0" cellspacing="0" width="100%"
+class="mt8 episode_list js-watch-episode-list ascend">
+<tr class="episode-list-header"><th class="episode-number">#</th>
+<th class="episode-title">Title</th><th class="episode-aired">Aired</th></tr>
+{rows}</table>{FILLER}</div></td></tr></table></div></div></div></div></body></html>
+"""
+
+
+def total_episodes(mal_id: int) -> int:
+    """
+    Returns the number of episodes of a generated Anime, so that the mock
+    server and the generated libraries agree on it.
+    """
+
+    return (12, 24, 26, 64, 150)[mal_id % 5]
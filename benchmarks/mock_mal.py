@@ -0,0 +1,163 @@
+"""
+A local stand-in for MyAnimeList serving episode pages, with configurable
+latency, server errors and 429 throttling.
+
+Recorded pages (saved as {mal_id}_{offset}.html) are served from --pages,
+other pages are generated with mal_fixture.py. The server prints its URL once
+it's listening, and /stats returns its counters.
+
+Usage: python benchmarks/mock_mal.py [--port PORT] [--latency SECONDS]
+       [--jitter SECONDS] [--error-rate RATE] [--throttle-rate RATE]
+       [--retry-after SECONDS] [--pages DIR] [--seed SEED]
+"""
+
+import asyncio
+import random
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from aiohttp import web
+
+from mal_fixture import episode_page, total_episodes
+
+
+@dataclass(slots=True)
+class MockOptions:
+    """
+    Dataclass for the behaviour of the mock server.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    pages_dir: Path = None
+    seed: int = None
+
+
+@dataclass(slots=True)
+class MockMAL:
+    """
+    The mock server, with its counters.
+    """
+
+    options: MockOptions
+    stats: dict = field(
+        default_factory=lambda: {
+            "requests": 0,
+            "served": 0,
+            "errors": 0,
+            "throttled": 0,
+        }
+    )
+    rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.options.seed)
+
+    def page(self, mal_id: int, offset: int) -> bytes:
+        """
+        Returns a recorded page, or generates it.
+        """
+
+        if self.options.pages_dir is not None:
+            recorded = self.options.pages_dir / f"{mal_id}_{offset}.html"
+
+            if recorded.is_file():
+                return recorded.read_bytes()
+
+        return episode_page(
+            mal_id, offset, total_episodes(mal_id), f"Show{mal_id}"
+        ).encode("utf-8")
+
+    async def episode_page(self, request: web.Request) -> web.Response:
+        options = self.options
+        self.stats["requests"] += 1
+
+        await asyncio.sleep(options.latency + self.rng.uniform(0, options.jitter))
+
+        roll = self.rng.random()
+
+        if roll < options.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.Response(
+                status=429, headers={"Retry-After": str(options.retry_after)}
+            )
+
+        if roll < options.throttle_rate + options.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+
+        page = self.page(
+            int(request.match_info["mal_id"]), int(request.query.get("offset", 0))
+        )
+        self.stats["served"] += 1
+
+        response = web.Response(body=page, content_type="text/html", charset="utf-8")
+        response.enable_compression()
+
+        return response
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/anime/{mal_id}/_/episode", self.episode_page)
+        app.router.add_get("/stats", self.get_stats)
+
+        return app
+
+
+async def serve(options: MockOptions, host: str, port: int) -> None:
+    """
+    Runs the mock server until it's stopped and prints its URL.
+    """
+
+    runner = web.AppRunner(MockMAL(options).app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    # The actual port, when any free port was asked for
+    port = runner.addresses[0][1]
+    print(f"http://{host}:{port}", flush=True)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Local stand-in for MyAnimeList")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--pages", type=Path, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    options = MockOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        pages_dir=args.pages,
+        seed=args.seed,
+    )
+
+    try:
+        asyncio.run(serve(options, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from aniname import conf_loader, providers
+from aniname.providers import MetadataProvider
+from aniname.scheduler import RequestFailed
+
+
+def pytest_configure(config):
+    # Modules read options when they are imported, so the config directory is
+    # moved before the tests are collected
+    conf_loader.config_dir = Path(tempfile.mkdtemp(prefix="aniname-tests-"))
+    conf_loader.conf_file_path = conf_loader.config_dir / "conf.ini"
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(conf_loader.config_dir, ignore_errors=True)
+
+
+class FakeProvider(MetadataProvider):
+    """
+    Returns the same titles for every Anime, but fails for MAL ID 2.
+    """
+
+    def __init__(self) -> None:
+        self.fetched: list[int] = []
+
+    async def fetch_anime(self, mal_id, ep_numbers: set) -> dict:
+        self.fetched.append(int(mal_id))
+
+        if int(mal_id) == 2:
+            raise RequestFailed(f"https://myanimelist.net/anime/{mal_id}", 503)
+
+        return {
+            "mal_id": int(mal_id),
+            "titles": {
+                "english": f"Show {mal_id}",
+                "romanji": f"Shou {mal_id}",
+                "japanese": f"ショー {mal_id}",
+            },
+            "type": "TV",
+            "total_eps": 12,
+            "ep_pages": [],
+            "ep_titles": {
+                "english": {"1": "The Beginning"},
+                "romanji": {"1": "Hajimari"},
+                "japanese": {"1": "始まり"},
+            },
+        }
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr(providers, "_provider", provider)
+
+    return provider
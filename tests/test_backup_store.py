@@ -0,0 +1,67 @@
+import json
+
+from aniname.backup_store import MIGRATED_DIR_NAME, BackupStore, has_backups
+
+
+def write_backup_file(backup_dir, name, dir_path, restore):
+    manifest = {
+        "mal_id": 5,
+        "title": "Show",
+        "dir_path": dir_path,
+        "season": "1",
+        "part": None,
+        "rename_count": len(restore),
+        "restore": restore,
+    }
+    (backup_dir / f"{name}.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+    return manifest
+
+
+def test_backup_files_are_migrated(tmp_path):
+    backup_dir = tmp_path / "ORIGINAL_EPISODE_FILENAMES"
+    backup_dir.mkdir()
+    manifest = write_backup_file(
+        backup_dir, "S1 - Show", "/library/S1 - Show", {"S1E01.mkv": "Show 01.mkv"}
+    )
+    (backup_dir / "broken.json").write_text("{", encoding="utf-8")
+
+    assert has_backups(backup_dir)
+
+    store = BackupStore(backup_dir)
+
+    try:
+        (info,) = store.backups()
+        assert info.name == "S1 - Show"
+        assert store.load(info) == manifest
+    finally:
+        store.close()
+
+    assert sorted(path.name for path in backup_dir.glob("*.json")) == ["broken.json"]
+    assert (backup_dir / MIGRATED_DIR_NAME / "S1 - Show.json").exists()
+
+
+def test_an_interrupted_migration_is_not_added_twice(tmp_path):
+    backup_dir = tmp_path / "ORIGINAL_EPISODE_FILENAMES"
+    backup_dir.mkdir()
+    manifest = write_backup_file(
+        backup_dir, "S1 - Show", "/library/S1 - Show", {"S1E01.mkv": "Show 01.mkv"}
+    )
+
+    # Added to the store, but not moved out of the way yet
+    BackupStore(backup_dir).close()
+    (backup_dir / MIGRATED_DIR_NAME / "S1 - Show.json").rename(
+        backup_dir / "S1 - Show.json"
+    )
+
+    store = BackupStore(backup_dir)
+
+    try:
+        assert [info.name for info in store.backups()] == ["S1 - Show"]
+
+        # Another folder with the same name gets a ' (x)' suffix
+        assert store.add("S1 - Show", {**manifest, "dir_path": "/other"}) == (
+            "S1 - Show (1)"
+        )
+    finally:
+        store.close()
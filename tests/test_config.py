@@ -0,0 +1,28 @@
+from aniname.config import Config, compile_format
+
+EPISODE_FORMAT = "{S&sn|}{P&pn|}{E&en|}{{ - }}{et|}"
+
+
+def test_fields_with_a_missing_value_are_left_out():
+    compiled = compile_format(EPISODE_FORMAT)
+    args = {"sn": "1", "pn": None, "en": "01", "et": "The Beginning"}
+
+    assert compiled.render(args) == "S1E01 - The Beginning"
+    assert compiled.render({**args, "sn": None, "en": None}) == "The Beginning"
+
+
+def test_defaults_and_escaped_characters():
+    assert compile_format("{st|Anime}").render({"st": None}) == "Anime"
+    assert compile_format("{st|Anime}").render({"st": "Show"}) == "Show"
+    assert compile_format(r"{at\&et}").render({"at": "A", "et": "B"}) == "A&B"
+
+
+def test_formats_are_compiled_once():
+    compiled = compile_format(EPISODE_FORMAT)
+
+    assert compile_format(EPISODE_FORMAT) is compiled
+
+    # The same format renders values given in another order
+    args = {"et": "The Beginning", "en": "01", "pn": "2", "sn": "1"}
+    assert compiled.render(args) == "S1P2E01 - The Beginning"
+    assert Config.config_format_parse(EPISODE_FORMAT, args) == compiled.render(args)
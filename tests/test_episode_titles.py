@@ -0,0 +1,34 @@
+from aniname.episode_titles import EpisodeTitles, normalize_ep_no
+
+
+def page(first, last):
+    return {str(ep_no): f"Title {ep_no}" for ep_no in range(first, last + 1)}
+
+
+def test_episode_numbers_are_normalized():
+    assert normalize_ep_no("07") == 7
+    assert normalize_ep_no("12.5") == 12.5
+    assert normalize_ep_no("12.0") == 12
+    assert normalize_ep_no(["01", "02"]) == 1
+    assert normalize_ep_no("OVA") is None
+
+
+def test_pages_are_merged():
+    titles = EpisodeTitles()
+    titles.merge([page(101, 200), page(1, 100), {"12.5": "Recap", "07": "Seven"}])
+
+    assert len(titles) == 201
+    assert titles[1] == "Title 1"
+    assert titles[200] == "Title 200"
+    assert titles[7] == "Seven"
+    assert titles.get("12.5") == "Recap"
+    assert titles.get(201) is None
+
+
+def test_only_the_given_episodes_are_kept():
+    titles = EpisodeTitles()
+    titles.merge([page(1, 100), page(1001, 1100)], {5, 7.5, 1050})
+
+    assert dict(titles.items()) == {5: "Title 5", 1050: "Title 1050"}
+    # Far apart episodes aren't stored in one list
+    assert len(titles.dense) < 100
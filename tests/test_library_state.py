@@ -0,0 +1,94 @@
+import os
+
+from aniname.library_state import LibraryState
+from aniname.scan_index import DirEntry, FileEntry, scan
+
+
+def renamed_folder(tmp_path, names=("S1E01 - Title.mkv", "S1E02 - Title.mkv")):
+    """
+    Returns a folder whose episodes were renamed, and its library state.
+    """
+
+    root = tmp_path / "Anime"
+    dir_path = root / "S1 - Show"
+    dir_path.mkdir(parents=True)
+
+    for name in names:
+        (dir_path / name).write_bytes(b"0")
+
+    entry = scan(root).get(dir_path)
+    state = LibraryState(tmp_path / "library_state.sqlite3")
+    state.record(
+        None,
+        "5",
+        "1",
+        None,
+        dir_path,
+        entry,
+        [(file, ep_no) for ep_no, file in enumerate(entry.files, 1)],
+    )
+    state.close()
+
+    return root, dir_path, LibraryState(state.db_path)
+
+
+def test_an_unchanged_folder_is_skipped(tmp_path):
+    root, dir_path, state = renamed_folder(tmp_path)
+
+    status = state.status(str(dir_path), scan(root).get(dir_path))
+
+    assert status.folder.mal_id == 5
+    assert status.new_files == []
+    # Recognised by its digest, without reading its files
+    assert state.files == {}
+
+
+def test_only_new_episodes_are_renamed(tmp_path):
+    root, dir_path, state = renamed_folder(tmp_path)
+    (dir_path / "[G] Show - 03.mkv").touch()
+
+    status = state.status(str(dir_path), scan(root).get(dir_path))
+
+    assert status.folder.mal_id == 5
+    assert status.new_files == ["[G] Show - 03.mkv"]
+    assert status.done_ep_numbers == {1, 2}
+
+
+def test_an_episode_replaced_in_place_is_renamed(tmp_path):
+    root, dir_path, state = renamed_folder(tmp_path)
+    index_dir = tmp_path / "scan_index"
+    scan(root, index_dir=index_dir)
+
+    mtime = os.stat(dir_path).st_mtime_ns
+    (dir_path / "S1E02 - Title.mkv").write_bytes(b"new release")
+    os.utime(dir_path, ns=(mtime, mtime))
+
+    status = state.status(str(dir_path), scan(root, index_dir=index_dir).get(dir_path))
+
+    assert status.new_files == ["S1E02 - Title.mkv"]
+    assert status.done_ep_numbers == {1}
+
+
+def test_a_new_file_reusing_an_inode_is_renamed(tmp_path):
+    state = LibraryState(tmp_path / "library_state.sqlite3")
+    old = FileEntry("S1E01 - Title.mkv", 100, 1.0, 42, 1)
+    state.record(None, "5", "1", None, "/Anime/S1 - Show", DirEntry(1.0), [(old, 1)])
+
+    # Another file with the inode of the renamed one
+    new = FileEntry("[G] Show - 01v2.mkv", 200, 2.0, 42, 1)
+    status = state.status("/Anime/S1 - Show", DirEntry(2.0, files=[new]))
+
+    assert status.new_files == ["[G] Show - 01v2.mkv"]
+    assert status.done_ep_numbers == set()
+
+
+def test_a_renamed_folder_is_recognised(tmp_path):
+    root, dir_path, state = renamed_folder(tmp_path)
+    new_path = dir_path.rename(root / "Show (2020)")
+
+    status = state.status(str(new_path), scan(root).get(new_path))
+
+    assert status.folder.dir_path == str(new_path)
+    assert status.new_files == []
+    assert status.done_ep_numbers == {1, 2}
+    assert state.folder_paths.keys() == {str(new_path)}
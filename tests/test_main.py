@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from aniname import anime
+from aniname.__main__ import run_headless
+
+
+def test_a_dry_run_prints_the_planned_names(tmp_path, capsys, fake_provider):
+    input_dir = tmp_path / "library" / "Anime"
+    dir_path = input_dir / "1S1"
+    dir_path.mkdir(parents=True)
+    (dir_path / "[G] Show - 01.mkv").touch()
+
+    asyncio.run(run_headless(input_dir, False, False, "ndjson"))
+
+    (summary,) = map(json.loads, capsys.readouterr().out.splitlines())
+
+    assert summary["renamed"] == 0
+    assert summary["planned"] == [
+        {"old": "[G] Show - 01.mkv", "new": "S1E01 - The Beginning.mkv"}
+    ]
+    # Nothing was renamed
+    assert [path.name for path in input_dir.iterdir()] == ["1S1"]
+    assert [path.name for path in dir_path.iterdir()] == ["[G] Show - 01.mkv"]
+
+
+def test_name_variants_are_rendered_from_one_fetch(
+    tmp_path, capsys, monkeypatch, fake_provider
+):
+    input_dir = tmp_path / "library" / "Anime"
+    dir_path = input_dir / "1S1"
+    dir_path.mkdir(parents=True)
+    (dir_path / "[G] Show - 01.mkv").touch()
+    monkeypatch.setattr(anime, "VARIANT_LANGS", ["romanji", "japanese"])
+
+    asyncio.run(run_headless(input_dir, True, False, "ndjson"))
+
+    (summary,) = map(json.loads, capsys.readouterr().out.splitlines())
+
+    assert summary["renamed"] == 1
+    assert summary["variants"] == {
+        "romanji": {
+            "dir_name": "S1 - Shou 1",
+            "episodes": [{"old": "[G] Show - 01.mkv", "new": "S1E01 - Hajimari.mkv"}],
+        },
+        "japanese": {
+            "dir_name": "S1 - ショー 1",
+            "episodes": [{"old": "[G] Show - 01.mkv", "new": "S1E01 - 始まり.mkv"}],
+        },
+    }
+    assert fake_provider.fetched == [1]
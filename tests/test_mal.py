@@ -0,0 +1,12 @@
+from aniname import mal
+from aniname.error_handler import CONSOLE, HandleError
+
+
+def test_offline_cache_misses_show_the_page_of_the_configured_site(monkeypatch):
+    monkeypatch.setattr(mal, "BASE_URL", "http://mirror.local")
+    monkeypatch.setattr(HandleError, "exit_on_anime_error", False)
+
+    with CONSOLE.capture() as capture:
+        mal.OfflineCacheMiss(5, 100)
+
+    assert "http://mirror.local/anime/5/_/episode?offset=100" in capture.get()
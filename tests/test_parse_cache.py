@@ -0,0 +1,66 @@
+import asyncio
+
+from aniname import parse_cache
+from aniname.parse_cache import ParseCache
+
+OPTIONS = {"allowed_delimiters": " _.&+,|"}
+
+
+def fake_aniparse(calls):
+    def aniparse(name, options):
+        calls.append(name)
+        return {"file_name": name, "episode_number": name[-6:-4]}
+
+    return aniparse
+
+
+def test_names_are_parsed_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(parse_cache, "aniparse", fake_aniparse(calls))
+    cache = ParseCache(max_entries=10)
+
+    asyncio.run(cache.parse_many(["Show - 01.mkv", "Show - 01.mkv"], OPTIONS))
+    result = cache.parse("Show - 01.mkv", OPTIONS)
+    cache.parse("Show - 02.mkv", OPTIONS)
+
+    assert result["episode_number"] == "01"
+    assert calls == ["Show - 01.mkv", "Show - 02.mkv"]
+
+    # Results are copied, so changing one doesn't change the cache
+    result["episode_number"] = "99"
+    assert cache.parse("Show - 01.mkv", OPTIONS)["episode_number"] == "01"
+
+    # Other options are another entry
+    cache.parse("Show - 01.mkv", {})
+    assert calls == ["Show - 01.mkv", "Show - 02.mkv", "Show - 01.mkv"]
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    calls = []
+    monkeypatch.setattr(parse_cache, "aniparse", fake_aniparse(calls))
+    cache = ParseCache(max_entries=2)
+
+    for name in ("Show - 01.mkv", "Show - 02.mkv", "Show - 01.mkv", "Show - 03.mkv"):
+        cache.parse(name, OPTIONS)
+
+    assert cache.get("Show - 01.mkv", OPTIONS) is not None
+    assert cache.get("Show - 02.mkv", OPTIONS) is None
+    assert len(calls) == 3
+
+
+def test_results_persist_across_runs(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(parse_cache, "aniparse", fake_aniparse(calls))
+    db_path = tmp_path / parse_cache.CACHE_FILE_NAME
+
+    cache = ParseCache(max_entries=10, db_path=db_path)
+    cache.parse("Show - 01.mkv", OPTIONS)
+    cache.close()
+
+    cache = ParseCache(max_entries=10, db_path=db_path)
+
+    try:
+        assert cache.parse("Show - 01.mkv", OPTIONS)["episode_number"] == "01"
+        assert calls == ["Show - 01.mkv"]
+    finally:
+        cache.close()
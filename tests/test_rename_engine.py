@@ -0,0 +1,185 @@
+from aniname import backup_store
+from aniname.rename_engine import (
+    JOURNAL_DIR_NAME,
+    RenameTransaction,
+    pending_journals,
+    recover,
+)
+
+
+def make_folder(tmp_path, names):
+    dir_path = tmp_path / "library" / "5S1"
+    dir_path.mkdir(parents=True)
+
+    for name in names:
+        (dir_path / name).touch()
+
+    return dir_path
+
+
+def test_renames_with_files_keeping_their_name(tmp_path):
+    dir_path = make_folder(
+        tmp_path, ["S1E01 - Episode Title 1.mkv", "[G] Show - 02.mkv"]
+    )
+    backup_dir = tmp_path / "ORIGINAL_EPISODE_FILENAMES"
+    renames = [
+        ("S1E01 - Episode Title 1.mkv", "S1E01 - Episode Title 1.mkv"),
+        ("[G] Show - 02.mkv", "S1E02 - Episode Title 2.mkv"),
+    ]
+
+    transaction = RenameTransaction(
+        dir_path=dir_path,
+        renames=renames,
+        journal_dir=backup_dir / JOURNAL_DIR_NAME,
+        manifest_name="5S1",
+        manifest={"mal_id": 5, "title": "Show", "dir_path": str(dir_path)},
+    )
+    transaction.execute()
+
+    assert transaction.renamed == [True, True]
+    assert sorted(path.name for path in dir_path.iterdir()) == [
+        "S1E01 - Episode Title 1.mkv",
+        "S1E02 - Episode Title 2.mkv",
+    ]
+
+    try:
+        store = backup_store.get_backup_store(backup_dir)
+        backup = store.load(store.backups()[0])
+    finally:
+        backup_store.close_backup_store()
+
+    assert backup["restore"] == {
+        "S1E02 - Episode Title 2.mkv": "[G] Show - 02.mkv"
+    }
+
+
+def test_rollback_after_the_folder_was_renamed(tmp_path):
+    old_names = [f"[G] Show - 0{ep_no}.mkv" for ep_no in range(1, 4)]
+    dir_path = make_folder(tmp_path, old_names)
+    backup_dir = tmp_path / "ORIGINAL_EPISODE_FILENAMES"
+
+    transaction = RenameTransaction(
+        dir_path=dir_path,
+        renames=[(name, f"S1E0{i} - Title.mkv") for i, name in enumerate(old_names)],
+        journal_dir=backup_dir / JOURNAL_DIR_NAME,
+        new_dir_path=dir_path.with_name("S1 - Show"),
+        manifest_name="S1 - Show",
+        manifest={"mal_id": 5, "title": "Show", "dir_path": str(dir_path)},
+    )
+
+    # Interrupted before the manifest was written
+    transaction.begin()
+    transaction.run()
+    transaction.journal.sync()
+
+    assert not dir_path.exists()
+
+    for journal_path in pending_journals(backup_dir):
+        recover(journal_path, rollback=True)
+
+    transaction.journal.file.close()
+
+    assert not dir_path.with_name("S1 - Show").exists()
+    assert sorted(path.name for path in dir_path.iterdir()) == old_names
+    assert pending_journals(backup_dir) == []
+
+
+def interrupted_transaction(tmp_path, old_names, steps_done):
+    """
+    Journals the renames of a folder to `S1 - Show`, but only completes the
+    first `steps_done` steps, as if the rename was interrupted.
+    """
+
+    dir_path = make_folder(tmp_path, old_names)
+    backup_dir = tmp_path / "ORIGINAL_EPISODE_FILENAMES"
+
+    transaction = RenameTransaction(
+        dir_path=dir_path,
+        renames=[
+            (name, f"S1E0{i} - Title.mkv") for i, name in enumerate(old_names, 1)
+        ],
+        journal_dir=backup_dir / JOURNAL_DIR_NAME,
+        new_dir_path=dir_path.with_name("S1 - Show"),
+        manifest_name="S1 - Show",
+        manifest={"mal_id": 5, "title": "Show", "dir_path": str(dir_path)},
+    )
+    transaction.begin()
+
+    for step_no, (src, dst, _) in enumerate(transaction.planned[:steps_done]):
+        src.rename(dst)
+        transaction.complete(step_no)
+
+    transaction.journal.sync()
+    transaction.journal.file.close()
+
+    return dir_path, backup_dir
+
+
+def test_rollback_of_an_interrupted_rename(tmp_path):
+    old_names = [f"[G] Show - 0{ep_no}.mkv" for ep_no in range(1, 4)]
+    dir_path, backup_dir = interrupted_transaction(tmp_path, old_names, 2)
+
+    assert sorted(path.name for path in dir_path.iterdir()) == [
+        "S1E01 - Title.mkv",
+        "S1E02 - Title.mkv",
+        "[G] Show - 03.mkv",
+    ]
+
+    for journal_path in pending_journals(backup_dir):
+        recover(journal_path, rollback=True)
+
+    assert sorted(path.name for path in dir_path.iterdir()) == old_names
+    assert pending_journals(backup_dir) == []
+
+    try:
+        assert backup_store.get_backup_store(backup_dir).backups() == []
+    finally:
+        backup_store.close_backup_store()
+
+
+def test_roll_forward_of_an_interrupted_rename(tmp_path):
+    old_names = [f"[G] Show - 0{ep_no}.mkv" for ep_no in range(1, 4)]
+    dir_path, backup_dir = interrupted_transaction(tmp_path, old_names, 2)
+
+    for journal_path in pending_journals(backup_dir):
+        transaction = recover(journal_path)
+
+    new_dir_path = dir_path.with_name("S1 - Show")
+
+    assert transaction.renamed == [True, True, True]
+    assert not dir_path.exists()
+    assert sorted(path.name for path in new_dir_path.iterdir()) == [
+        f"S1E0{i} - Title.mkv" for i in range(1, 4)
+    ]
+    assert pending_journals(backup_dir) == []
+
+    try:
+        store = backup_store.get_backup_store(backup_dir)
+        (info,) = store.backups()
+        backup = store.load(info)
+    finally:
+        backup_store.close_backup_store()
+
+    assert info.name == "S1 - Show"
+    assert backup["dir_path"] == str(new_dir_path)
+    assert backup["restore"] == {
+        f"S1E0{i} - Title.mkv": name for i, name in enumerate(old_names, 1)
+    }
+
+
+def test_swapped_names_are_renamed_through_a_temporary_name(tmp_path):
+    dir_path = make_folder(tmp_path, ["a.mkv", "b.mkv"])
+    (dir_path / "a.mkv").write_text("a")
+    (dir_path / "b.mkv").write_text("b")
+
+    transaction = RenameTransaction(
+        dir_path=dir_path,
+        renames=[("a.mkv", "b.mkv"), ("b.mkv", "a.mkv")],
+        journal_dir=tmp_path / "ORIGINAL_EPISODE_FILENAMES" / JOURNAL_DIR_NAME,
+    )
+    transaction.execute()
+
+    assert len(transaction.planned) == 3
+    assert transaction.renamed == [True, True]
+    assert (dir_path / "a.mkv").read_text() == "b"
+    assert (dir_path / "b.mkv").read_text() == "a"
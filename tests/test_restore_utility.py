@@ -0,0 +1,37 @@
+from aniname import backup_store
+from aniname.restore_utility import restore
+
+
+def test_restores_two_backups_of_the_same_folder(tmp_path):
+    dir_path = tmp_path / "library" / "S1 - Show"
+    dir_path.mkdir(parents=True)
+    (dir_path / "S1E01 - Title.mkv").write_text("first")
+    (dir_path / "S1E01 - Other Title.mkv").write_text("second")
+
+    backup_dir = tmp_path / "ORIGINAL_EPISODE_FILENAMES"
+    store = backup_store.get_backup_store(backup_dir)
+
+    # The same original name, renamed on two runs
+    for new_name in ("S1E01 - Title.mkv", "S1E01 - Other Title.mkv"):
+        store.add(
+            "S1 - Show",
+            {
+                "mal_id": 5,
+                "title": "Show",
+                "dir_path": str(dir_path),
+                "season": "1",
+                "part": None,
+                "rename_count": 1,
+                "restore": {new_name: "[G] Show - 01.mkv"},
+            },
+        )
+
+    backup_store.close_backup_store()
+
+    restore(backup_dir, [1, 2])
+
+    # The second backup isn't restored over the file restored by the first
+    assert {path.name: path.read_text() for path in dir_path.iterdir()} == {
+        "[G] Show - 01.mkv": "first",
+        "S1E01 - Other Title.mkv": "second",
+    }
@@ -0,0 +1,79 @@
+import os
+
+from aniname.scan_index import scan
+
+
+def make_library(tmp_path):
+    root = tmp_path / "Anime"
+    dir_path = root / "1S1"
+    dir_path.mkdir(parents=True)
+    (dir_path / "[G] Show - 01.mkv").write_bytes(b"0")
+    (dir_path / "cover.jpg").touch()
+
+    return root, dir_path
+
+
+def test_unchanged_directories_are_reused(tmp_path):
+    root, dir_path = make_library(tmp_path)
+    index_dir = tmp_path / "scan_index"
+    scan(root, index_dir=index_dir)
+
+    # Replaced in place, the mtime of its directory doesn't change
+    mtime = os.stat(dir_path).st_mtime_ns
+    (dir_path / "[G] Show - 01.mkv").write_bytes(b"0123")
+    os.utime(dir_path, ns=(mtime, mtime))
+
+    index = scan(root, index_dir=index_dir)
+
+    assert index.reused_dirs == 2
+    assert index.changed_files == 1
+    assert [(f.name, f.size) for f in index.get(dir_path).files] == [
+        ("[G] Show - 01.mkv", 4)
+    ]
+
+    # Saved with the new size
+    assert scan(root, index_dir=index_dir).changed_files == 0
+
+
+def test_changed_directories_are_listed_again(tmp_path):
+    root, dir_path = make_library(tmp_path)
+    index_dir = tmp_path / "scan_index"
+    scan(root, index_dir=index_dir)
+
+    (dir_path / "[G] Show - 02.mkv").touch()
+    mtime = os.stat(dir_path).st_mtime_ns + 10**9
+    os.utime(dir_path, ns=(mtime, mtime))
+
+    index = scan(root, index_dir=index_dir)
+
+    assert index.reused_dirs == 1
+    assert [f.name for f in index.get(dir_path).files] == [
+        "[G] Show - 01.mkv",
+        "[G] Show - 02.mkv",
+    ]
+    assert index.names(dir_path) == [
+        "[G] Show - 01.mkv",
+        "[G] Show - 02.mkv",
+        "cover.jpg",
+    ]
+
+
+def test_refresh_adds_and_removes_directories(tmp_path):
+    root, dir_path = make_library(tmp_path)
+    index = scan(root)
+
+    new_dir = root / "2S1"
+    new_dir.mkdir()
+    (new_dir / "[G] Other - 01.mkv").touch()
+    index.refresh([new_dir])
+
+    assert sorted(index.get(root).dirs) == ["1S1", "2S1"]
+    assert index.episode_paths(new_dir) == [new_dir / "[G] Other - 01.mkv"]
+
+    (dir_path / "[G] Show - 01.mkv").unlink()
+    (dir_path / "cover.jpg").unlink()
+    dir_path.rmdir()
+    index.refresh([dir_path])
+
+    assert index.get(root).dirs == ["2S1"]
+    assert index.get(dir_path) is None
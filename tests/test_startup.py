@@ -0,0 +1,54 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Generous next to the 75 ms of benchmarks/bench_startup.py, for slow machines
+HELP_BUDGET_MS = 300
+
+# Dependencies of the rename utility only
+FORBIDDEN = ["tkinter", "aiohttp", "lxml", "aniparse", "aniname.anime_list"]
+
+
+def import_times(*args: str) -> dict[str, int]:
+    """
+    Returns the cumulative import time (in microseconds) of each module
+    imported by Python with the arguments.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        stdin=subprocess.DEVNULL,
+        check=True,
+    )
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            times[name] = int(cumulative)
+
+    return times
+
+
+def test_help_is_within_its_import_time_budget():
+    runs = [import_times("-m", "aniname", "--help") for _ in range(3)]
+    modules = {name.strip() for name in runs[0]}
+
+    assert not [
+        module
+        for module in FORBIDDEN
+        if any(m == module or m.startswith(module + ".") for m in modules)
+    ]
+
+    # The cumulative times of the top-level imports
+    best = min(
+        sum(us for name, us in times.items() if not name.startswith("  "))
+        for times in runs
+    )
+
+    assert best / 1000 < HELP_BUDGET_MS
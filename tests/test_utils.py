@@ -0,0 +1,35 @@
+from aniname.utils import NameIndex, format_zeros
+
+
+def test_episode_numbers_are_padded_to_the_last_episode():
+    assert format_zeros(7, 12) == "07"
+    assert format_zeros(7, 120) == "007"
+    assert format_zeros(7, 5) == "07"
+    assert format_zeros(None, 12) is None
+
+
+def test_only_the_whole_part_of_specials_is_padded():
+    names = [f"E{format_zeros(ep_no, 12)}" for ep_no in (6, 6.5, 7, 10)]
+
+    assert names == ["E06", "E06.5", "E07", "E10"]
+    assert sorted(names) == names
+
+
+def test_claimed_names_get_a_free_suffix(tmp_path):
+    index = NameIndex(tmp_path, ["Show.mkv", "Show (1).mkv", "Show (3).mkv"])
+
+    assert index.claim("Other.mkv") == tmp_path / "Other.mkv"
+    assert index.claim("Show.mkv") == tmp_path / "Show (4).mkv"
+    assert index.claim("Other.mkv") == tmp_path / "Other (1).mkv"
+
+
+def test_discarded_names_can_be_claimed_again(tmp_path):
+    (tmp_path / "Show.mkv").touch()
+    (tmp_path / "Show (1).mkv").touch()
+    index = NameIndex(tmp_path)
+
+    index.discard("Show (1).mkv")
+    assert index.claim("Show.mkv") == tmp_path / "Show (1).mkv"
+
+    index.discard("Show.mkv")
+    assert index.claim("Show.mkv") == tmp_path / "Show.mkv"
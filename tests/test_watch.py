@@ -0,0 +1,99 @@
+import asyncio
+
+from aniname import backup_store, library_state, parse_cache, scan_index, watch
+from aniname.anime import MATCH_PATTERN
+from aniname.error_handler import HandleError
+from aniname.watch import WatchDaemon
+
+
+class StopWatching(Exception):
+    pass
+
+
+class FakeWatcher:
+    """
+    Reports the changes made by each step, one step per wait.
+    """
+
+    def __init__(self, steps) -> None:
+        self.steps = steps
+
+    async def wait(self, timeout: float = None) -> set[str]:
+        if not self.steps:
+            raise StopWatching
+
+        changed = self.steps.pop(0)()
+        await asyncio.sleep(timeout or 0)
+
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingDaemon(WatchDaemon):
+    processed: list
+
+    async def process(self, dir_paths) -> None:
+        self.processed.append(sorted(map(str, dir_paths)))
+
+
+def test_folders_are_processed_once_their_episodes_stop_growing(
+    tmp_path, monkeypatch
+):
+    root = tmp_path / "Anime"
+    dir_path = root / "1S1"
+    dir_path.mkdir(parents=True)
+    episode = dir_path / "[G] Show - 01.mkv"
+
+    def write(size):
+        episode.write_bytes(b"0" * size)
+        return {str(dir_path)}
+
+    daemon = RecordingDaemon(root, debounce=0.05)
+    daemon.processed = []
+    steps = [
+        lambda: write(1),
+        # Still being written when the debounce time is over
+        lambda: write(2) and set(),
+        lambda: set(),
+        lambda: daemon.processed.append("idle") or set(),
+    ]
+    monkeypatch.setattr(watch, "create_watcher", lambda root: FakeWatcher(steps))
+
+    try:
+        asyncio.run(daemon.run())
+    except StopWatching:
+        pass
+
+    assert daemon.processed == [
+        [str(root), str(dir_path)],
+        [str(dir_path)],
+        "idle",
+    ]
+    assert daemon.pending == {}
+
+
+def test_a_failing_folder_is_skipped(tmp_path, monkeypatch, fake_provider):
+    root = tmp_path / "library" / "Anime"
+
+    for mal_id in (1, 2):
+        (root / f"{mal_id}S1").mkdir(parents=True)
+        (root / f"{mal_id}S1" / f"[G] Show {mal_id} - 01.mkv").touch()
+
+    monkeypatch.setattr(HandleError, "exit_on_anime_error", False)
+
+    daemon = WatchDaemon(root, headless=True)
+    daemon.index = scan_index.scan(root, MATCH_PATTERN)
+
+    try:
+        asyncio.run(daemon.process([root / "1S1", root / "2S1"]))
+    finally:
+        parse_cache.close_parse_cache()
+        library_state.close_library_state()
+        backup_store.close_backup_store()
+
+    assert not (root / "1S1").exists()
+    assert [path.name for path in (root / "2S1").iterdir()] == [
+        "[G] Show 2 - 01.mkv"
+    ]